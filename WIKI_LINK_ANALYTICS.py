@@ -0,0 +1,420 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+import WIKI_LINK_GRAPH
+import WIKI_LINK_STREAMS
+import WIKI_LINK_TITLES
+
+# Whole graph analytics on the CSR graph files (WIKI_LINK_GRAPH.Save_CSR_Graph), without neo4j.
+# The CSR arrays are memory mapped and used as numpy arrays as they are, so a graph is about 8 bytes per link on disk
+# and only the pages that are touched are read. Incoming links are kept in a second CSR graph of the same format:
+#   [csr_prefix].reverse.offsets/.dest/.strength   dest holds the source ids of the links into each node.
+# It is saved the first time it is needed (and again when the CSR graph is newer).
+#   PageRank               Weighted by strength, power iteration pulling over incoming links. The node range is split
+#                          into blocks that are summed by workers threads: numpy's take, multiply & add.reduceat
+#                          release the GIL, so the threads run in parallel.
+#   Shortest_Path          Bidirectional breadth first search between two titles, a whole BFS level at a time. Only
+#                          the nodes reached are kept (as sorted arrays), so a search that stays local stays small.
+#   Weak_Components        Label propagation with pointer jumping over the link arrays.
+#   Strong_Components      The SCC of the best connected node by forward & backward reach, the rest with Tarjan's
+#                          algorithm on the links between the remaining nodes only.
+# Component ids are numbered from the largest component down.
+#   [master_ids]_pagerank.tsv     title  id  rank
+#   [master_ids]_components.tsv   title  id  weak component  strong component
+
+BLOCK_LINKS = 1 << 22 # Links summed per task, this bounds the temporary arrays of each thread.
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Reverse_CSR_Prefix(csr_prefix):
+    return csr_prefix + '.reverse'
+
+def Analytics_Files(master_ids_file):
+    base, extension = WIKI_LINK_STREAMS.Split_Extension(master_ids_file)
+    return base + '_pagerank' + extension, base + '_components' + extension
+
+def CSR_Arrays(graph):
+    # numpy views of the (offsets, dest, strength) memoryviews of a WIKI_LINK_GRAPH.CSR_GRAPH.
+    return numpy.frombuffer(graph.offsets, dtype=numpy.int64), numpy.frombuffer(graph.dest, dtype=numpy.int32), numpy.frombuffer(graph.strength, dtype=numpy.int32)
+
+def Link_Sources(offsets):
+    # The source id of every link.
+    return numpy.repeat(numpy.arange(len(offsets) - 1, dtype=numpy.int32), numpy.diff(offsets))
+
+def Save_Reverse_CSR_Graph(csr_prefix, print_batch=BLOCK_LINKS * 16):
+    # Holds an int64 and an int32 per link while sorting the links by destination.
+    print("Saving Reverse CSR Graph...\n")
+    start_time = time.time()
+    graph = WIKI_LINK_GRAPH.CSR_GRAPH(csr_prefix)
+    offsets, dest, strength = CSR_Arrays(graph)
+    reverse_offsets = numpy.zeros(graph.node_count + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(dest, minlength=graph.node_count), out=reverse_offsets[1:])
+    order = numpy.argsort(dest, kind='stable')
+    sources = Link_Sources(offsets)
+    offsets_file, dest_file, strength_file = WIKI_LINK_GRAPH.CSR_Files(Reverse_CSR_Prefix(csr_prefix))
+    reverse_offsets.tofile(offsets_file)
+    with open(dest_file, 'wb') as dest_stream, open(strength_file, 'wb') as strength_stream:
+        for start in range(0, len(order), BLOCK_LINKS):
+            block = order[start:start + BLOCK_LINKS]
+            sources[block].tofile(dest_stream)
+            strength[block].tofile(strength_stream)
+            if (start + BLOCK_LINKS) // print_batch > start // print_batch:
+                print("\tLink # {}".format(min(start + BLOCK_LINKS, len(order))))
+    del offsets, dest, strength, order, sources
+    graph.Close()
+    print("Reverse CSR Graph Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Expand(offsets, targets, frontier):
+    # Returns (owner, neighbor) arrays of every link out of the frontier nodes.
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    total = int(counts.sum())
+    if 0 == total:
+        return frontier[:0], targets[:0]
+    shift = numpy.cumsum(counts) - counts
+    positions = numpy.repeat(starts - shift, counts) + numpy.arange(total)
+    return numpy.repeat(frontier, counts), targets[positions]
+
+def In_Sorted(sorted_values, values):
+    # Mask of the values that are in sorted_values (sorted, unique).
+    values = numpy.asarray(values)
+    if 0 == len(sorted_values):
+        return numpy.zeros(len(values), dtype=bool)
+    positions = numpy.minimum(numpy.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+def Level_Path(levels, node_id):
+    # node_id and its parents back to the start of a search side. levels are the (sorted nodes, parents) of each level.
+    depth = [depth for depth in range(len(levels)) if In_Sorted(levels[depth][0], [node_id])[0]][0]
+    path = [node_id]
+    for depth in range(depth, 0, -1):
+        nodes, parents = levels[depth]
+        path.append(int(parents[numpy.searchsorted(nodes, path[-1])]))
+    return path
+
+def Reach(offsets, targets, start, allowed):
+    # Mask of the allowed nodes reachable from the start node through allowed nodes.
+    reached = numpy.zeros(len(allowed), dtype=bool)
+    reached[start] = True
+    frontier = numpy.array([start], dtype=numpy.int32)
+    while len(frontier):
+        neighbors = Expand(offsets, targets, frontier)[1]
+        neighbors = neighbors[allowed[neighbors] & ~reached[neighbors]]
+        frontier = numpy.unique(neighbors)
+        reached[frontier] = True
+    return reached
+
+def Number_Components(labels):
+    # Renumbers component labels 0, 1, ... from the largest component down.
+    roots, inverse, sizes = numpy.unique(labels, return_inverse=True, return_counts=True)
+    ranks = numpy.empty(len(roots), dtype=numpy.int32)
+    ranks[numpy.argsort(-sizes, kind='stable')] = numpy.arange(len(roots), dtype=numpy.int32)
+    return ranks[inverse]
+
+class GRAPH(object):
+    # numpy views of a CSR graph and its reverse graph, with the title table of its master ids file.
+
+    def __init__(self, csr_prefix, master_ids_file=None):
+        offsets_file = WIKI_LINK_GRAPH.CSR_Files(csr_prefix)[0]
+        reverse_offsets_file = WIKI_LINK_GRAPH.CSR_Files(Reverse_CSR_Prefix(csr_prefix))[0]
+        if not os.path.isfile(reverse_offsets_file) or os.path.getmtime(reverse_offsets_file) < os.path.getmtime(offsets_file):
+            Save_Reverse_CSR_Graph(csr_prefix)
+        self.graphs = [WIKI_LINK_GRAPH.CSR_GRAPH(csr_prefix), WIKI_LINK_GRAPH.CSR_GRAPH(Reverse_CSR_Prefix(csr_prefix))]
+        self.offsets, self.dest, self.strength = CSR_Arrays(self.graphs[0])
+        self.reverse_offsets, self.reverse_dest, self.reverse_strength = CSR_Arrays(self.graphs[1])
+        self.node_count = self.graphs[0].node_count
+        self.link_count = self.graphs[0].link_count
+        self.titles = None
+        if master_ids_file is not None:
+            self.titles = WIKI_LINK_TITLES.Load_Master_IDs(master_ids_file)
+            if len(self.titles) != self.node_count:
+                panic("{} has {} titles, the CSR graph has {} nodes".format(master_ids_file, len(self.titles), self.node_count))
+
+    def Node_ID(self, title):
+        # -1 if the title isn't a node.
+        return self.titles.Find(title.encode('utf-8'))
+
+    def Title(self, node_id):
+        return self.titles.Title(node_id).decode('utf-8')
+
+    def Blocks(self, offsets, block_links=BLOCK_LINKS):
+        # (first node, end node) ranges of about block_links links each.
+        bounds = numpy.searchsorted(offsets, numpy.arange(0, offsets[-1], block_links), side='right') - 1
+        bounds = numpy.unique(numpy.concatenate(([0], bounds, [self.node_count])))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def PageRank(self, damping=0.85, tolerance=1e-6, max_iterations=100, workers=1):
+        # Returns the float64 rank of every node, summing to 1. A node shares its rank between its links in proportion
+        # to their strength, the rank of nodes without links is shared by all nodes.
+        node_count = self.node_count
+        if 0 == node_count:
+            return numpy.zeros(0)
+        strength_sums = numpy.concatenate(([0], numpy.cumsum(self.strength, dtype=numpy.int64)))
+        out_strength = (strength_sums[self.offsets[1:]] - strength_sums[self.offsets[:-1]]).astype(numpy.float64)
+        del strength_sums
+        dangling = 0 == out_strength
+        scale = numpy.zeros(node_count)
+        numpy.divide(1.0, out_strength, out=scale, where=~dangling)
+        rank = numpy.full(node_count, 1.0 / node_count)
+        new_rank = numpy.empty(node_count)
+        blocks = self.Blocks(self.reverse_offsets)
+        offsets = self.reverse_offsets
+        sources = self.reverse_dest
+        strength = self.reverse_strength
+
+        def Sum_Block(block):
+            first, end = block
+            start = offsets[first]
+            counts = numpy.diff(offsets[first:end + 1])
+            sums = numpy.zeros(end - first)
+            if offsets[end] > start:
+                shares = numpy.take(shared, sources[start:offsets[end]])
+                shares *= strength[start:offsets[end]]
+                linked = counts > 0
+                sums[linked] = numpy.add.reduceat(shares, offsets[first:end][linked] - start)
+            new_rank[first:end] = sums
+
+        with ThreadPoolExecutor(max(1, workers)) as executor:
+            for iteration in range(max_iterations):
+                shared = rank * scale
+                list(executor.map(Sum_Block, blocks))
+                new_rank *= damping
+                new_rank += (1.0 - damping + damping * rank[dangling].sum()) / node_count
+                change = numpy.abs(new_rank - rank).sum()
+                rank, new_rank = new_rank, rank
+                print("\tIteration: {}\tChange: {}".format(iteration + 1, "%.3g" % change))
+                if change < tolerance:
+                    break
+        return rank
+
+    def Shortest_Path(self, source_id, dest_id):
+        # Returns the node ids of a shortest path of links from source_id to dest_id, or None if there is none.
+        if source_id == dest_id:
+            return [source_id]
+        sides = [(self.offsets, self.dest), (self.reverse_offsets, self.reverse_dest)]
+        # Each side keeps the (sorted nodes, parents) of its levels, and all the nodes it reached, sorted.
+        levels = [[(numpy.array([node_id], dtype=numpy.int32), numpy.array([-1], dtype=numpy.int32))] for node_id in (source_id, dest_id)]
+        reached = [levels[0][0][0], levels[1][0][0]]
+        while len(levels[0][-1][0]) and len(levels[1][-1][0]):
+            # Grow the side with the fewest links to follow.
+            side = 0 if self.Frontier_Links(0, levels[0][-1][0]) <= self.Frontier_Links(1, levels[1][-1][0]) else 1
+            owners, neighbors = Expand(sides[side][0], sides[side][1], levels[side][-1][0])
+            new = ~In_Sorted(reached[side], neighbors)
+            neighbors, first = numpy.unique(neighbors[new], return_index=True)
+            levels[side].append((neighbors, owners[new][first]))
+            reached[side] = numpy.union1d(reached[side], neighbors)
+            met = neighbors[In_Sorted(reached[1 - side], neighbors)]
+            if len(met):
+                # Every path through met has this depth + the depth on the other side, the closest one is a shortest path.
+                other_depths = numpy.zeros(len(met), dtype=numpy.int32)
+                for depth, (nodes, parents) in enumerate(levels[1 - side]):
+                    other_depths[In_Sorted(nodes, met)] = depth
+                middle = int(met[numpy.argmin(other_depths)])
+                return Level_Path(levels[0], middle)[::-1] + Level_Path(levels[1], middle)[1:]
+        return None
+
+    def Frontier_Links(self, side, frontier):
+        offsets = self.offsets if 0 == side else self.reverse_offsets
+        return int((offsets[frontier + 1] - offsets[frontier]).sum())
+
+    def Weak_Components(self):
+        # Returns the weak component of every node. Each round hooks every component root onto the smallest root
+        # linked to it, then points every node straight at its root, so it takes about log(diameter) rounds.
+        labels = numpy.arange(self.node_count, dtype=numpy.int32)
+        blocks = self.Blocks(self.offsets)
+        round_number = 0
+        while True:
+            round_number += 1
+            hooked = labels.copy()
+            for first, end in blocks:
+                sources = numpy.repeat(numpy.arange(first, end, dtype=numpy.int32), numpy.diff(self.offsets[first:end + 1]))
+                source_labels = labels[sources]
+                dest_labels = labels[self.dest[self.offsets[first]:self.offsets[end]]]
+                lowest = numpy.minimum(source_labels, dest_labels)
+                numpy.minimum.at(hooked, source_labels, lowest)
+                numpy.minimum.at(hooked, dest_labels, lowest)
+            while True:
+                jumped = hooked[hooked]
+                if numpy.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            print("\tRound: {}\tComponents: {}".format(round_number, int((hooked == numpy.arange(self.node_count)).sum())))
+            if numpy.array_equal(hooked, labels):
+                return Number_Components(labels)
+            labels = hooked
+
+    def Strong_Components(self):
+        # Returns the strong component of every node.
+        node_count = self.node_count
+        labels = numpy.full(node_count, -1, dtype=numpy.int64)
+        if 0 == node_count:
+            return labels.astype(numpy.int32)
+        out_degree = numpy.diff(self.offsets)
+        in_degree = numpy.diff(self.reverse_offsets)
+        # Nodes without links in or out are alone in their component.
+        alone = (0 == out_degree) | (0 == in_degree)
+        labels[alone] = numpy.flatnonzero(alone)
+        remaining = ~alone
+        print("\tSingle nodes: {}".format(int(alone.sum())))
+        if remaining.any():
+            pivot = int(numpy.argmax(numpy.where(remaining, out_degree * in_degree, -1)))
+            forward = Reach(self.offsets, self.dest, pivot, remaining)
+            backward = Reach(self.reverse_offsets, self.reverse_dest, pivot, remaining)
+            component = forward & backward
+            labels[component] = pivot
+            remaining &= ~component
+            print("\tPivot component: {}\tRemaining nodes: {}".format(int(component.sum()), int(remaining.sum())))
+        if remaining.any():
+            nodes = numpy.flatnonzero(remaining)
+            local_ids = numpy.full(node_count, -1, dtype=numpy.int64)
+            local_ids[nodes] = numpy.arange(len(nodes))
+            # The links between remaining nodes, as a CSR graph of local ids.
+            local_offsets = [0]
+            local_dest = []
+            for first, end in self.Blocks(self.offsets):
+                dest = local_ids[self.dest[self.offsets[first]:self.offsets[end]]]
+                counts = numpy.diff(self.offsets[first:end + 1])
+                kept = numpy.repeat(remaining[first:end], counts) & (dest >= 0)
+                local_dest.append(dest[kept])
+                kept_counts = numpy.bincount(numpy.repeat(numpy.arange(end - first), counts)[kept], minlength=end - first)
+                local_offsets.extend(kept_counts[remaining[first:end]].tolist())
+            local_offsets = numpy.cumsum(local_offsets).tolist()
+            local_dest = numpy.concatenate(local_dest).tolist()
+            for local_id, root in enumerate(Tarjan(local_offsets, local_dest)):
+                labels[nodes[local_id]] = nodes[root]
+        return Number_Components(labels)
+
+def Tarjan(offsets, dest):
+    # Iterative Tarjan's algorithm over python lists. Returns the root (lowest index node) of each node's component.
+    node_count = len(offsets) - 1
+    index = [-1] * node_count
+    low = [0] * node_count
+    on_stack = [False] * node_count
+    roots = [0] * node_count
+    stack = []
+    counter = 0
+    for start in range(node_count):
+        if index[start] >= 0:
+            continue
+        work = [(start, offsets[start])]
+        index[start] = low[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack[start] = True
+        while work:
+            node, position = work[-1]
+            end = offsets[node + 1]
+            while position < end:
+                neighbor = dest[position]
+                position += 1
+                if index[neighbor] < 0:
+                    break
+                if on_stack[neighbor] and index[neighbor] < low[node]:
+                    low[node] = index[neighbor]
+            else:
+                neighbor = -1
+            if neighbor >= 0 and index[neighbor] < 0:
+                work[-1] = (node, position)
+                index[neighbor] = low[neighbor] = counter
+                counter += 1
+                stack.append(neighbor)
+                on_stack[neighbor] = True
+                work.append((neighbor, offsets[neighbor]))
+                continue
+            work.pop()
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    roots[member] = node
+                    if member == node:
+                        break
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+    return roots
+
+def Save_Node_Values(master_ids_file, save_file, columns, formats):
+    # Writes master_ids lines with the columns (numpy arrays, one value per node) appended.
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'rb') as read_stream:
+        with WIKI_LINK_STREAMS.Open_File(save_file, 'wb') as save_stream:
+            rows = []
+            for node_id, line in enumerate(read_stream):
+                if node_id % 1000000 == 0: # Rows are turned into python values a million at a time.
+                    rows = list(zip(*[column[node_id:node_id + 1000000].tolist() for column in columns]))
+                save_stream.write(line.split(b'\n')[0] + formats % rows[node_id % 1000000])
+
+def Save_PageRank(csr_prefix, master_ids_file, pagerank_file=None, workers=1, damping=0.85, tolerance=1e-6, max_iterations=100):
+    print("Saving PageRank...\n")
+    start_time = time.time()
+    pagerank_file = pagerank_file or Analytics_Files(master_ids_file)[0]
+    graph = GRAPH(csr_prefix)
+    print("\tNodes: {}\tLinks: {}\n".format(graph.node_count, graph.link_count))
+    rank = graph.PageRank(damping, tolerance, max_iterations, workers)
+    print("\n\tSaving {}...\n".format(pagerank_file))
+    Save_Node_Values(master_ids_file, pagerank_file, [rank], b"\t%.6e\n")
+    print("PageRank Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Save_Components(csr_prefix, master_ids_file, components_file=None):
+    print("Saving Connected Components...\n")
+    start_time = time.time()
+    components_file = components_file or Analytics_Files(master_ids_file)[1]
+    graph = GRAPH(csr_prefix)
+    print("\tWeak components...\n")
+    weak = graph.Weak_Components()
+    print("\n\tStrong components...\n")
+    strong = graph.Strong_Components()
+    print("\n\tWeak components: {}\tLargest: {}".format(int(weak.max()) + 1 if len(weak) else 0, int((0 == weak).sum())))
+    print("\tStrong components: {}\tLargest: {}\n".format(int(strong.max()) + 1 if len(strong) else 0, int((0 == strong).sum())))
+    print("\tSaving {}...\n".format(components_file))
+    Save_Node_Values(master_ids_file, components_file, [weak, strong], b"\t%d\t%d\n")
+    print("Connected Components Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Print_Shortest_Path(csr_prefix, master_ids_file, source_title, dest_title):
+    graph = GRAPH(csr_prefix, master_ids_file)
+    for title in (source_title, dest_title):
+        if graph.Node_ID(title) < 0:
+            print("{} is not in {}".format(title, master_ids_file))
+            return None
+    start_time = time.time()
+    path = graph.Shortest_Path(graph.Node_ID(source_title), graph.Node_ID(dest_title))
+    if path is None:
+        print("No path of links from {} to {}".format(source_title, dest_title))
+    else:
+        print("Degrees of separation: {}".format(len(path) - 1))
+        print("\n".join("\t" + graph.Title(node_id) for node_id in path))
+    print("Duration: {}".format( "%.2f" % (time.time() - start_time)))
+    return path
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="PageRank, shortest paths & connected components of the CSR graph files.")
+    parser.add_argument("command", choices=["pagerank", "components", "path"])
+    parser.add_argument("titles", nargs="*", help="Source & destination titles of a path.")
+    parser.add_argument("--csr-prefix", default="data/relationships.csr")
+    parser.add_argument("--master-ids-file", default="data/master_ids.tsv")
+    parser.add_argument("--workers", type=int, default=1, help="PageRank threads.")
+    parser.add_argument("--damping", type=float, default=0.85)
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Stop PageRank once the ranks change by less than this (sum of absolute changes).")
+    parser.add_argument("--max-iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    if "pagerank" == args.command:
+        Save_PageRank(args.csr_prefix, args.master_ids_file, workers=args.workers, damping=args.damping, tolerance=args.tolerance, max_iterations=args.max_iterations)
+    elif "components" == args.command:
+        Save_Components(args.csr_prefix, args.master_ids_file)
+    elif 2 != len(args.titles):
+        panic("path needs a source and a destination title.")
+    else:
+        Print_Shortest_Path(args.csr_prefix, args.master_ids_file, args.titles[0], args.titles[1])
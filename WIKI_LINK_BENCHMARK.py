@@ -0,0 +1,310 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import WIKI_LINK_GRAPH
+import WIKI_LINK_PARSE
+
+# Reproducible benchmarks of the extraction stages on a seeded synthetic wiki file.
+# Generate_Wiki_File writes a MediaWiki export with the same layout as a pages-articles dump. The same settings & seed
+# always give the same file. Settings:
+#   pages            Number of pages, including redirect pages.
+#   links_per_page   Mean links per page (0 to twice as many).
+#   title_skew       Zipf exponent of the link targets, 0 links to every title alike. Wikipedia is close to 1.
+#   oddities         Fraction of links written in an odd way: several links on a line, links nested in File: links,
+#                    &amp; &quot; &nbsp; entities, piped labels, #anchors, lower case first letters, '_' for ' ',
+#                    and '[[' that is never closed.
+#   redirects        Fraction of pages that are redirects.
+# Run_Benchmark runs every stage in a fresh process, one after the other, and records for each:
+#   seconds, pages_per_second, mb_per_second (of the stage's input file), peak_rss_mb (of the stage's process & its
+#   workers) and output_bytes (of each output file).
+# With repeat > 1 the fastest run of each stage is kept. The results are saved as JSON, and can be compared with a
+# baseline results file: a stage regresses when it is more than tolerance slower or larger in memory, and its outputs
+# changed when their sizes differ (for the same settings).
+
+STAGES = ['reduce', 'node_ids', 'relationships', 'fused', 'csr']
+NAMESPACE_PREFIXES = ['Category:', 'File:', 'Template:', 'Help:']
+FILLER = "the of and in to a is was for on as with by he at from his an were are which this be has or its that".split()
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Title_Name(title_number):
+    # Every 10th title is in another namespace, some have entities.
+    if title_number % 10 == 9:
+        return NAMESPACE_PREFIXES[title_number // 10 % len(NAMESPACE_PREFIXES)] + "Topic {}".format(title_number)
+    if title_number % 17 == 3:
+        return "Arts &amp; Letters {}".format(title_number)
+    return "Article {}".format(title_number)
+
+def Odd_Link(rnd, title, other):
+    # One of the odd ways to write a link to title. other is a second title for lines with two links.
+    kind = rnd.randrange(8)
+    if 0 == kind:
+        return "[[{}]], [[{}|see also]] and [[{}]]".format(title, other, title)
+    if 1 == kind:
+        return "[[File:Picture {}.jpg|thumb|A [[{}]] caption with [[{}]]]]".format(rnd.randrange(1000), title, other)
+    if 2 == kind:
+        return "[[{}|&quot;quoted&quot;&nbsp;label]]".format(title)
+    if 3 == kind:
+        return "[[{}#History|history]]".format(title)
+    if 4 == kind:
+        return "[[{}]]".format(title[:1].lower() + title[1:])
+    if 5 == kind:
+        return "[[{}]]".format(title.replace(' ', '_'))
+    if 6 == kind:
+        return "[[ {} ]]s".format(title)
+    return "code [[ ^x[i] {{ }} and [[{}]]".format(title)
+
+def Generate_Wiki_File(wiki_file, pages=10000, links_per_page=20, title_skew=1.0, oddities=0.1, redirects=0.05, seed=1):
+    print("Generating Synthetic Wiki File...\n")
+    start_time = time.time()
+    rnd = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** title_skew for rank in range(pages)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    # The most linked titles are spread over the file, not the first pages.
+    popular = list(range(pages))
+    rnd.shuffle(popular)
+    with open(wiki_file, 'w', encoding='utf-8', buffering=8 * 1024 * 1024) as save_stream:
+        save_stream.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="en">\n')
+        save_stream.write('  <siteinfo>\n    <sitename>Synthetic</sitename>\n    <case>first-letter</case>\n    <namespaces>\n')
+        for key, name in [(-2, "Media"), (-1, "Special"), (0, ""), (1, "Talk"), (6, "File"), (10, "Template"), (12, "Help"), (14, "Category")]:
+            if name:
+                save_stream.write('      <namespace key="{}" case="first-letter">{}</namespace>\n'.format(key, name))
+            else:
+                save_stream.write('      <namespace key="{}" case="first-letter" />\n'.format(key))
+        save_stream.write('    </namespaces>\n  </siteinfo>\n')
+        for page_number in range(pages):
+            title = Title_Name(page_number)
+            redirect = rnd.random() < redirects
+            lines = []
+            if redirect:
+                target = Title_Name(popular[rnd.randrange(pages)])
+                lines.append("#REDIRECT [[{}]]".format(target))
+            else:
+                link_count = rnd.randint(0, 2 * links_per_page)
+                dests = [Title_Name(popular[rank]) for rank in rnd.choices(range(pages), cum_weights=cumulative, k=link_count + 1)]
+                line = []
+                for link_number in range(link_count):
+                    if rnd.random() < oddities:
+                        link = Odd_Link(rnd, dests[link_number], dests[link_number + 1])
+                    elif rnd.random() < 0.3:
+                        link = "[[{}|{}]]".format(dests[link_number], rnd.choice(FILLER))
+                    else:
+                        link = "[[{}]]".format(dests[link_number])
+                    line.append(" ".join(rnd.choice(FILLER) for word in range(rnd.randint(2, 12))) + " " + link)
+                    if rnd.random() < 0.3:
+                        lines.append(" ".join(line) + ".")
+                        line = []
+                if line:
+                    lines.append(" ".join(line) + ".")
+            text = "\n".join(lines)
+            save_stream.write('  <page>\n    <title>{}</title>\n    <ns>0</ns>\n    <id>{}</id>\n'.format(title, page_number + 1))
+            if redirect:
+                save_stream.write('    <redirect title="{}" />\n'.format(target))
+            save_stream.write('    <revision>\n      <id>{}</id>\n      <text xml:space="preserve">{}</text>\n'.format(page_number + 1, text))
+            save_stream.write('      <sha1>{}</sha1>\n    </revision>\n  </page>\n'.format(hashlib.sha1(text.encode('utf-8')).hexdigest()[:31]))
+        save_stream.write('</mediawiki>\n')
+    print("Synthetic Wiki File Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Stage_Files(work_dir, compress=None):
+    extension = '.tsv' + ('.' + compress if compress else '')
+    return dict((name, os.path.join(work_dir, name + extension)) for name in ('wiki_reduced', 'master_ids', 'relationships', 'fused_master_ids', 'fused_relationships'))
+
+def Stage_Plan(stage, wiki_file, files, settings):
+    # Returns (function, args, keyword args, input file, output files) of a stage.
+    workers = settings['workers']
+    if 'reduce' == stage:
+        return WIKI_LINK_PARSE.Reduce_Wiki_Datastore, (wiki_file, files['wiki_reduced']), {'workers': workers, 'engine': settings['engine'], 'canonical': settings['canonical']}, wiki_file, [files['wiki_reduced']]
+    if 'node_ids' == stage:
+        return WIKI_LINK_PARSE.Save_Node_IDs, (files['wiki_reduced'], files['master_ids']), {'memory_budget': settings['memory_budget']}, files['wiki_reduced'], [files['master_ids']]
+    if 'relationships' == stage:
+        return WIKI_LINK_PARSE.Save_Relationships, (files['wiki_reduced'], files['master_ids'], files['relationships']), {'memory_budget': settings['memory_budget']}, files['wiki_reduced'], [files['relationships']]
+    if 'fused' == stage:
+        return WIKI_LINK_PARSE.Save_Fused, (wiki_file, files['fused_master_ids'], files['fused_relationships']), {'workers': workers, 'engine': settings['engine']}, wiki_file, [files['fused_master_ids'], files['fused_relationships']]
+    csr_prefix = os.path.join(os.path.dirname(files['relationships']), 'relationships.csr')
+    return WIKI_LINK_GRAPH.Save_CSR_Graph, (files['master_ids'], files['relationships'], csr_prefix), {}, files['relationships'], list(WIKI_LINK_GRAPH.CSR_Files(csr_prefix))
+
+def Peak_RSS_MB():
+    # Peak resident memory of this process and of its finished workers. ru_maxrss is in KB on linux, bytes on macOS.
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / (1024.0 * 1024.0 if 'darwin' == sys.platform else 1024.0)
+
+class TAIL_STREAM(object):
+    # Keeps the last few writes of a stage's quiet output, to show why it failed.
+
+    def __init__(self, size=40):
+        self.writes = collections.deque(maxlen=size)
+
+    def write(self, data):
+        self.writes.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def Text(self):
+        return "".join(self.writes).strip()
+
+def Run_Stage_Process(function, args, kwargs, verbose, queue):
+    tail_stream = TAIL_STREAM()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else tail_stream):
+            start_time = time.time()
+            function(*args, **kwargs)
+            seconds = time.time() - start_time
+    except SystemExit: # panic() exits with status 0.
+        queue.put({'failed': tail_stream.Text() or "the stage exited"})
+        return
+    queue.put({'seconds': seconds, 'peak_rss_mb': Peak_RSS_MB()})
+
+def Run_Stage(function, args, kwargs, verbose=False, timeout=60.0):
+    # Runs the stage in a new interpreter (spawn), so its peak memory isn't that of an earlier stage.
+    # The result is read while the process runs: a process doesn't exit until what it put on the queue is read from
+    # the pipe, so joining it first would wait forever on a result bigger than the pipe buffer.
+    # The result is put on the queue just before the process exits, timeout only covers its trip through the queue.
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=Run_Stage_Process, args=(function, args, kwargs, verbose, queue))
+    process.start()
+    result = None
+    while result is None and process.is_alive():
+        try:
+            result = queue.get(timeout=1.0)
+        except queue_module.Empty:
+            pass
+    process.join()
+    if 0 != process.exitcode:
+        panic("Stage {} failed with exit code {}".format(function.__name__, process.exitcode))
+    if result is None: # The process exited between two reads.
+        try:
+            result = queue.get(timeout=timeout)
+        except queue_module.Empty:
+            panic("Stage {} exited without a result".format(function.__name__))
+    if 'failed' in result:
+        panic("Stage {} failed:\n{}".format(function.__name__, result['failed']))
+    return result
+
+def Run_Benchmark(results_file, work_dir=None, stages=None, repeat=1, verbose=False, pages=10000, links_per_page=20, title_skew=1.0, oddities=0.1, redirects=0.05, seed=1, workers=1, engine='lines', canonical=False, memory_budget=None, compress=None):
+    print("Running Benchmark...\n")
+    start_time = time.time()
+    stages = stages or STAGES
+    generator = {'pages': pages, 'links_per_page': links_per_page, 'title_skew': title_skew, 'oddities': oddities, 'redirects': redirects, 'seed': seed}
+    settings = {'workers': workers, 'engine': engine, 'canonical': canonical, 'memory_budget': memory_budget, 'compress': compress}
+    keep_work_dir = work_dir is not None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='wiki_links_benchmark_')
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    try:
+        # The wiki file is named by its generator settings, so it is only generated once in a kept work_dir.
+        generator_key = hashlib.sha1(json.dumps(generator, sort_keys=True).encode()).hexdigest()[:12]
+        wiki_file = os.path.join(work_dir, 'synthetic_{}.xml'.format(generator_key))
+        if not os.path.isfile(wiki_file):
+            Generate_Wiki_File(wiki_file, **generator)
+        print("\n\tWiki file: {}\tSize: {} MB\n".format(wiki_file, "%.1f" % (os.path.getsize(wiki_file) / 1e6)))
+        files = Stage_Files(work_dir, compress)
+        results = {'generator': generator, 'settings': settings, 'stages': {}, 'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            function, args, kwargs, input_file, output_files = Stage_Plan(stage, wiki_file, files, settings)
+            if not os.path.isfile(input_file):
+                panic("The {} stage reads {}, run the stages before it too.".format(stage, input_file))
+            runs = [Run_Stage(function, args, kwargs, verbose) for run in range(repeat)]
+            best = min(runs, key=lambda run: run['seconds'])
+            seconds = max(best['seconds'], 1e-9)
+            results['stages'][stage] = {
+                'seconds': round(seconds, 4),
+                'pages_per_second': round(pages / seconds, 1),
+                'mb_per_second': round(os.path.getsize(input_file) / 1e6 / seconds, 2),
+                'peak_rss_mb': round(max(run['peak_rss_mb'] for run in runs), 1),
+                'output_bytes': dict((os.path.basename(output_file), os.path.getsize(output_file)) for output_file in output_files),
+            }
+            print("\t{:<14}{:>9} s{:>12} pages/s{:>9} MB/s{:>9} MB peak".format(stage, "%.2f" % seconds, "%.0f" % (pages / seconds), "%.1f" % results['stages'][stage]['mb_per_second'], "%.0f" % results['stages'][stage]['peak_rss_mb']))
+    finally:
+        if not keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    with open(results_file, 'w') as save_stream:
+        json.dump(results, save_stream, indent=2, sort_keys=True)
+    print("\nBenchmark Saved: {}\nDuration: {}".format(results_file, "%.2f" % (time.time() - start_time)))
+    return results
+
+def Compare_Results(results, baseline, tolerance=0.1):
+    # Prints each stage against the baseline, and returns the regressions as a list of strings.
+    print("\nComparing with Baseline...\n")
+    regressions = []
+    if results['generator'] != baseline['generator'] or results['settings'] != baseline['settings']:
+        print("\tThe baseline was run with other settings, the numbers aren't comparable:\n\t\t{} {}\n".format(baseline['generator'], baseline['settings']))
+    for stage in results['stages']:
+        if stage not in baseline['stages']:
+            print("\t{:<14}not in the baseline".format(stage))
+            continue
+        new = results['stages'][stage]
+        old = baseline['stages'][stage]
+        flags = []
+        if new['seconds'] > old['seconds'] * (1 + tolerance):
+            flags.append("SLOWER")
+        if new['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            flags.append("MORE MEMORY")
+        if new['output_bytes'] != old['output_bytes']:
+            flags.append("OUTPUT CHANGED")
+        print("\t{:<14}{:>9} s ({:+.1%}){:>9} MB ({:+.1%})  {}".format(stage, "%.2f" % new['seconds'], new['seconds'] / max(old['seconds'], 1e-9) - 1, "%.0f" % new['peak_rss_mb'], new['peak_rss_mb'] / max(old['peak_rss_mb'], 1e-9) - 1, " ".join(flags) or "ok"))
+        regressions.extend("{}: {}".format(stage, flag) for flag in flags)
+    return regressions
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the extraction stages on a seeded synthetic wiki file.")
+    parser.add_argument("--results-file", default="benchmark_results.json")
+    parser.add_argument("--baseline-file", default=None, help="Compare with these results, and exit with status 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Slow down or memory growth (fraction) that counts as a regression.")
+    parser.add_argument("--work-dir", default=None, help="Keep the wiki file & outputs here. Default: a temp dir, removed afterwards.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma separated stages, of: {}".format(", ".join(STAGES)))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each stage, the fastest is kept.")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own progress output.")
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--links-per-page", type=int, default=20)
+    parser.add_argument("--title-skew", type=float, default=1.0)
+    parser.add_argument("--oddities", type=float, default=0.1)
+    parser.add_argument("--redirects", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--engine", choices=["lines", "mmap"], default="lines")
+    parser.add_argument("--canonical", action="store_true")
+    parser.add_argument("--memory-budget", type=int, default=None)
+    parser.add_argument("--compress", choices=["gz", "zst", "bz2"], default=None)
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            panic("Unknown stage {}, the stages are: {}".format(stage, ", ".join(STAGES)))
+    results = Run_Benchmark(args.results_file, args.work_dir, stages, args.repeat, args.verbose, args.pages, args.links_per_page, args.title_skew, args.oddities, args.redirects, args.seed, args.workers, args.engine, args.canonical, args.memory_budget, args.compress)
+    if args.baseline_file:
+        with open(args.baseline_file, 'r') as read_stream:
+            baseline = json.load(read_stream)
+        regressions = Compare_Results(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n\t" + "\n\t".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions.")
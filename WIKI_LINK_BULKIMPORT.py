@@ -0,0 +1,109 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import os
+import subprocess
+import time
+
+import WIKI_LINK_STREAMS
+
+# Files for neo4j-admin import, the offline bulk loader for a fresh (empty) neo4j database.
+# master_ids.tsv is used as the node file as it is. relationships.tsv is copied without duplicate (source, dest) links:
+# a page title that appears twice in the wiki file has two runs of links, and a link keeps the strength of the first
+# run it is in, the same graph as WIKI_LINK_NEOCONNECT.Load_Relationships loads.
+#   [export_dir]/nodes_header.tsv           name  id:ID(Article)  (+ in/out_degree, in/out_strength with a node strength file)
+#   [export_dir]/relationships_header.tsv   :START_ID(Article)  :END_ID(Article)  strength:int
+#   [export_dir]/relationships.tsv
+# neo4j-admin import quotes fields with '"' by default, so a title holding '"' would be mis-read. BULK_IMPORT_QUOTE is
+# given as its quote character instead: '{' isn't allowed in MediaWiki titles, and titles with it are dropped by the
+# parser, so no field is ever read as quoted.
+
+BULK_IMPORT_QUOTE = "{"
+NODES_HEADER = "name\tid:ID(Article)\n"
+NODES_STRENGTH_HEADER = "name\tid:ID(Article)\tin_degree:int\tout_degree:int\tin_strength:int\tout_strength:int\n"
+RELATIONSHIPS_HEADER = ":START_ID(Article)\t:END_ID(Article)\tstrength:int\n"
+
+def Bulk_Import_Files(export_dir):
+    return os.path.join(export_dir, 'nodes_header.tsv'), os.path.join(export_dir, 'relationships_header.tsv'), os.path.join(export_dir, 'relationships.tsv')
+
+def Export_Bulk_Import(master_ids_file, relationships_file, export_dir, print_batch=10000000, node_strength_file=None):
+    # With a node_strength_file (WIKI_LINK_STRENGTH) the degree & strength columns are imported as node properties.
+    print("Saving neo4j-admin Import Files...\n")
+    start_time = time.time()
+    if not os.path.isdir(export_dir):
+        os.makedirs(export_dir)
+    nodes_header_file, relationships_header_file, export_relationships_file = Bulk_Import_Files(export_dir)
+
+    with open(nodes_header_file, 'w') as save_stream:
+        save_stream.write(NODES_HEADER if node_strength_file is None else NODES_STRENGTH_HEADER)
+    with open(relationships_header_file, 'w') as save_stream:
+        save_stream.write(RELATIONSHIPS_HEADER)
+
+    # Links of a page are written together, so a source can only have duplicate links if its links are split in more than one run.
+    # Only the dests of those sources are kept. Two runs of a source can follow each other: a run has a dest only once,
+    # so a dest seen again in the run makes the source repeated too.
+    print("\tFinding repeated pages...\n")
+    seen_sources = set()
+    repeated_sources = set()
+    current_source = None
+    current_dests = set()
+    with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+        for line in read_stream:
+            source, dest = line.split(b'\t', 2)[:2]
+            if source != current_source:
+                if source in seen_sources:
+                    repeated_sources.add(source)
+                seen_sources.add(source)
+                current_source = source
+                current_dests = set()
+            if dest in current_dests:
+                repeated_sources.add(source)
+            current_dests.add(dest)
+    seen_sources = None
+    current_dests = None
+
+    print("\tSaving relationships...\n")
+    repeated_links = {}
+    link_number = 0
+    duplicate_number = 0
+    with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+        with WIKI_LINK_STREAMS.Open_File(export_relationships_file, 'wb') as save_stream:
+            for line in read_stream:
+                source, dest, strength = line.split(b'\t', 2)
+                if not source: # Links found before the first page have no source.
+                    continue
+                if source in repeated_sources:
+                    dests = repeated_links.setdefault(source, set())
+                    if dest in dests:
+                        duplicate_number += 1
+                        continue
+                    dests.add(dest)
+                save_stream.write(line)
+                link_number += 1
+                if link_number % print_batch == 0:
+                    print("\tLink # {}".format(link_number))
+
+    print("\tLinks: {}\tDuplicates removed: {}\n".format(link_number, duplicate_number))
+    print("Import Files Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Bulk_Import_Command(master_ids_file, export_dir, database="graph.db", neo4j_admin="neo4j-admin", node_strength_file=None):
+    # neo4j 3.x neo4j-admin import arguments. The database must not exist yet.
+    # node_strength_file must be the same as given to Export_Bulk_Import.
+    nodes_header_file, relationships_header_file, export_relationships_file = Bulk_Import_Files(export_dir)
+    nodes_file = master_ids_file if node_strength_file is None else node_strength_file
+    return [neo4j_admin, "import",
+            "--mode=csv",
+            "--database={}".format(database),
+            "--id-type=INTEGER",
+            "--delimiter=TAB",
+            "--quote={}".format(BULK_IMPORT_QUOTE),
+            "--nodes:Article={},{}".format(os.path.abspath(nodes_header_file), os.path.abspath(nodes_file)),
+            "--relationships:LINKSTO={},{}".format(os.path.abspath(relationships_header_file), os.path.abspath(export_relationships_file))]
+
+def Run_Bulk_Import(master_ids_file, export_dir, database="graph.db", neo4j_admin="neo4j-admin", node_strength_file=None):
+    # Run with the neo4j server stopped. Create the constraints (WIKI_LINK_NEOCONNECT.CONSTRAINT_QUERIES) once it is started again.
+    command = Bulk_Import_Command(master_ids_file, export_dir, database, neo4j_admin, node_strength_file)
+    print("Running neo4j-admin Import...\n\t{}\n".format(" ".join(command)))
+    start_time = time.time()
+    subprocess.check_call(command)
+    print("Import Complete!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
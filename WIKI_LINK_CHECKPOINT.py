@@ -0,0 +1,69 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import json
+import os
+import sys
+
+import WIKI_LINK_STREAMS
+
+# Checkpoints for long running stages, saved next to the stage's output file as [output_file].checkpoint.
+# A checkpoint is only saved at a page boundary, and holds the input offset to read on from, the output offset
+# to truncate the output to, and whatever other state the stage needs (page counters, current page ID, ...).
+# The checkpoint is removed once the stage has finished.
+# Offsets are byte offsets, so there are only checkpoints for plain (not compressed) files, see Checkpointable.
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Checkpoint_File(output_file):
+    return output_file + '.checkpoint'
+
+def Checkpointable(output_file, input_file=None):
+    # The output file, and the input file if it is read by offset, must not be compressed (WIKI_LINK_STREAMS).
+    return not WIKI_LINK_STREAMS.Compression(output_file) and (input_file is None or not WIKI_LINK_STREAMS.Compression(input_file))
+
+def Save_Checkpoint(output_file, save_stream, stage, input_file, **state):
+    # Everything written to save_stream so far is flushed to disk before the checkpoint is saved.
+    save_stream.flush()
+    os.fsync(save_stream.fileno())
+    input_stat = os.stat(input_file)
+    checkpoint = dict(state, stage=stage, input_file=os.path.abspath(input_file), input_size=input_stat.st_size, input_mtime=input_stat.st_mtime, output_offset=save_stream.tell())
+    checkpoint_file = Checkpoint_File(output_file)
+    with open(checkpoint_file + '.tmp', 'w') as checkpoint_stream:
+        json.dump(checkpoint, checkpoint_stream)
+        checkpoint_stream.flush()
+        os.fsync(checkpoint_stream.fileno())
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+def Load_Checkpoint(output_file, stage, input_file):
+    # Returns the checkpoint of output_file, or None if there isn't one.
+    checkpoint_file = Checkpoint_File(output_file)
+    if not os.path.isfile(checkpoint_file):
+        print("\tNo checkpoint for {}, starting from the beginning.\n".format(output_file))
+        return None
+    with open(checkpoint_file, 'r') as checkpoint_stream:
+        checkpoint = json.load(checkpoint_stream)
+    input_stat = os.stat(input_file)
+    if checkpoint['stage'] != stage:
+        panic("Checkpoint {} is for the {} stage, not {}.".format(checkpoint_file, checkpoint['stage'], stage))
+    if checkpoint['input_file'] != os.path.abspath(input_file) or checkpoint['input_size'] != input_stat.st_size or checkpoint['input_mtime'] != input_stat.st_mtime:
+        panic("Checkpoint {} was saved for a different {}.".format(checkpoint_file, input_file))
+    if not os.path.isfile(output_file) or os.path.getsize(output_file) < checkpoint['output_offset']:
+        panic("{} is shorter than its checkpoint {}.".format(output_file, checkpoint_file))
+    return checkpoint
+
+def Open_Output(output_file, checkpoint):
+    # Open output_file for binary writing, truncated to the checkpoint if there is one.
+    if checkpoint is None:
+        return WIKI_LINK_STREAMS.Open_File(output_file, 'wb')
+    save_stream = open(output_file, 'r+b', buffering=WIKI_LINK_STREAMS.BUFFER_SIZE)
+    save_stream.truncate(checkpoint['output_offset'])
+    save_stream.seek(checkpoint['output_offset'])
+    return save_stream
+
+def Clear_Checkpoint(output_file):
+    checkpoint_file = Checkpoint_File(output_file)
+    if os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file)
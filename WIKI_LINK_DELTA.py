@@ -0,0 +1,283 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import WIKI_LINK_EXTSORT
+import WIKI_LINK_PARSE
+import WIKI_LINK_STREAMS
+import WIKI_LINK_TITLES
+
+# Incremental update between two wiki dump releases.
+# IDs of the previous master_ids file are kept, and only titles that are new get new IDs, appended at the end.
+# The revision <sha1> of every page is saved in page_sha1_file (title\tsha1). Pages whose sha1 is the same as in
+# the previous page_sha1_file are skipped. For the other pages (and pages that are gone) the links are compared with
+# the previous relationships file, and only the differences are written:
+#   [master_ids]_added.tsv            title  id                 New nodes.
+#   [relationships]_added.tsv         source  dest  strength    New links.
+#   [relationships]_removed.tsv       source  dest  strength    Links that are gone (with their old strength).
+#   [relationships]_changed.tsv       source  dest  strength    Links with a new strength.
+# The full master_ids, relationships and page_sha1 files are written too, ready to be the previous files of the next run.
+# In those, the links of changed pages are moved to the end of relationships.
+# Within one dump a title is a page only the first time it is seen, later pages with the same title are ignored.
+# Without previous files every page is new, which makes the first (baseline) run.
+# Memory doesn't grow with the pages or the links, apart from the title table: the links of every page are spilled to
+# temp_dir in page order while the dump is read, and the sha1s of the pages by title ID. The sha1s of the previous
+# page_sha1 file are sorted the same way and merge-joined with them, to find the unchanged pages. The new links of the
+# other pages and their previous links are then sorted (WIKI_LINK_EXTSORT.EXTERNAL_SORTER, memory_budget bytes between
+# them) and compared by a merge, so the difference files are in (source, dest) order. Pages & unchanged pages are kept
+# as bitmaps of their ids. Every file goes through WIKI_LINK_STREAMS, so any of them may be compressed.
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Delta_Files(file_name):
+    base, extension = WIKI_LINK_STREAMS.Split_Extension(file_name)
+    return base + '_added' + extension, base + '_removed' + extension, base + '_changed' + extension
+
+def Iter_Page_Sha1_Links(records):
+    # Group 'T'/'L'/'S' records into (page title, sha1, {dest title: strength}).
+    # Links (and sha1s) found before the first title are dropped.
+    current_page = None
+    current_sha1 = []
+    current_page_dest_strength = {}
+    for kind, value in records:
+        if 'L' == kind:
+            try:
+                current_page_dest_strength[value] += 1
+            except KeyError:
+                current_page_dest_strength[value] = 1
+        elif 'S' == kind:
+            current_sha1.append(value)
+        elif 'T' == kind:
+            if current_page is not None:
+                yield current_page, ','.join(current_sha1), current_page_dest_strength
+            current_page = value
+            current_sha1 = []
+            current_page_dest_strength = {}
+    if current_page is not None:
+        yield current_page, ','.join(current_sha1), current_page_dest_strength
+
+LINK_FORMAT = b"%08x\t%08x\t%d\n" # Sorted runs: fixed width hex ids sort as bytes in (source, dest) order.
+SHA1_FORMAT = b"%08x\t%s\n" # Sorted runs of (page id, sha1).
+
+class ID_SET(object):
+    # A set of ids (>= 0) as a bitmap, which takes (highest id) / 8 bytes.
+
+    def __init__(self):
+        self.bits = bytearray()
+
+    def Add(self, value):
+        byte, bit = divmod(value, 8)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+        self.bits[byte] |= 1 << bit
+
+    def __contains__(self, value):
+        byte, bit = divmod(value, 8)
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << bit))
+
+def Iter_Sorted_Links(lines):
+    # (source, dest, strength) of LINK_FORMAT lines sorted by (source, dest). Strengths of repeated links are summed.
+    current = None
+    current_strength = 0
+    for line in lines:
+        source, dest, strength = line.split(b'\t')
+        if (source, dest) != current:
+            if current is not None:
+                yield int(current[0], 16), int(current[1], 16), current_strength
+            current = (source, dest)
+            current_strength = 0
+        current_strength += int(strength)
+    if current is not None:
+        yield int(current[0], 16), int(current[1], 16), current_strength
+
+def Iter_Sorted_Sha1(lines):
+    # (page id, sha1) of SHA1_FORMAT lines.
+    for line in lines:
+        page_id, sha1 = line[:-1].split(b'\t')
+        yield int(page_id, 16), sha1
+
+def Iter_Sha1_Changes(old_sha1, new_sha1):
+    # Merges two Iter_Sorted_Sha1 into (page id, old sha1 or None, new sha1 or None).
+    old = next(old_sha1, None)
+    new = next(new_sha1, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[0], old[1], None
+            old = next(old_sha1, None)
+        elif old is None or new[0] < old[0]:
+            yield new[0], None, new[1]
+            new = next(new_sha1, None)
+        else:
+            yield old[0], old[1], new[1]
+            old = next(old_sha1, None)
+            new = next(new_sha1, None)
+
+def Iter_Link_Changes(old_links, new_links):
+    # Merges two Iter_Sorted_Links into (source, dest, old strength or None, new strength or None).
+    old = next(old_links, None)
+    new = next(new_links, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[:2] < new[:2]):
+            yield old[0], old[1], old[2], None
+            old = next(old_links, None)
+        elif old is None or new[:2] < old[:2]:
+            yield new[0], new[1], None, new[2]
+            new = next(new_links, None)
+        else:
+            yield old[0], old[1], old[2], new[2]
+            old = next(old_links, None)
+            new = next(new_links, None)
+
+def Delta_Update(wiki_file, master_ids_file, relationships_file, page_sha1_file, previous_master_ids_file=None, previous_relationships_file=None, previous_page_sha1_file=None, print_batch=177000, workers=1, chunk_size=64 * 1024 * 1024, wiki_index_file=None, engine='lines', memory_budget=256 * 1024 * 1024, temp_dir=None):
+    print("Saving Delta Update...\n")
+    start_time = time.time()
+    batch_time = start_time
+    previous_files = (previous_master_ids_file, previous_relationships_file, previous_page_sha1_file)
+    if any(previous_files) and not all(previous_files):
+        panic("A delta update needs all of the previous master ids, relationships and page sha1 files.")
+    if any(os.path.abspath(previous) == os.path.abspath(current) for previous, current in zip(previous_files, (master_ids_file, relationships_file, page_sha1_file)) if previous):
+        panic("The previous files must not be overwritten by the delta update.")
+
+    print("\tLoading previous Master IDs...\n")
+    if previous_master_ids_file is not None:
+        titles = WIKI_LINK_TITLES.Load_Master_IDs(previous_master_ids_file)
+    else:
+        titles = WIKI_LINK_TITLES.TITLE_TABLE()
+    previous_count = len(titles)
+
+    temp_dir = WIKI_LINK_EXTSORT.Make_Temp_Dir(temp_dir, relationships_file)
+    try:
+        # 1. Read the pages: their sha1s are spilled by ID, and their links in page order. IDs are given to titles in the
+        #    same order whether a page turns out to be changed or not, as an unchanged page only links to known titles.
+        print("\tReading pages...\n")
+        pages = ID_SET()
+        new_sha1 = WIKI_LINK_EXTSORT.EXTERNAL_SORTER(temp_dir, max(memory_budget // 2, 1), 'new_sha1')
+        page_links_file = os.path.join(temp_dir, 'page_links')
+        page_number = 0
+        records = WIKI_LINK_PARSE.Iter_Reduced_Records(WIKI_LINK_PARSE.Iter_Reduced_Chunks(wiki_file, workers, chunk_size, wiki_index_file, options={'sha1': True, 'engine': engine}))
+        with WIKI_LINK_STREAMS.Open_File(page_sha1_file, 'wb') as sha1_stream, WIKI_LINK_STREAMS.Open_File(page_links_file, 'wb', compression='') as links_stream:
+            for page, sha1, dest_strength in Iter_Page_Sha1_Links(records):
+                page_number += 1
+                if page_number % print_batch == 0:
+                    print("\tPage: {}\tTime: {}\tPages per Second: {}".format(page_number, ("%.2f" % (time.time() - start_time)), "%.0f" % (print_batch / (time.time() - batch_time))))
+                    batch_time = time.time()
+                page = page.encode('utf-8')
+                sha1 = sha1.encode('utf-8')
+                page_id, new = titles.Add(page)
+                if not new and page_id in pages:
+                    continue
+                pages.Add(page_id)
+                sha1_stream.write(page + b'\t' + sha1 + b'\n')
+                new_sha1.Add(SHA1_FORMAT % (page_id, sha1))
+                for dest in dest_strength:
+                    links_stream.write(b"%d\t%d\t%d\n" % (page_id, titles.Add(dest.encode('utf-8'))[0], dest_strength[dest]))
+
+        # 2. Join the sha1s with the previous ones by page ID.
+        print("\tComparing pages...\n")
+        old_sha1 = WIKI_LINK_EXTSORT.EXTERNAL_SORTER(temp_dir, max(memory_budget // 2, 1), 'old_sha1')
+        if previous_page_sha1_file is not None:
+            with WIKI_LINK_STREAMS.Open_File(previous_page_sha1_file, 'rb') as read_stream:
+                for line in read_stream:
+                    title, sha1 = line.split(b'\n')[0].split(b'\t')
+                    page_id = titles.Find(title)
+                    if page_id >= 0:
+                        old_sha1.Add(SHA1_FORMAT % (page_id, sha1))
+        unchanged_pages = ID_SET()
+        changed_number = 0
+        removed_number = 0
+        for page_id, old, new in Iter_Sha1_Changes(Iter_Sorted_Sha1(old_sha1.Sorted()), Iter_Sorted_Sha1(new_sha1.Sorted())):
+            if old == new:
+                unchanged_pages.Add(page_id)
+            elif new is None:
+                removed_number += 1
+            else:
+                changed_number += 1
+        print("\tPages: {}\tChanged or new: {}\tRemoved: {}\n".format(page_number, changed_number, removed_number))
+
+        # 3. Copy the links of unchanged pages, then the links of the others. Both their previous & new links are spilled.
+        print("\tSaving Relationships...\n")
+        old_links = WIKI_LINK_EXTSORT.EXTERNAL_SORTER(temp_dir, max(memory_budget // 2, 1), 'old_links')
+        new_links = WIKI_LINK_EXTSORT.EXTERNAL_SORTER(temp_dir, max(memory_budget // 2, 1), 'new_links')
+        with WIKI_LINK_STREAMS.Open_File(relationships_file, 'wb') as save_stream:
+            if previous_relationships_file is not None:
+                with WIKI_LINK_STREAMS.Open_File(previous_relationships_file, 'rb') as read_stream:
+                    for line in read_stream:
+                        l = line.split(b'\t')
+                        if l[0] and int(l[0]) not in unchanged_pages:
+                            old_links.Add(LINK_FORMAT % (int(l[0]), int(l[1]), int(l[2])))
+                        else:
+                            save_stream.write(line)
+            with WIKI_LINK_STREAMS.Open_File(page_links_file, 'rb', compression='') as read_stream:
+                for line in read_stream:
+                    l = line.split(b'\t')
+                    if int(l[0]) not in unchanged_pages:
+                        save_stream.write(line)
+                        new_links.Add(LINK_FORMAT % (int(l[0]), int(l[1]), int(l[2])))
+        os.remove(page_links_file)
+
+        # 4. Differences
+        print("\tSaving Relationship Differences...\n")
+        added_file, removed_file, changed_file = Delta_Files(relationships_file)
+        added_number = removed_number = strength_number = 0
+        with WIKI_LINK_STREAMS.Open_File(added_file, 'wb') as added_stream, WIKI_LINK_STREAMS.Open_File(removed_file, 'wb') as removed_stream, WIKI_LINK_STREAMS.Open_File(changed_file, 'wb') as changed_stream:
+            for source_id, dest_id, old_strength, new_strength in Iter_Link_Changes(Iter_Sorted_Links(old_links.Sorted()), Iter_Sorted_Links(new_links.Sorted())):
+                if old_strength is None:
+                    added_stream.write(b"%d\t%d\t%d\n" % (source_id, dest_id, new_strength))
+                    added_number += 1
+                elif new_strength is None:
+                    removed_stream.write(b"%d\t%d\t%d\n" % (source_id, dest_id, old_strength))
+                    removed_number += 1
+                elif old_strength != new_strength:
+                    changed_stream.write(b"%d\t%d\t%d\n" % (source_id, dest_id, new_strength))
+                    strength_number += 1
+        print("\tLinks added: {}\tremoved: {}\tchanged: {}\n".format(added_number, removed_number, strength_number))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # 5. Master IDs: the previous IDs, then the new ones.
+    print("\tSaving Master IDs...\n")
+    if previous_master_ids_file is None:
+        WIKI_LINK_STREAMS.Open_File(master_ids_file, 'wb').close()
+    elif WIKI_LINK_STREAMS.Compression(previous_master_ids_file) == WIKI_LINK_STREAMS.Compression(master_ids_file):
+        shutil.copyfile(previous_master_ids_file, master_ids_file)
+    else:
+        with WIKI_LINK_STREAMS.Open_File(previous_master_ids_file, 'rb') as read_stream, WIKI_LINK_STREAMS.Open_File(master_ids_file, 'wb') as save_stream:
+            shutil.copyfileobj(read_stream, save_stream, WIKI_LINK_STREAMS.BUFFER_SIZE)
+    # New IDs are appended, a compressed master ids file gets one more gzip member / zstd frame / bz2 stream.
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'ab') as save_stream, WIKI_LINK_STREAMS.Open_File(Delta_Files(master_ids_file)[0], 'wb') as added_stream:
+        for title_id in range(previous_count, len(titles)):
+            line = titles.Title(title_id) + b'\t' + str(title_id).encode() + b'\n'
+            save_stream.write(line)
+            added_stream.write(line)
+    titles.Save(WIKI_LINK_TITLES.Title_Table_File(master_ids_file))
+    print("\tNew IDs: {}\n".format(len(titles) - previous_count))
+
+    print("Delta Update Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Update master ids & relationships from a new wiki dump, keeping the previous IDs.")
+    parser.add_argument("wiki_file")
+    parser.add_argument("output_dir", help="Directory for the new master_ids.tsv, relationships.tsv, page_sha1.tsv and the difference files.")
+    parser.add_argument("--previous-dir", default=None, help="output_dir of the previous run. Without it, a baseline is made.")
+    parser.add_argument("--wiki-index-file", default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--engine", choices=["lines", "mmap"], default="lines")
+    parser.add_argument("--memory-budget", type=int, default=256 * 1024 * 1024, help="Bytes of links held in memory before they are spilled to temp-dir.")
+    parser.add_argument("--temp-dir", default=None, help="Default: next to the relationships file.")
+    args = parser.parse_args()
+
+    def Files(directory):
+        return [os.path.join(directory, name) for name in ("master_ids.tsv", "relationships.tsv", "page_sha1.tsv")]
+
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    previous_files = Files(args.previous_dir) if args.previous_dir else [None, None, None]
+    Delta_Update(args.wiki_file, *(Files(args.output_dir) + previous_files), workers=args.workers, wiki_index_file=args.wiki_index_file, engine=args.engine, memory_budget=args.memory_budget, temp_dir=args.temp_dir)
@@ -0,0 +1,269 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import WIKI_LINK_METRICS
+import WIKI_LINK_STREAMS
+
+# Out of core versions of WIKI_LINK_PARSE.Save_Node_IDs and Save_Relationships for dumps whose titles don't fit in memory.
+# Records are tab separated byte lines which are sorted in runs of at most memory_budget bytes, spilled to temp_dir,
+# and merged back. IDs are assigned from a merge, and relationship endpoints are resolved with sort-merge joins
+# against the title sorted master ids, so peak memory stays at about memory_budget whatever the size of the dump.
+# Titles never contain characters below '\t' (they are not allowed in xml), so sorting whole 'title\t...' lines
+# sorts them by title.
+# Sequence numbers are written as fixed width hex so they sort as bytes.
+# Progress is reported through a WIKI_LINK_METRICS.STAGE_METRICS, like the stages of WIKI_LINK_PARSE.
+
+SEQ_FORMAT = b'%016x'
+RECORD_OVERHEAD = 64 # Approximate python bytes object + list slot overhead for each record held in memory.
+MERGE_FAN_IN = 128
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Make_Temp_Dir(temp_dir, output_file):
+    # A new directory for the runs, in temp_dir (made if it isn't there yet) or next to output_file.
+    temp_dir = temp_dir or os.path.dirname(os.path.abspath(output_file))
+    try:
+        os.makedirs(temp_dir, exist_ok=True)
+        return tempfile.mkdtemp(prefix='wiki_links_', dir=temp_dir)
+    except OSError as error:
+        panic("Can't make a temp directory in {}: {}".format(temp_dir, error))
+
+class EXTERNAL_SORTER(object):
+    # Collects byte lines, spilling sorted runs to temp_dir once memory_budget bytes are held, and merges them back in order.
+
+    def __init__(self, temp_dir, memory_budget, name):
+        self.temp_dir = temp_dir
+        self.memory_budget = memory_budget
+        self.name = name
+        self.lines = []
+        self.used = 0
+        self.runs = []
+        self.run_count = 0
+
+    def Add(self, line):
+        self.lines.append(line)
+        self.used += len(line) + RECORD_OVERHEAD
+        if self.used >= self.memory_budget:
+            self._Spill()
+
+    def _Run_File(self):
+        self.run_count += 1
+        return os.path.join(self.temp_dir, "{}.{}.run".format(self.name, self.run_count))
+
+    def _Spill(self):
+        self.lines.sort()
+        run_file = self._Run_File()
+        with open(run_file, 'wb') as save_stream:
+            save_stream.writelines(self.lines)
+        self.runs.append(run_file)
+        self.lines = []
+        self.used = 0
+
+    def _Merge_Runs(self, runs):
+        streams = [open(run_file, 'rb') for run_file in runs]
+        try:
+            run_file = self._Run_File()
+            with open(run_file, 'wb') as save_stream:
+                save_stream.writelines(heapq.merge(*streams))
+        finally:
+            for stream, old_run_file in zip(streams, runs):
+                stream.close()
+                os.remove(old_run_file)
+        return run_file
+
+    def Sorted(self):
+        # Yields every line added, in sorted order. The sorter is emptied.
+        if not self.runs:
+            self.lines.sort()
+            lines = self.lines
+            self.lines = []
+            self.used = 0
+            for line in lines:
+                yield line
+            return
+        if self.lines:
+            self._Spill()
+        while len(self.runs) > MERGE_FAN_IN:
+            runs = self.runs[:MERGE_FAN_IN]
+            self.runs = self.runs[MERGE_FAN_IN:]
+            self.runs.append(self._Merge_Runs(runs))
+        streams = [open(run_file, 'rb') for run_file in self.runs]
+        try:
+            for line in heapq.merge(*streams):
+                yield line
+        finally:
+            for stream, run_file in zip(streams, self.runs):
+                stream.close()
+                os.remove(run_file)
+            self.runs = []
+
+def Join_IDs(sorted_lines, sorted_master_ids):
+    # Sort-merge join of 'title\trest' lines with 'title\tid' lines, both sorted by title.
+    # Yields (id, rest) for each line of sorted_lines.
+    master_title = None
+    master_id = None
+    for line in sorted_lines:
+        title, rest = line.split(b'\t', 1)
+        while master_title is None or master_title < title:
+            master_line = next(sorted_master_ids, None)
+            if master_line is None:
+                panic("Title {} is missing from the master ids".format(title))
+            master_title, master_id = master_line.split(b'\n')[0].split(b'\t')
+        if master_title != title:
+            panic("Title {} is missing from the master ids".format(title))
+        yield master_id, rest
+
+def Save_Node_IDs_External(wiki_reduced_file, master_ids_file, memory_budget, temp_dir=None, print_batch=400000):
+    print("Saving Master ID Table (external sort, memory budget: {} bytes)...\n".format(memory_budget))
+    start_time = time.time()
+    temp_dir = Make_Temp_Dir(temp_dir, master_ids_file)
+    try:
+        # 1. Sort (title, first record number) runs, keeping the first record number of each title within a run.
+        print("\tSorting titles...\n")
+        # The first_seen dict and the sorter each get half of the budget.
+        budget = max(memory_budget // 2, 1)
+        by_title = EXTERNAL_SORTER(temp_dir, budget, 'titles')
+        first_seen = {}
+        used = 0
+        metrics = WIKI_LINK_METRICS.STAGE_METRICS('node_ids', WIKI_LINK_STREAMS.Input_Size(wiki_reduced_file))
+        with WIKI_LINK_STREAMS.Open_File(wiki_reduced_file, 'rb') as file_stream:
+            for seq, line in enumerate(file_stream):
+                if seq % WIKI_LINK_METRICS.UPDATE_BATCH == 0:
+                    metrics.Update(bytes_read=WIKI_LINK_METRICS.Stream_Position(file_stream))
+                if b'\n' != line:
+                    title = line.split(b'\n')[0].split(b'\t')[1]
+                    if title not in first_seen:
+                        first_seen[title] = seq
+                        used += len(title) + 2 * RECORD_OVERHEAD
+                        if used >= budget:
+                            for seen_title in first_seen:
+                                by_title.Add(seen_title + b'\t' + SEQ_FORMAT % first_seen[seen_title] + b'\n')
+                            first_seen = {}
+                            used = 0
+            metrics.Update(bytes_read=WIKI_LINK_METRICS.Stream_Position(file_stream))
+        for title in first_seen:
+            by_title.Add(title + b'\t' + SEQ_FORMAT % first_seen[title] + b'\n')
+        first_seen = None
+
+        # 2. Merge the runs, keep the first appearance of each title, and re-sort by first appearance.
+        print("\tMerging titles...\n")
+        by_seq = EXTERNAL_SORTER(temp_dir, memory_budget, 'first_seen')
+        last_title = None
+        for line in by_title.Sorted():
+            title, seq = line.split(b'\t')
+            if title != last_title:
+                by_seq.Add(seq.split(b'\n')[0] + b'\t' + title + b'\n')
+                last_title = title
+
+        # 3. IDs are assigned in order of first appearance, the same as Save_Node_IDs.
+        title_id = -1
+        with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'wb') as save_stream:
+            for title_id, line in enumerate(by_seq.Sorted()):
+                title = line.split(b'\t', 1)[1]
+                save_stream.write(title[:-1] + b'\t' + str(title_id).encode() + b'\n')
+                if (title_id + 1) % WIKI_LINK_METRICS.UPDATE_BATCH == 0 or (title_id + 1) % print_batch == 0:
+                    metrics.Update(ids=title_id + 1, bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+                    if (title_id + 1) % print_batch == 0:
+                        metrics.Print()
+            metrics.Update(ids=title_id + 1, bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+        metrics.Finish()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    print("Table Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Save_Relationships_External(wiki_reduced_file, master_ids_file, relationships_file, memory_budget, temp_dir=None, print_batch=177000):
+    print("Saving Relationships File (external sort, memory budget: {} bytes)...\n".format(memory_budget))
+    start_time = time.time()
+    temp_dir = Make_Temp_Dir(temp_dir, relationships_file)
+    # Each sort gets its own share of the budget, since up to three are in use at once.
+    budget = max(memory_budget // 3, 1)
+    try:
+        # 1. Split the reduced file into pages (title, page number) and edges (dest, edge number, page number, strength).
+        print("\tSorting pages & links...\n")
+        pages = EXTERNAL_SORTER(temp_dir, budget, 'pages')
+        edges = EXTERNAL_SORTER(temp_dir, budget, 'edges')
+        page_number = 0
+        edge_number = 0
+        link_number = 0
+        current_page_dest_strength = {}
+        metrics = WIKI_LINK_METRICS.STAGE_METRICS('relationships', WIKI_LINK_STREAMS.Input_Size(wiki_reduced_file))
+
+        with WIKI_LINK_STREAMS.Open_File(wiki_reduced_file, 'rb') as read_stream:
+            for line in read_stream:
+                if b'\n' != line:
+                    if b'L' == line[:1]:
+                        try:
+                            current_page_dest_strength[line[2:-1]] += 1
+                        except KeyError:
+                            current_page_dest_strength[line[2:-1]] = 1
+                        link_number += 1
+                    elif b'T' == line[:1]:
+                        for dest in current_page_dest_strength:
+                            edges.Add(dest + b'\t' + SEQ_FORMAT % edge_number + b'\t' + SEQ_FORMAT % page_number + b'\t' + str(current_page_dest_strength[dest]).encode() + b'\n')
+                            edge_number += 1
+                        current_page_dest_strength = {}
+                        page_number += 1
+                        pages.Add(line[2:-1] + b'\t' + SEQ_FORMAT % page_number + b'\n')
+                        if page_number % WIKI_LINK_METRICS.UPDATE_BATCH == 0 or page_number % print_batch == 0:
+                            metrics.Update(pages=page_number, links=link_number, bytes_read=WIKI_LINK_METRICS.Stream_Position(read_stream))
+                            if page_number % print_batch == 0:
+                                metrics.Print()
+            for dest in current_page_dest_strength:
+                edges.Add(dest + b'\t' + SEQ_FORMAT % edge_number + b'\t' + SEQ_FORMAT % page_number + b'\t' + str(current_page_dest_strength[dest]).encode() + b'\n')
+                edge_number += 1
+            current_page_dest_strength = None
+            metrics.Update(pages=page_number, links=link_number, bytes_read=WIKI_LINK_METRICS.Stream_Position(read_stream))
+
+        # 2. Sort the master ids by title so they can be joined with pages and edges.
+        print("\tSorting master ids...\n")
+        master_ids = EXTERNAL_SORTER(temp_dir, budget, 'master_ids')
+        with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'rb') as read_stream:
+            for line in read_stream:
+                master_ids.Add(line)
+        master_ids_sorted = os.path.join(temp_dir, 'master_ids.sorted')
+        with open(master_ids_sorted, 'wb') as save_stream:
+            save_stream.writelines(master_ids.Sorted())
+
+        # 3. Join pages to get (page number, source id), sorted by page number.
+        print("\tJoining pages...\n")
+        page_ids = EXTERNAL_SORTER(temp_dir, budget, 'page_ids')
+        with open(master_ids_sorted, 'rb') as master_stream:
+            for page_id, page_seq in Join_IDs(pages.Sorted(), master_stream):
+                page_ids.Add(page_seq[:-1] + b'\t' + page_id + b'\n')
+        page_ids_sorted = os.path.join(temp_dir, 'page_ids.sorted')
+        with open(page_ids_sorted, 'wb') as save_stream:
+            save_stream.writelines(page_ids.Sorted())
+
+        # 4. Join edges to get (edge number, page number, dest id, strength), sorted by edge number.
+        print("\tJoining links...\n")
+        edge_ids = EXTERNAL_SORTER(temp_dir, budget, 'edge_ids')
+        with open(master_ids_sorted, 'rb') as master_stream:
+            for dest_id, rest in Join_IDs(edges.Sorted(), master_stream):
+                edge_seq, page_seq, strength = rest.split(b'\t')
+                edge_ids.Add(edge_seq + b'\t' + page_seq + b'\t' + dest_id + b'\t' + strength)
+
+        # 5. Edges and pages are both in page order now, walk them together to write the relationships.
+        print("\tSaving Relationships File...\n")
+        with open(page_ids_sorted, 'rb') as page_stream:
+            with WIKI_LINK_STREAMS.Open_File(relationships_file, 'wb') as save_stream:
+                current_seq = SEQ_FORMAT % 0
+                current_page = b""
+                for line in edge_ids.Sorted():
+                    edge_seq, page_seq, dest_id, strength = line.split(b'\t')
+                    while current_seq < page_seq:
+                        current_seq, current_page = page_stream.readline().split(b'\n')[0].split(b'\t')
+                    save_stream.write(current_page + b'\t' + dest_id + b'\t' + strength)
+                metrics.Update(bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+        metrics.Finish()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    print("Relationships Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
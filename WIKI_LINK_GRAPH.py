@@ -0,0 +1,106 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import array
+import mmap
+import os
+import time
+
+import WIKI_LINK_STREAMS
+
+# Binary CSR (compressed sparse row) form of relationships.tsv.
+#   [csr_prefix].offsets   int64 * (node count + 1)  Links of node n are [offsets[n], offsets[n+1]) in the arrays below.
+#   [csr_prefix].dest      int32 * link count         Destination node ids.
+#   [csr_prefix].strength  int32 * link count         Link strengths.
+# Arrays are written in native byte order. Links of each source keep their relationships.tsv order.
+
+def CSR_Files(csr_prefix):
+    return csr_prefix + '.offsets', csr_prefix + '.dest', csr_prefix + '.strength'
+
+def Count_Lines(file_name):
+    count = 0
+    with WIKI_LINK_STREAMS.Open_File(file_name, 'rb') as read_stream:
+        for line in read_stream:
+            count += 1
+    return count
+
+def Save_CSR_Graph(master_ids_file, relationships_file, csr_prefix, print_batch=10000000):
+    print("Saving CSR Graph...\n")
+    start_time = time.time()
+    offsets_file, dest_file, strength_file = CSR_Files(csr_prefix)
+
+    node_count = Count_Lines(master_ids_file)
+
+    print("\tCounting links per node...\n")
+    offsets = array.array('q', [0]) * (node_count + 1)
+    with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+        for line in read_stream:
+            source = line.split(b'\t', 1)[0]
+            if source: # Links found before the first page have no source.
+                offsets[int(source) + 1] += 1
+    for node_id in range(node_count):
+        offsets[node_id + 1] += offsets[node_id]
+    link_count = offsets[node_count]
+    with open(offsets_file, 'wb') as save_stream:
+        offsets.tofile(save_stream)
+
+    print("\tSaving {} links for {} nodes...\n".format(link_count, node_count))
+    cursor = offsets[:-1]
+    with open(dest_file, 'w+b') as dest_stream, open(strength_file, 'w+b') as strength_stream:
+        dest_stream.truncate(link_count * 4)
+        strength_stream.truncate(link_count * 4)
+        if link_count:
+            dest_map = mmap.mmap(dest_stream.fileno(), 0)
+            strength_map = mmap.mmap(strength_stream.fileno(), 0)
+            dest = memoryview(dest_map).cast('i')
+            strength = memoryview(strength_map).cast('i')
+            with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+                for link_number, line in enumerate(read_stream):
+                    l = line.split(b'\t')
+                    if l[0]:
+                        source = int(l[0])
+                        position = cursor[source]
+                        dest[position] = int(l[1])
+                        strength[position] = int(l[2])
+                        cursor[source] = position + 1
+                    if (link_number + 1) % print_batch == 0:
+                        print("\tLink # {}".format(link_number + 1))
+            dest.release()
+            strength.release()
+            dest_map.close()
+            strength_map.close()
+
+    print("CSR Graph Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+class CSR_GRAPH(object):
+    # Memory maps a CSR graph saved by Save_CSR_Graph. Nothing is copied, the OS pages the arrays in as they are used.
+
+    def __init__(self, csr_prefix):
+        self.maps = []
+        self.offsets, self.dest, self.strength = [self._Map(file_name, code) for file_name, code in zip(CSR_Files(csr_prefix), 'qii')]
+        self.node_count = len(self.offsets) - 1
+        self.link_count = len(self.dest)
+
+    def _Map(self, file_name, code):
+        with open(file_name, 'rb') as read_stream:
+            if 0 == os.fstat(read_stream.fileno()).st_size:
+                return memoryview(array.array(code))
+            file_map = mmap.mmap(read_stream.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(file_map)
+        return memoryview(file_map).cast(code)
+
+    def Out_Degree(self, node_id):
+        return self.offsets[node_id + 1] - self.offsets[node_id]
+
+    def Neighbors(self, node_id):
+        # Returns (destination ids, strengths) of node_id as memoryviews into the mapped files.
+        start = self.offsets[node_id]
+        end = self.offsets[node_id + 1]
+        return self.dest[start:end], self.strength[start:end]
+
+    def Close(self):
+        for values in (self.offsets, self.dest, self.strength):
+            values.release()
+        for file_map in self.maps:
+            file_map.close()
+        self.maps = []
@@ -0,0 +1,274 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import io
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# Progress metrics of the long running stages (WIKI_LINK_PARSE, WIKI_LINK_EXTSORT, WIKI_LINK_NEOCONNECT).
+# A stage makes a STAGE_METRICS and updates its counters as it goes:
+#   pages, links, ids, rows (sent to neo4j), bytes_read (the input byte offset), bytes_written
+# Each sample adds the current RSS of the process (not of the worker processes), the rates since the stage started,
+# and the progress & ETA of the input byte offset, when the input size is known (a plain file, see
+# WIKI_LINK_STREAMS.Input_Size). Print() prints a sample, every interval seconds (and when the stage is done) one
+# is emitted to the files set up with Configure:
+#   jsonl_file       one JSON object per sample, appended.
+#   prometheus_file  the last sample of every stage in the Prometheus text format, for node_exporter's textfile
+#                    collector. The file is replaced (not rewritten in place) so a scrape never sees half of it.
+# Configure(profile=True) also counts the seconds spent in each phase of the stages:
+#   read        reading (and decompressing) files, see TIMED_RAW
+#   decompress  bz2 streams of a multistream wiki file
+#   parse       finding the titles & links of the wiki datastore
+#   normalize   escaping, filtering & canonical titles of the links, mmap engine only (the lines engine does it in parse)
+#   filter      namespaces
+#   write       writing (and compressing) files
+# Phases of worker processes are sent back with their task results and added up, so they can add up to more than
+# the stage's elapsed time. PHASES adds up the phases of the whole process, and each stage reports what was added since
+# it started, so a stage run inside another one (or threads counting phases while a stage runs) doesn't reset the others.
+
+UPDATE_BATCH = 10000 # Stages update their metrics about every UPDATE_BATCH pages, IDs or rows.
+COUNTERS = ('pages', 'links', 'ids', 'rows', 'bytes_read', 'bytes_written')
+PROMETHEUS_PREFIX = 'wiki_links_'
+PROMETHEUS_HELP = {
+    'pages': "Pages done by the stage.",
+    'links': "Links done by the stage.",
+    'ids': "Master IDs assigned by the stage.",
+    'rows': "Rows written to neo4j by the stage.",
+    'bytes_read': "Input byte offset of the stage.",
+    'bytes_written': "Bytes written by the stage (before compression).",
+    'rss_bytes': "Resident set size of the stage's process.",
+    'elapsed_seconds': "Seconds since the stage started.",
+    'pages_per_second': "Pages per second since the stage started.",
+    'rows_per_second': "Rows per second since the stage started.",
+    'bytes_per_second': "Input bytes per second since the stage started.",
+    'progress_ratio': "Input byte offset over the input size.",
+    'eta_seconds': "Seconds left at the current input rate.",
+    'done': "1 once the stage has finished.",
+}
+
+JSONL_FILE = None
+PROMETHEUS_FILE = None
+INTERVAL = 10.0
+PROFILE = False
+PHASES = {}
+PHASES_LOCK = threading.Lock() # The loader threads of WIKI_LINK_NEOCONNECT add phases at the same time.
+LATEST = {} # stage: last sample, for the Prometheus file.
+
+def Configure(jsonl_file=None, prometheus_file=None, profile=False, interval=10.0):
+    global JSONL_FILE, PROMETHEUS_FILE, PROFILE, INTERVAL
+    JSONL_FILE = jsonl_file
+    PROMETHEUS_FILE = prometheus_file
+    PROFILE = profile
+    INTERVAL = interval
+
+def Add_Phase(phase, seconds):
+    with PHASES_LOCK:
+        PHASES[phase] = PHASES.get(phase, 0.0) + seconds
+
+def Merge_Phases(phases):
+    for phase in phases:
+        Add_Phase(phase, phases[phase])
+
+class TASK_PROFILE(object):
+    # Collects the phases of one task apart: with TASK_PROFILE(profile) as task_profile: ..., then task_profile.phases.
+    # The task is profiled if profile is True, so a worker process profiles as its parent asked.
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.phases = {}
+
+    def __enter__(self):
+        global PROFILE, PHASES
+        self.saved = (PROFILE, PHASES)
+        PROFILE, PHASES = self.profile, self.phases
+        return self
+
+    def __exit__(self, *exc_info):
+        global PROFILE, PHASES
+        PROFILE, PHASES = self.saved
+        return False
+
+class TIMED_RAW(io.RawIOBase):
+    # Raw stream counting the seconds of each read or write of raw as phase. A buffered stream calls it once per buffer.
+
+    def __init__(self, raw, phase):
+        self.raw = raw
+        self.phase = phase
+
+    def readable(self):
+        return self.raw.readable()
+
+    def writable(self):
+        return self.raw.writable()
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def fileno(self):
+        return self.raw.fileno()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def tell(self):
+        return self.raw.tell()
+
+    def truncate(self, size=None):
+        return self.raw.truncate(size)
+
+    def readinto(self, buffer):
+        start_time = time.perf_counter()
+        size = self.raw.readinto(buffer)
+        Add_Phase(self.phase, time.perf_counter() - start_time)
+        return size
+
+    def write(self, data):
+        start_time = time.perf_counter()
+        size = self.raw.write(data)
+        Add_Phase(self.phase, time.perf_counter() - start_time)
+        return size
+
+    def flush(self):
+        if not self.closed:
+            self.raw.flush()
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().close()
+            finally:
+                self.raw.close()
+
+def Stream_Position(stream):
+    # The byte offset of a file stream, or None if it can't tell. A text stream tells the offset of its buffer,
+    # which is a little ahead of the lines read.
+    stream = getattr(stream, 'buffer', stream)
+    try:
+        return stream.tell()
+    except (OSError, ValueError):
+        return None
+
+def RSS():
+    # The current resident set size, or the peak when /proc isn't there.
+    try:
+        with open('/proc/self/statm', 'rb') as statm_stream:
+            return int(statm_stream.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if 'darwin' == sys.platform else max_rss * 1024
+
+def Write_Prometheus(prometheus_file):
+    lines = []
+    for name in COUNTERS + ('rss_bytes', 'elapsed_seconds', 'pages_per_second', 'rows_per_second', 'bytes_per_second', 'progress_ratio', 'eta_seconds', 'done'):
+        lines.append("# HELP {0}{1} {2}\n# TYPE {0}{1} gauge\n".format(PROMETHEUS_PREFIX, name, PROMETHEUS_HELP[name]))
+        for stage in sorted(LATEST):
+            if LATEST[stage].get(name) is not None:
+                lines.append('{}{}{{stage="{}"}} {}\n'.format(PROMETHEUS_PREFIX, name, stage, float(LATEST[stage][name])))
+    if any('phases' in LATEST[stage] for stage in LATEST):
+        lines.append("# HELP {0}phase_seconds Seconds spent in each phase of the stage.\n# TYPE {0}phase_seconds gauge\n".format(PROMETHEUS_PREFIX))
+        for stage in sorted(LATEST):
+            phases = LATEST[stage].get('phases', {})
+            for phase in sorted(phases):
+                lines.append('{}phase_seconds{{stage="{}",phase="{}"}} {}\n'.format(PROMETHEUS_PREFIX, stage, phase, phases[phase]))
+    with open(prometheus_file + '.tmp', 'w') as save_stream:
+        save_stream.writelines(lines)
+    os.replace(prometheus_file + '.tmp', prometheus_file)
+
+def Megabytes(size):
+    return "%.1f MB" % (size / (1024 * 1024))
+
+class STAGE_METRICS(object):
+    # The metrics of one run of a stage. total_bytes is the input size, or None if it isn't known.
+    # start_bytes is the input offset the stage starts from (when it resumes), so it isn't counted in the rates.
+
+    def __init__(self, stage, total_bytes=None, start_bytes=0):
+        self.stage = stage
+        self.total_bytes = total_bytes
+        self.start_bytes = start_bytes
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.counters['bytes_read'] = start_bytes
+        self.start_time = time.time()
+        self.emit_time = self.start_time
+        self.start_phases = dict(PHASES)
+
+    def Update(self, **counters):
+        # counters are absolute values, e.g. Update(pages=page_number, bytes_read=input_offset). None is skipped.
+        for name in counters:
+            if counters[name] is not None:
+                self.counters[name] = counters[name]
+        if (JSONL_FILE or PROMETHEUS_FILE) and time.time() - self.emit_time >= INTERVAL:
+            self.Emit()
+
+    def Phases(self):
+        # The seconds of each phase since the stage started.
+        phases = dict(PHASES) # A copy, other threads may add phases.
+        start_phases = self.start_phases
+        return dict((phase, phases[phase] - start_phases.get(phase, 0.0)) for phase in phases if phases[phase] > start_phases.get(phase, 0.0))
+
+    def Sample(self, done=False):
+        now = time.time()
+        elapsed = now - self.start_time
+        sample = dict(self.counters, time=now, stage=self.stage, elapsed_seconds=elapsed, rss_bytes=RSS(), done=int(done))
+        sample['pages_per_second'] = self.counters['pages'] / max(elapsed, 1e-9)
+        sample['rows_per_second'] = self.counters['rows'] / max(elapsed, 1e-9)
+        sample['bytes_per_second'] = (self.counters['bytes_read'] - self.start_bytes) / max(elapsed, 1e-9)
+        sample['progress_ratio'] = None
+        sample['eta_seconds'] = None
+        if self.total_bytes:
+            sample['progress_ratio'] = min(self.counters['bytes_read'] / self.total_bytes, 1.0)
+            if done:
+                sample['eta_seconds'] = 0.0
+            elif sample['bytes_per_second'] > 0:
+                sample['eta_seconds'] = max(self.total_bytes - self.counters['bytes_read'], 0) / sample['bytes_per_second']
+        if PROFILE:
+            sample['phases'] = self.Phases()
+        return sample
+
+    def Emit(self, done=False):
+        sample = self.Sample(done)
+        self.emit_time = sample['time']
+        if JSONL_FILE:
+            with open(JSONL_FILE, 'a') as save_stream:
+                save_stream.write(json.dumps(sample) + '\n')
+        if PROMETHEUS_FILE:
+            LATEST[self.stage] = sample
+            Write_Prometheus(PROMETHEUS_FILE)
+        return sample
+
+    def Print(self):
+        # One line with the same units for every stage. Counters that are still 0 are left out.
+        sample = self.Sample()
+        fields = []
+        for name in ('pages', 'links', 'ids', 'rows'):
+            if sample[name]:
+                fields.append("{}: {}".format(name.capitalize() if 'ids' != name else 'IDs', sample[name]))
+        if sample['bytes_read']:
+            fields.append("Read: {}".format(Megabytes(sample['bytes_read'])) + (" (%.1f%%)" % (100 * sample['progress_ratio']) if sample['progress_ratio'] is not None else ""))
+        if sample['bytes_written']:
+            fields.append("Written: {}".format(Megabytes(sample['bytes_written'])))
+        fields.append("RSS: {}".format(Megabytes(sample['rss_bytes'])))
+        if sample['pages']:
+            fields.append("Pages per Second: %.0f" % sample['pages_per_second'])
+        if sample['rows']:
+            fields.append("Rows per Second: %.0f" % sample['rows_per_second'])
+        if sample['bytes_per_second']:
+            fields.append("MB per Second: %.1f" % (sample['bytes_per_second'] / (1024 * 1024)))
+        if sample['eta_seconds'] is not None:
+            fields.append("ETA: %.0f" % sample['eta_seconds'])
+        fields.append("Time: %.2f" % sample['elapsed_seconds'])
+        print("\t" + "\t".join(fields))
+
+    def Finish(self, **counters):
+        # The last sample, with done set. The phases are printed when profiling.
+        for name in counters:
+            if counters[name] is not None:
+                self.counters[name] = counters[name]
+        sample = self.Emit(done=True) if (JSONL_FILE or PROMETHEUS_FILE) else self.Sample(done=True)
+        phases = sample.get('phases')
+        if phases:
+            print("\tPhases: " + "\t".join("{}: {}".format(phase, "%.2f" % phases[phase]) for phase in sorted(phases)))
+        return sample
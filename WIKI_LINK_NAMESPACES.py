@@ -0,0 +1,217 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import bz2
+import sys
+import time
+
+import WIKI_LINK_STREAMS
+
+# Namespaces of page titles and links, from the <namespaces> of the wiki file's <siteinfo>:
+#   <namespace key="14" case="first-letter">Category</namespace>
+# A title is in the namespace its 'Prefix:' names (matched without case, a leading ':' is ignored), else in the main
+# namespace, called 'article'. MediaWiki's canonical english names & built-in aliases (NAMESPACE_ALIASES: 'Image:' for
+# 'File:', 'Project:' & 'WP:' for the wiki's project namespace, ...) name their namespace too.
+# Interlanguage & interwiki links ('fr:Paris', 'zh-yue:...', 'wikt:word') aren't listed in the dump, a prefix in
+# INTERWIKI_PREFIXES (the Wikipedia language codes & the Wikimedia project prefixes) is put in the 'interwiki'
+# namespace. Any other prefix is part of an article title ('Re:Zero', 'AC/DC: Live').
+# Namespaces are named by their lower case name with '_' for spaces ('category', 'template_talk', ...).
+#   NAMESPACES.include            Names of the namespaces to keep, None keeps everything.
+#   Filter_Reduced                Drops pages and links outside of include from reduced 'T'/'L' records.
+#   Partition_Relationships       Splits relationships.tsv into [relationships]_[source]_[dest].tsv files.
+#   Read_Title_Case               The TITLE_CASE of the <case> & namespaces, for canonical titles.
+
+ARTICLE = 'article'
+INTERWIKI = 'interwiki'
+PARTITION_BUFFER_SIZE = 256 * 1024
+# {lower case alias: namespace key}. The canonical names work in every wiki whatever its language, 'Image' is the name of
+# the file namespace before MediaWiki 1.14, 'WP' & 'WT' are the project namespace aliases of the english Wikipedia.
+NAMESPACE_ALIASES = {
+    'media': -2, 'special': -1, 'talk': 1, 'user': 2, 'user_talk': 3, 'project': 4, 'project_talk': 5, 'file': 6,
+    'file_talk': 7, 'mediawiki': 8, 'mediawiki_talk': 9, 'template': 10, 'template_talk': 11, 'help': 12, 'help_talk': 13,
+    'category': 14, 'category_talk': 15, 'image': 6, 'image_talk': 7, 'wp': 4, 'wt': 5,
+}
+INTERWIKI_PREFIXES = frozenset('''
+    aa ab ace ady af ak als alt am ami an ang anp ar arc ary arz as ast atj av avk awa ay az azb ba ban bar bat-smg bcl
+    be be-tarask be-x-old bg bh bi bjn blk bm bn bo bpy br bs bug bxr ca cbk-zam cdo ce ceb ch cho chr chy ckb co cr
+    crh cs csb cu cv cy da dag de din diq dsb dty dv dz ee el eml en eo es et eu ext fa fat ff fi fiu-vro fj fo fon fr
+    frp frr fur fy ga gag gan gcr gd gl glk gn gom gor got gpe gu guc gur guw gv ha hak haw he hi hif ho hr hsb ht hu
+    hy hyw hz ia id ie ig ii ik ilo inh io is it iu ja jam jbo jv ka kaa kab kbd kbp kcg kg ki kj kk kl km kn ko koi
+    kr krc ks ksh ku kv kw ky la lad lb lbe lez lfn lg li lij lld lmo ln lo lrc lt ltg lv mad mai map-bms mdf mg mh
+    mhr mi min mk ml mn mni mnw mo mr mrj ms mt mus mwl my myv mzn na nah nap nb nds nds-nl ne new ng nia nl nn no nov
+    nqo nrm nso nv ny oc olo om or os pa pag pam pap pcd pcm pdc pfl pi pih pl pms pnb pnt ps pt pwn qu rm rmy rn ro
+    roa-rup roa-tara ru rue rw sa sah sat sc scn sco sd se sg sh shi shn si simple sk skr sl sm smn sn so sq sr srn ss
+    st stq su sv sw szl szy ta tay tcy te tet tg th ti tk tl tly tn to tpi tr trv ts tt tum tw ty tyv udm ug uk ur uz
+    ve vec vep vi vls vo wa war wo wuu xal xh xmf yi yo za zea zh zh-classical zh-min-nan zh-yue zu
+    b c commons d foundation incubator m mediawikiwiki meta metawikimedia mw n outreach phab phabricator q s species
+    v voy w wikibooks wikidata wikimedia wikinews wikipedia wikiquote wikisource wikispecies wikiversity wikivoyage
+    wikt wiktionary wmf
+'''.split())
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Namespace_Name(name):
+    return name.replace('&amp;', '&').replace(' ', '_').lower()
+
+def Read_Namespaces(wiki_file):
+    # Returns {namespace key: name} of the wiki file's <siteinfo>, 0 being ARTICLE.
+    namespaces = {0: ARTICLE}
+    open_wiki = bz2.open if wiki_file.endswith('.bz2') else open
+    with open_wiki(wiki_file, 'rb') as read_stream:
+        for line in read_stream:
+            if b'<namespace ' in line and b'</namespace>' in line:
+                key = int(line.split(b'key="')[1].split(b'"')[0])
+                namespaces[key] = Namespace_Name(line.split(b'>', 1)[1].split(b'</namespace>')[0].decode('utf-8'))
+            if b'</siteinfo>' in line or b'<page>' in line:
+                break
+    return namespaces
+
+def Read_Title_Case(wiki_file):
+    # The TITLE_CASE of the wiki file's <siteinfo>, from its <case> and the case="" of each <namespace>.
+    # The NAMESPACE_ALIASES of a namespace are written as its siteinfo name.
+    case = 'first-letter'
+    prefixes = {}
+    key_prefixes = {}
+    open_wiki = bz2.open if wiki_file.endswith('.bz2') else open
+    with open_wiki(wiki_file, 'rb') as read_stream:
+        for line in read_stream:
+            if b'<case>' in line:
+                case = line.split(b'<case>')[1].split(b'</case>')[0].decode('utf-8')
+            elif b'<namespace ' in line and b'</namespace>' in line:
+                prefix = line.split(b'>', 1)[1].split(b'</namespace>')[0].decode('utf-8').replace('&amp;', '&').replace(' ', '_')
+                prefix_case = line.split(b'case="')[1].split(b'"')[0].decode('utf-8') if b'case="' in line else case
+                prefixes[prefix.lower()] = (prefix, prefix_case)
+                key_prefixes[int(line.split(b'key="')[1].split(b'"')[0])] = prefix.lower()
+            if b'</siteinfo>' in line or b'<page>' in line:
+                break
+    for alias in NAMESPACE_ALIASES:
+        if NAMESPACE_ALIASES[alias] in key_prefixes and alias not in prefixes:
+            prefixes[alias] = prefixes[key_prefixes[NAMESPACE_ALIASES[alias]]]
+    return TITLE_CASE(case, prefixes)
+
+class TITLE_CASE(object):
+    # The case rules of a wiki's titles, for WIKI_LINK_PARSE.Canonical_Title. Plain data, so it can be sent to worker processes.
+    #   case        The <case> of the main namespace: 'first-letter' (MediaWiki's default) or 'case-sensitive'.
+    #   prefixes    {lower case prefix or alias: (prefix as the siteinfo writes it, case of the namespace)} of the other namespaces.
+
+    def __init__(self, case='first-letter', prefixes=None):
+        self.case = case
+        self.prefixes = {} if prefixes is None else prefixes
+
+    def __str__(self):
+        return self.case
+
+class NAMESPACES(object):
+    # Classifies titles (str, as in the reduced records) by namespace. Plain data, so it can be sent to worker processes.
+
+    def __init__(self, namespaces, include=None):
+        # namespaces is {key: name} (Read_Namespaces). include is a list of names or keys.
+        self.names = [ARTICLE, INTERWIKI] + [namespaces[key] for key in sorted(namespaces) if namespaces[key] != ARTICLE]
+        self.prefixes = dict((namespaces[key], namespaces[key]) for key in namespaces if key != 0)
+        for alias in NAMESPACE_ALIASES:
+            if NAMESPACE_ALIASES[alias] in namespaces and alias not in self.prefixes:
+                self.prefixes[alias] = namespaces[NAMESPACE_ALIASES[alias]]
+        self.include = None
+        if include is not None:
+            self.include = set()
+            for name in include:
+                name = Namespace_Name(str(name).strip())
+                if name.lstrip('-').isdigit() and int(name) in namespaces:
+                    name = namespaces[int(name)]
+                name = self.prefixes.get(name, name)
+                if name not in self.names:
+                    panic("Unknown namespace {}, the wiki file has: {}".format(name, ", ".join(self.names)))
+                self.include.add(name)
+
+    def Namespace(self, title):
+        prefix, colon, rest = title.lstrip(':').partition(':')
+        if not colon:
+            return ARTICLE
+        prefix = prefix.lower()
+        try:
+            return self.prefixes[prefix]
+        except KeyError:
+            pass
+        if prefix in INTERWIKI_PREFIXES:
+            return INTERWIKI
+        return ARTICLE
+
+    def Included(self, title):
+        return self.include is None or self.Namespace(title) in self.include
+
+def Filter_Reduced(output, namespaces):
+    # Drops the pages (with all of their records) and links whose namespace isn't included, from reduced records.
+    # output must start at a page boundary, as the chunks of WIKI_LINK_PARSE.Iter_Reduced_Chunks do.
+    kept = []
+    in_page = True
+    for line in output.split('\n')[:-1]:
+        kind = line[:1]
+        if 'T' == kind:
+            in_page = namespaces.Included(line[2:])
+            if in_page:
+                kept.append(line)
+        elif not in_page:
+            continue
+        elif 'L' == kind and not namespaces.Included(line[2:]):
+            continue
+        else:
+            kept.append(line)
+    if not kept:
+        return ''
+    return '\n'.join(kept) + '\n'
+
+def Partition_Files(relationships_file, source, dest):
+    base, extension = WIKI_LINK_STREAMS.Split_Extension(relationships_file)
+    return "{}_{}_{}{}".format(base, source, dest, extension)
+
+def Partition_Relationships(master_ids_file, relationships_file, namespaces, print_batch=10000000):
+    # Split relationships_file by the namespaces of (source, dest). Only included namespaces get files, e.g.
+    # relationships_article_article.tsv and relationships_article_category.tsv. Returns the files written.
+    # A file is open for every pair of namespaces seen, so each gets a PARTITION_BUFFER_SIZE buffer, not BUFFER_SIZE.
+    print("Partitioning Relationships by Namespace...\n")
+    start_time = time.time()
+    print("\tLoading Master ID namespaces...\n")
+    codes = dict((name, code) for code, name in enumerate(namespaces.names))
+    id_namespaces = bytearray()
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'rb') as read_stream:
+        for line in read_stream:
+            title, title_id = line.split(b'\n')[0].split(b'\t')
+            if int(title_id) != len(id_namespaces):
+                panic("{} is not in ID order at ID {}".format(master_ids_file, title_id))
+            id_namespaces.append(codes[namespaces.Namespace(title.decode('utf-8'))])
+
+    print("\tSaving partitions...\n")
+    streams = {}
+    link_number = 0
+    try:
+        with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+            for line in read_stream:
+                source, dest, strength = line.split(b'\t')
+                if not source: # Links found before the first page have no source.
+                    continue
+                pair = (id_namespaces[int(source)], id_namespaces[int(dest)])
+                try:
+                    save_stream = streams[pair]
+                except KeyError:
+                    names = (namespaces.names[pair[0]], namespaces.names[pair[1]])
+                    if namespaces.include is not None and not set(names) <= namespaces.include:
+                        save_stream = None
+                    else:
+                        save_stream = WIKI_LINK_STREAMS.Open_File(Partition_Files(relationships_file, *names), 'wb', buffer_size=PARTITION_BUFFER_SIZE)
+                    streams[pair] = save_stream
+                if save_stream is not None:
+                    save_stream.write(line)
+                link_number += 1
+                if link_number % print_batch == 0:
+                    print("\tLink # {}".format(link_number))
+    finally:
+        for save_stream in streams.values():
+            if save_stream is not None:
+                save_stream.close()
+    partition_files = sorted(Partition_Files(relationships_file, namespaces.names[pair[0]], namespaces.names[pair[1]]) for pair in streams if streams[pair] is not None)
+    for partition_file in partition_files:
+        print("\t{}".format(partition_file))
+    print("Relationships Partitioned!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+    return partition_files
@@ -3,7 +3,121 @@
 
 
 
+import concurrent.futures
+import time
+
 from neo4j.v1 import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, TransientError
+
+import WIKI_LINK_METRICS
+import WIKI_LINK_STREAMS
+
+# Online loading for a live database: master_ids.tsv and relationships.tsv are streamed from the python side in
+# parameterized UNWIND $rows batches, spread over a pool of concurrent sessions.
+# For a fresh database, WIKI_LINK_BULKIMPORT is much faster.
+# Progress is reported through a WIKI_LINK_METRICS.STAGE_METRICS: rows are counted once written, bytes_read is the
+# offset of the rows read so far, which runs up to sessions * 2 batches ahead.
+# A title that is the title of more than one page has more than one run of links in relationships.tsv. A (source, dest)
+# link keeps the strength of the first run it is in, as with WIKI_LINK_BULKIMPORT: the rows of later runs are marked
+# (Mark_Repeated_Sources) and only set the strength of links that weren't there yet.
+# MERGE isn't atomic across concurrent transactions, so two batches in flight must never hold the same (source, dest):
+# batches are only cut between sources (Batch_Rows_By_Source), so within a window a source is in a single batch, and
+# a batch with a repeated source is only written once every batch before it is, with no other batch in flight.
+
+NODES_QUERY = ("UNWIND $rows AS row "
+               "MERGE (n:Article {id: row[1]}) "
+               "SET n.name = row[0]")
+
+RELATIONSHIPS_QUERY = ("UNWIND $rows AS row "
+                       "MATCH (source:Article {id: row[0]}) "
+                       "MATCH (dest:Article {id: row[1]}) "
+                       "MERGE (source)-[link:LINKSTO]->(dest) "
+                       "SET link.strength = CASE WHEN row[3] THEN coalesce(link.strength, row[2]) ELSE row[2] END")
+
+CONSTRAINT_QUERIES = ["CREATE CONSTRAINT ON (n:Article) ASSERT n.name is UNIQUE",
+                      "CREATE CONSTRAINT ON (n:Article) ASSERT n.id is UNIQUE"]
+
+REMOVE_RELATIONSHIPS_QUERY = ("UNWIND $rows AS row "
+                              "MATCH (:Article {id: row[0]})-[link:LINKSTO]->(:Article {id: row[1]}) "
+                              "DELETE link")
+
+def Iter_Lines(read_stream, metrics=None):
+    # The lines of read_stream, updating the input offset of metrics (WIKI_LINK_METRICS.STAGE_METRICS) as they are read.
+    for line_number, line in enumerate(read_stream):
+        if metrics is not None and line_number % WIKI_LINK_METRICS.UPDATE_BATCH == 0:
+            metrics.Update(bytes_read=WIKI_LINK_METRICS.Stream_Position(read_stream))
+        yield line
+    if metrics is not None:
+        metrics.Update(bytes_read=WIKI_LINK_METRICS.Stream_Position(read_stream))
+
+def Read_Node_Rows(master_ids_file, metrics=None):
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'r') as read_stream:
+        for line in Iter_Lines(read_stream, metrics):
+            l = line.split('\n')[0].split('\t')
+            yield [l[0], int(l[1])]
+
+def Relationship_Rows(lines):
+    # The rows of relationships.tsv byte lines.
+    for line in lines:
+        l = line.split(b'\t')
+        if l[0]: # Links found before the first page have no source.
+            yield [int(l[0]), int(l[1]), int(l[2])]
+
+def Mark_Repeated_Sources(rows):
+    # Appends True to the rows of a source that was seen in an earlier run of rows, else False.
+    # Two runs of a source can follow each other: a run has a dest only once, so a dest seen again in the run is a row of
+    # the next run, and is marked too.
+    # Sources seen are kept as bits, so memory is about (highest id) / 8 bytes, plus the dests of the current run.
+    seen = bytearray()
+    current_source = None
+    repeated = False
+    dests = set()
+    for row in rows:
+        if row[0] != current_source:
+            current_source = row[0]
+            byte, bit = divmod(current_source, 8)
+            if byte >= len(seen):
+                seen.extend(bytes(max(byte + 1 - len(seen), len(seen))))
+            repeated = bool(seen[byte] & (1 << bit))
+            seen[byte] |= 1 << bit
+            dests = set()
+        if repeated or row[1] in dests:
+            row.append(True)
+        else:
+            dests.add(row[1])
+            row.append(False)
+        yield row
+
+def Read_Relationship_Rows(relationships_file, metrics=None):
+    with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+        for row in Relationship_Rows(Iter_Lines(read_stream, metrics)):
+            yield row
+
+def Batch_Rows(rows, batch_size, key=None):
+    # With a key, a batch is only cut between rows of different keys, so it may grow past batch_size.
+    batch = []
+    for row in rows:
+        if len(batch) >= batch_size and (key is None or key(row) != key(batch[-1])):
+            yield batch
+            batch = []
+        batch.append(row)
+    if batch:
+        yield batch
+
+def Source(row):
+    return row[0]
+
+def Batch_Rows_By_Source(rows, batch_size, window_batches):
+    # Sort each window of window_batches batches by source id, so concurrent batches touch different source nodes.
+    # Windows are cut between runs of links and batches between sources, so the rows of a source in a window are in one batch.
+    for window in Batch_Rows(rows, batch_size * window_batches, Source):
+        window.sort(key=Source)
+        for batch in Batch_Rows(window, batch_size, Source):
+            yield batch
+
+def Has_Repeated_Source(batch):
+    # The batches of Mark_Repeated_Sources rows that must be written alone, see Load_Batches.
+    return any(row[3] for row in batch)
 
 class NEO4J_CONNECT(object):
 
@@ -14,15 +128,10 @@ class NEO4J_CONNECT(object):
         self.driver.close()
 
     def Setup_Constraints(self):
-        with self.driver.session() as session:
-            with session.begin_transaction() as transaction:
-                result = transaction.run("CREATE CONSTRAINT ON (n:Article) "
-                                         "ASSERT n.name is UNIQUE ")
-
-        with self.driver.session() as session:
-            with session.begin_transaction() as transaction:
-                result = transaction.run("CREATE CONSTRAINT ON (n:Article) "
-                                         "ASSERT n.id is UNIQUE ")
+        for query in CONSTRAINT_QUERIES:
+            with self.driver.session() as session:
+                with session.begin_transaction() as transaction:
+                    result = transaction.run(query)
 
     def Create_Nodes(self):
         with self.driver.session() as session:
@@ -40,9 +149,80 @@ class NEO4J_CONNECT(object):
                                          "MATCH (dest:Article {id: line[1] }) "
                                          "MERGE (source)-[:LINKSTO {strength: line[2]}]->(dest) ")
 
+    def _Write_Batch(self, query, rows, retries):
+        delay = 0.5
+        for attempt in range(retries + 1):
+            try:
+                with self.driver.session() as session:
+                    with session.begin_transaction() as transaction:
+                        transaction.run(query, rows=rows)
+                return len(rows)
+            except (TransientError, ServiceUnavailable) as error:
+                if attempt == retries:
+                    raise
+                print("\tRetrying batch of {} rows after: {}".format(len(rows), error))
+                time.sleep(delay)
+                delay *= 2
+
+    def Load_Batches(self, query, batches, sessions=4, retries=5, print_every=10.0, metrics=None, alone=None):
+        # Run query for every batch of rows, with up to sessions batches in flight at once.
+        # A batch for which alone(batch) is True is written after every batch before it, with no other batch in flight.
+        # metrics is the WIKI_LINK_METRICS.STAGE_METRICS the rows are counted in.
+        if metrics is None:
+            metrics = WIKI_LINK_METRICS.STAGE_METRICS('neo4j')
+        print_time = time.time()
+        row_number = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=sessions) as executor:
+            running = set()
+            for batch in batches:
+                batch_alone = alone is not None and alone(batch)
+                if batch_alone or len(running) >= sessions * 2:
+                    done, running = concurrent.futures.wait(running, return_when=concurrent.futures.ALL_COMPLETED if batch_alone else concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        row_number += future.result()
+                    metrics.Update(rows=row_number)
+                if batch_alone:
+                    row_number += self._Write_Batch(query, batch, retries)
+                else:
+                    running.add(executor.submit(self._Write_Batch, query, batch, retries))
+                if time.time() - print_time >= print_every:
+                    metrics.Print()
+                    print_time = time.time()
+            for future in concurrent.futures.as_completed(running):
+                row_number += future.result()
+        metrics.Finish(rows=row_number)
+        metrics.Print()
+        return row_number
+
+    def Load_Nodes(self, master_ids_file, batch_size=10000, sessions=4, retries=5):
+        print("Loading Nodes...\n")
+        metrics = WIKI_LINK_METRICS.STAGE_METRICS('neo4j_nodes', WIKI_LINK_STREAMS.Input_Size(master_ids_file))
+        self.Load_Batches(NODES_QUERY, Batch_Rows(Read_Node_Rows(master_ids_file, metrics), batch_size), sessions, retries, metrics=metrics)
+        print("Nodes Loaded!\n")
+
+    def Load_Relationships(self, relationships_file, batch_size=10000, sessions=4, retries=5, window_batches=16, lines=None):
+        # lines are the lines of relationships_file read while it is still being written (WIKI_LINK_PIPELINE.Follow_Lines),
+        # loaded in place of the file.
+        print("Loading Relationships...\n")
+        if lines is None:
+            metrics = WIKI_LINK_METRICS.STAGE_METRICS('neo4j_relationships', WIKI_LINK_STREAMS.Input_Size(relationships_file))
+            rows = Read_Relationship_Rows(relationships_file, metrics)
+        else:
+            metrics = WIKI_LINK_METRICS.STAGE_METRICS('neo4j_relationships')
+            rows = Relationship_Rows(lines)
+        self.Load_Batches(RELATIONSHIPS_QUERY, Batch_Rows_By_Source(Mark_Repeated_Sources(rows), batch_size, window_batches), sessions, retries, metrics=metrics, alone=Has_Repeated_Source)
+        print("Relationships Loaded!\n")
+
+    def Remove_Relationships(self, relationships_file, batch_size=10000, sessions=4, retries=5, window_batches=16):
+        # For the [relationships]_removed.tsv of a WIKI_LINK_DELTA update.
+        print("Removing Relationships...\n")
+        metrics = WIKI_LINK_METRICS.STAGE_METRICS('neo4j_removed_relationships', WIKI_LINK_STREAMS.Input_Size(relationships_file))
+        self.Load_Batches(REMOVE_RELATIONSHIPS_QUERY, Batch_Rows_By_Source(Read_Relationship_Rows(relationships_file, metrics), batch_size, window_batches), sessions, retries, metrics=metrics)
+        print("Relationships Removed!\n")
+
 if __name__ == "__main__":
     neo = NEO4J_CONNECT("bolt://10.1.1.141", "neo4j", "mysillypassword") # Don't use a password like that....
     neo.Setup_Constraints()
-    neo.Create_Nodes()
-    neo.Create_Relationships()
+    neo.Load_Nodes("data/master_ids.tsv")
+    neo.Load_Relationships("data/relationships.tsv")
     neo.Close()
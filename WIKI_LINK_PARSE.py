@@ -1,135 +1,780 @@
 # Written by: Daniel Bowder
 # Github: https://github.com/DotBowder
 
+import argparse
+import bz2
+import io
+import mmap
+import multiprocessing
+import os
+import re
+import sys
 import time
 
+import WIKI_LINK_CHECKPOINT
+import WIKI_LINK_EXTSORT
+import WIKI_LINK_GRAPH
+import WIKI_LINK_METRICS
+import WIKI_LINK_NAMESPACES
+import WIKI_LINK_REDIRECTS
+import WIKI_LINK_STREAMS
+import WIKI_LINK_TITLES
+
 # Functions to extract relevent data from wikipedia data store, and write data to files.
 # master_ids_file is a lsit of all of the Nodes for this neo4j graph.
 # relationships_file is a lsit of all of the node to node LINKSTO relationships.
+# Each of these files is compressed when its name ends in .gz, .zst or .bz2, see WIKI_LINK_STREAMS.
+# Every stage reports its progress through a WIKI_LINK_METRICS.STAGE_METRICS, printed every print_batch pages or IDs.
 
 def panic(data):
     print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
     sys.exit()
 
-def Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file, print_batch=177000):
+# Canonical titles (case is not None): the #anchor, a leading ':' and extra '_' are dropped, and the first letter is
+# upper case when the title's namespace is <case>first-letter</case>, so that [[political philosophy#History]] and
+# [[Political_philosophy]] are the same title. case is the wiki's WIKI_LINK_NAMESPACES.TITLE_CASE.
+# A known namespace prefix is written as the siteinfo names it, and the first letter after it follows the case of that
+# namespace: [[category:living people]] is 'Category:Living_people', and an alias is written as the namespace it names:
+# [[Image:tower.jpg]] is 'File:Tower.jpg' (see WIKI_LINK_NAMESPACES.NAMESPACE_ALIASES). Interwiki links are left as they are written
+# (':fr:Paris', 'wikt:word'). Links left empty ([[#History]]) are dropped.
+# Redirect pages are kept as an 'R' record with the canonical target (after the page's title), for WIKI_LINK_REDIRECTS.
+CANONICAL_UNDERSCORES = re.compile('_+')
+
+def Upper_First(title, case):
+    if 'first-letter' == case:
+        first = title[:1].upper()
+        if 1 == len(first): # Letters like 'ß' have no single letter upper case, MediaWiki leaves them as they are.
+            return first + title[1:]
+    return title
+
+def Canonical_Title(title, case):
+    title = CANONICAL_UNDERSCORES.sub('_', title.partition('#')[0]).strip('_\n')
+    colon = ':' == title[:1]
+    if colon:
+        title = title[1:].lstrip('_\n')
+    prefix, separator, rest = title.partition(':')
+    if separator:
+        prefix = prefix.rstrip('_').lower()
+        if prefix in case.prefixes:
+            prefix, prefix_case = case.prefixes[prefix]
+            return prefix + ':' + Upper_First(rest.lstrip('_'), prefix_case)
+        if prefix in WIKI_LINK_NAMESPACES.INTERWIKI_PREFIXES:
+            return ':' + title if colon else title
+    return Upper_First(title, case.case)
+
+def Reduce_Lines(lines, sha1=False, case=None):
+    # Extract the page titles and links found on each line of the wiki datastore.
+    # Returns the reduced 'T'/'L' records as one string, and the number of pages that were closed.
+    # sha1=True also keeps the revision sha1 of each page as an 'S' record (after the page's links).
+    # case (WIKI_LINK_NAMESPACES.TITLE_CASE) makes titles canonical and keeps redirects as 'R' records.
+    output = []
+    page_count = 0
+    for line in lines:
+        if '<page>' in line:
+            pass
+        elif '</page>' in line:
+            page_count += 1
+        elif '<title>' in line:
+            t = line.split('<title>')[1].split('</title>')[0].replace('\"','\\"').replace('&quot;','\\"').replace('&amp;','&').replace('&nbsp;','_').replace(' ', '_').replace('\t', '')
+            if ';' not in t and '{' not in t and '}' not in t and '`' not in t and '\\' not in t:
+                if case is not None:
+                    t = Canonical_Title(t, case)
+                output.append('T\t' + t + '\n')
+        elif case is not None and '<redirect' in line:
+            r = line.partition('<redirect title="')[2].partition('"')[0].replace('&quot;','\\"').replace('&amp;','&').replace('&nbsp;','_').replace(' ', '_').replace('\t', '')
+            if ';' not in r and '{' not in r and '}' not in r and '`' not in r and '\\' not in r:
+                r = Canonical_Title(r, case)
+                if r:
+                    output.append('R\t' + r + '\n')
+        elif '[[' in line:
+            link_list = line.split('[[')[1:]
+            for link in link_list:
+                l = link.split(']]')[0].split('|')[0].replace('\"','\\"').replace('&quot;','\\"').replace('&amp;','&').replace('&nbsp;','_').replace(' ', '_').replace('\t', '')
+                if ';' not in l and '{' not in l and '}' not in l and '`' not in l and '\\' not in l:
+                    if case is not None:
+                        l = Canonical_Title(l, case)
+                        if not l:
+                            continue
+                    output.append('L\t' + l + '\n')
+        elif sha1 and '<sha1>' in line:
+            output.append('S\t' + line.split('<sha1>')[1].split('</sha1>')[0] + '\n')
+    return ''.join(output), page_count
+
+# Byte level engine, used in place of Reduce_Lines with engine='mmap'.
+# Only the lines with a <page>, </page> or <title> tag (and <sha1>, <redirect>) are looked at one by one. Article text never holds
+# those tags, so the text between them is handled as one region: its links are found with a single SCAN_LINKS pass.
+# Lines are split on b'\n' only (wiki dumps don't use '\r' line endings).
+# The tag lines are the per page cost: the engine is about 2.5x faster than Reduce_Lines on full length articles, but
+# only as fast on dumps of very short pages. So the '</page>' line, '<page>' line & '<title>' line between two pages are
+# matched at once, group 1 being the end of the '</page>' line & the '<page>' line.
+# Tags by (sha1, redirects).
+SCAN_TAGS = {
+    (False, False): re.compile(rb'<(?:/page>(\n[ \t]*<page>\n)[ \t]*<title|/page|page|title)>'),
+    (True, False): re.compile(rb'<(?:/page>(\n[ \t]*<page>\n)[ \t]*<title|/page|page|title|sha1)>'),
+    (False, True): re.compile(rb'<(?:/page>(\n[ \t]*<page>\n)[ \t]*<title|/page|page|title)>|<redirect'),
+    (True, True): re.compile(rb'<(?:/page>(\n[ \t]*<page>\n)[ \t]*<title|/page|page|title|sha1)>|<redirect'),
+}
+# The text after each '[[' up to the first ']]', '|', next '[[' or end of line (kept), the same as Reduce_Lines'
+# line.split('[[')[1:] then partition(']]') & partition('|').
+SCAN_LINKS = re.compile(rb'\[\[([^\[\]|\n]*(?:(?:\[(?!\[)|\](?!\]))[^\[\]|\n]*)*\n?)')
+SCAN_FORBIDDEN = re.compile(rb'[;{}`\\]')
+# A '\0' separated record with a character that isn't allowed, with the '\0' in front of it.
+SCAN_FORBIDDEN_RECORDS = re.compile(rb'\0[^\0]*[;{}`\\][^\0]*')
+
+def Scan_Normalize(text):
+    # The .replace() chain of Reduce_Lines, skipping the replaces that can't match.
+    if b'"' in text:
+        text = text.replace(b'"', b'\\"')
+    if b'&' in text:
+        text = text.replace(b'&quot;', b'\\"').replace(b'&amp;', b'&').replace(b'&nbsp;', b'_')
+    text = text.replace(b' ', b'_')
+    if b'\t' in text:
+        text = text.replace(b'\t', b'')
+    return text
+
+# Canonical_Title of '\0' separated records. The records with a ':' (a namespace, interwiki or leading ':') are made
+# canonical one by one, the first letter of the others with a single pass.
+SCAN_ANCHORS = re.compile(rb'#[^\0]*')
+SCAN_UNDERSCORES = re.compile(rb'__+')
+SCAN_EDGES = re.compile(rb'(?<=\0)[_\n]+|[_\n]+(?=\0)|[_\n]+\Z')
+SCAN_COLON_RECORDS = re.compile(rb'(?<=\0)[^\0:]*:[^\0]*')
+SCAN_EMPTY = re.compile(rb'\0(?=\0)|\0\Z')
+SCAN_FIRST_LETTERS = re.compile(rb'(?<=\0)(?:[a-z]|[\xc0-\xff][\x80-\xbf]+)')
+SCAN_FIRST_LETTERS_NO_COLON = re.compile(rb'(?<=\0)(?:[a-z]|[\xc0-\xff][\x80-\xbf]+)(?=[^\0:]*(?:\0|\Z))')
+
+def Scan_Upper(match):
+    letter = match.group()
+    upper = letter.decode('utf-8').upper()
+    return upper.encode('utf-8') if 1 == len(upper) else letter
+
+def Scan_Canonical(records, case):
+    # Canonical_Title of each record, dropping the records left empty.
+    if b'#' in records:
+        records = SCAN_ANCHORS.sub(b'', records)
+    if b'__' in records:
+        records = SCAN_UNDERSCORES.sub(b'_', records)
+    records = SCAN_EDGES.sub(b'', records)
+    colons = b':' in records
+    if colons:
+        records = SCAN_COLON_RECORDS.sub(lambda match: Canonical_Title(match.group().decode('utf-8'), case).encode('utf-8'), records)
+    records = SCAN_EMPTY.sub(b'', records)
+    if 'first-letter' == case.case:
+        records = (SCAN_FIRST_LETTERS_NO_COLON if colons else SCAN_FIRST_LETTERS).sub(Scan_Upper, records)
+    return records
+
+def Scan_Links(text, output, case=None):
+    # Append the 'L' records of every line of text to output.
+    # All the links are normalized & filtered at once, joined by '\0' (which can't be in an xml file).
+    links = SCAN_LINKS.findall(text)
+    if not links:
+        return
+    profile = WIKI_LINK_METRICS.PROFILE
+    if profile:
+        start_time = time.perf_counter()
+    records = Scan_Normalize(b'\0' + b'\0'.join(links))
+    if SCAN_FORBIDDEN.search(records) is not None:
+        records = SCAN_FORBIDDEN_RECORDS.sub(b'', records)
+    if case is not None:
+        records = Scan_Canonical(records, case)
+    if profile:
+        WIKI_LINK_METRICS.Add_Phase('normalize', time.perf_counter() - start_time)
+    if records:
+        output.append(records.replace(b'\0', b'\nL\t')[1:] + b'\n')
+
+def Scan_Block(buffer, start, end, sha1=False, case=None):
+    # Same as Reduce_Lines over the lines of buffer[start:end] (bytes or an mmap), start must be at the beginning of a line.
+    output = []
+    page_count = 0
+    scan_tags = SCAN_TAGS[sha1, case is not None]
+    position = start
+    while True:
+        match = scan_tags.search(buffer, position, end)
+        if match is None:
+            break
+        line_start = buffer.rfind(b'\n', position, match.start()) + 1 or position
+        if position < line_start:
+            Scan_Links(buffer[position:line_start], output, case)
+        tag_end = match.end()
+        turn = match.end(1)
+        if turn > 0:
+            if buffer.find(b'<page>', line_start, match.start()) < 0:
+                page_count += 1 # The '</page>' line, the '<page>' line is skipped and the <title> line is handled below.
+                line_start = turn
+            else: # Not a page turn, only the '</page>' line is handled.
+                tag_end = match.start(1)
+        line_end = buffer.find(b'\n', tag_end, end)
+        line_end = end if line_end < 0 else line_end + 1
+        line = buffer[line_start:line_end]
+        position = line_end
+        if b'<page>' in line:
+            pass
+        elif b'</page>' in line:
+            page_count += 1
+        elif b'<title>' in line:
+            t = Scan_Normalize(line.split(b'<title>')[1].partition(b'</title>')[0])
+            if SCAN_FORBIDDEN.search(t) is None:
+                if case is not None:
+                    t = Scan_Canonical(b'\0' + t, case)[1:]
+                output.append(b'T\t' + t + b'\n')
+        elif case is not None and b'<redirect' in line:
+            r = Scan_Normalize(line.partition(b'<redirect title="')[2].partition(b'"')[0])
+            if SCAN_FORBIDDEN.search(r) is None:
+                r = Scan_Canonical(b'\0' + r, case)[1:]
+                if r:
+                    output.append(b'R\t' + r + b'\n')
+        elif b'[[' in line:
+            Scan_Links(line, output, case)
+        elif sha1 and b'<sha1>' in line:
+            output.append(b'S\t' + line.split(b'<sha1>')[1].partition(b'</sha1>')[0] + b'\n')
+    if position < end:
+        Scan_Links(buffer[position:end], output, case)
+    return b''.join(output).decode('utf-8'), page_count
+
+def Profile_Parse(function, *args, **options):
+    # function(*args, **options), counted in the 'parse' phase when profiling, less the time of its 'normalize' phase.
+    if not WIKI_LINK_METRICS.PROFILE:
+        return function(*args, **options)
+    normalize_time = WIKI_LINK_METRICS.PHASES.get('normalize', 0.0)
+    start_time = time.perf_counter()
+    result = function(*args, **options)
+    WIKI_LINK_METRICS.Add_Phase('parse', time.perf_counter() - start_time - (WIKI_LINK_METRICS.PHASES.get('normalize', 0.0) - normalize_time))
+    return result
+
+def Reduce_Block(data, engine='lines', **options):
+    # Reduce a block of raw wiki datastore bytes. The block must start at the beginning of a line.
+    # engine='mmap' uses Scan_Block, the default 'lines' engine uses Reduce_Lines.
+    if 'mmap' == engine:
+        return Profile_Parse(Scan_Block, data, 0, len(data), **options)
+    return Profile_Parse(Reduce_Lines, io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), **options)
+
+def Read_Range(wiki_file, start, end):
+    # The bytes [start, end) of wiki_file, counted in the 'read' phase when profiling.
+    start_time = time.perf_counter()
+    with open(wiki_file, 'rb') as file_stream:
+        file_stream.seek(start)
+        data = file_stream.read(end - start)
+    if WIKI_LINK_METRICS.PROFILE:
+        WIKI_LINK_METRICS.Add_Phase('read', time.perf_counter() - start_time)
+    return data
+
+def Reduce_Range(wiki_file, start, end, engine='lines', **options):
+    # Reduce the bytes [start, end) of an uncompressed wiki datastore.
+    # engine='mmap' scans a memory map of the file instead of reading the range (its reads are in the 'parse' phase).
+    if 'mmap' == engine:
+        with open(wiki_file, 'rb') as file_stream:
+            with mmap.mmap(file_stream.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+                return Profile_Parse(Scan_Block, file_map, start, end, **options)
+    return Reduce_Block(Read_Range(wiki_file, start, end), **options)
+
+def Reduce_Bz2_Streams(wiki_file, start, end, **options):
+    # Reduce the independent bz2 streams stored in the bytes [start, end) of a multistream wiki datastore.
+    data = Read_Range(wiki_file, start, end)
+    start_time = time.perf_counter()
+    data = bz2.decompress(data)
+    if WIKI_LINK_METRICS.PROFILE:
+        WIKI_LINK_METRICS.Add_Phase('decompress', time.perf_counter() - start_time)
+    return Reduce_Block(data, **options)
+
+def _Run_Task(task):
+    # The 'namespaces' option (WIKI_LINK_NAMESPACES.NAMESPACES) filters the reduced records of the task.
+    # profile is WIKI_LINK_METRICS.PROFILE of the parent process, the phases of the task are returned with its result.
+    function, args, options, end, profile = task
+    namespaces = options.get('namespaces')
+    if 'namespaces' in options:
+        options = dict((key, options[key]) for key in options if 'namespaces' != key)
+    with WIKI_LINK_METRICS.TASK_PROFILE(profile) as task_profile:
+        output, page_count = function(*args, **options)
+        if namespaces is not None and namespaces.include is not None:
+            start_time = time.perf_counter()
+            output = WIKI_LINK_NAMESPACES.Filter_Reduced(output, namespaces)
+            if profile:
+                WIKI_LINK_METRICS.Add_Phase('filter', time.perf_counter() - start_time)
+    return output, page_count, end, task_profile.phases
+
+def Iter_Task_Results(tasks, workers=1):
+    # Yields (output, page count, end) of each (function, args, options, end) task, in order.
+    # workers > 1 runs the tasks in a process pool.
+    # When profiling, the phases of every task are added to the phases of this process, see WIKI_LINK_METRICS.
+    tasks = (task + (WIKI_LINK_METRICS.PROFILE,) for task in tasks)
+    if workers > 1:
+        print("\tWorkers: {}\n".format(workers))
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(_Run_Task, tasks)
+    else:
+        pool = None
+        results = map(_Run_Task, tasks)
+    try:
+        for output, page_count, end, phases in results:
+            WIKI_LINK_METRICS.Merge_Phases(phases)
+            yield output, page_count, end
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def Find_Page_Ranges(wiki_file, chunk_size, start=0):
+    # Split the wiki datastore from start on into byte ranges of about chunk_size bytes, each one starting on a <page> line.
+    file_size = os.path.getsize(wiki_file)
+    boundaries = [start]
+    with open(wiki_file, 'rb') as file_stream:
+        offset = start + chunk_size
+        while offset < file_size:
+            file_stream.seek(offset)
+            file_stream.readline() # Skip the partial line we landed in.
+            position = file_stream.tell()
+            for line in file_stream:
+                if b'<page>' in line:
+                    break
+                position += len(line)
+            if position >= file_size:
+                break
+            boundaries.append(position)
+            offset = position + chunk_size
+    boundaries.append(file_size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+def Find_Wiki_Index_File(wiki_file):
+    # enwiki-[date]-pages-articles-multistream.xml.bz2 is published next to enwiki-[date]-pages-articles-multistream-index.txt.bz2
+    for index_file in (wiki_file[:-len('.xml.bz2')] + '-index.txt.bz2', wiki_file[:-len('.xml.bz2')] + '-index.txt'):
+        if wiki_file.endswith('multistream.xml.bz2') and os.path.isfile(index_file):
+            return index_file
+    return None
+
+def Find_Stream_Ranges(wiki_file, wiki_index_file, chunk_size, start=0):
+    # Group the bz2 streams listed in the multistream index (offset:page_id:title) from start on into byte ranges of about chunk_size compressed bytes.
+    offsets = set()
+    open_index = bz2.open if wiki_index_file.endswith('.bz2') else open
+    with open_index(wiki_index_file, 'rb') as index_stream:
+        for line in index_stream:
+            offsets.add(int(line.split(b':', 1)[0]))
+    file_size = os.path.getsize(wiki_file)
+    boundaries = [start]
+    for offset in sorted(offsets):
+        if offset - boundaries[-1] >= chunk_size and offset < file_size:
+            boundaries.append(offset)
+    boundaries.append(file_size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+def Read_Page_Blocks(file_stream, chunk_size):
+    # Read a sequential stream in blocks of about chunk_size bytes, each one ending just before a <page> line.
+    # The reads (and the decompression of a .bz2 stream) are counted in the 'read' phase when profiling.
+    pending = b''
+    while True:
+        start_time = time.perf_counter()
+        data = file_stream.read(chunk_size)
+        if WIKI_LINK_METRICS.PROFILE:
+            WIKI_LINK_METRICS.Add_Phase('read', time.perf_counter() - start_time)
+        if not data:
+            break
+        pending += data
+        cut = pending.rfind(b'<page>')
+        cut = pending.rfind(b'\n', 0, cut) + 1 if cut > 0 else 0
+        if cut > 0:
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+# Characters of lines read at a time by a single 'lines' worker, see Iter_Reduced_Chunks.
+STREAM_BLOCK_SIZE = 256 * 1024
+
+def Read_Page_Lines(read_stream, block_size):
+    # Read a text stream opened with newline='' in blocks of about block_size characters, each one ending just before a
+    # <page> line. Yields (lines, size): the lines with their line endings read as '\n' (the same lines as a text stream
+    # with universal newlines), and the size of the block in the utf-8 file.
+    # The reads are counted in the 'read' phase when profiling.
+    pending = []
+    while True:
+        start_time = time.perf_counter()
+        lines = read_stream.readlines(block_size)
+        if WIKI_LINK_METRICS.PROFILE:
+            WIKI_LINK_METRICS.Add_Phase('read', time.perf_counter() - start_time)
+        if not lines:
+            break
+        stop = max(len(pending), 1) # The lines before stop have no <page> line to cut at.
+        pending += lines
+        cut = len(pending) - 1
+        while cut >= stop and '<page>' not in pending[cut]:
+            cut -= 1
+        if cut >= stop:
+            yield Page_Lines(pending[:cut])
+            pending = pending[cut:]
+    if pending:
+        yield Page_Lines(pending)
+
+def Page_Lines(lines):
+    text = ''.join(lines)
+    size = len(text) if text.isascii() else len(text.encode('utf-8'))
+    if '\r' in text:
+        lines = [line[:-2] + '\n' if line.endswith('\r\n') else line[:-1] + '\n' if line.endswith('\r') else line for line in lines]
+    return lines, size
+
+def Reduce_Read_Lines(lines, engine='lines', **options):
+    # Reduce lines already read (Read_Page_Lines), with the 'lines' engine.
+    return Profile_Parse(Reduce_Lines, lines, **options)
+
+def Iter_Line_Tasks(read_stream, block_size, options, start):
+    position = start
+    for lines, size in Read_Page_Lines(read_stream, block_size):
+        position += size
+        yield Reduce_Read_Lines, (lines,), options, position
+
+def Iter_Block_Tasks(file_stream, chunk_size, options, start):
+    position = start
+    for data in Read_Page_Blocks(file_stream, chunk_size):
+        position += len(data)
+        yield Reduce_Block, (data,), options, position
+
+def Iter_Reduced_Chunks(wiki_file, workers=1, chunk_size=64 * 1024 * 1024, wiki_index_file=None, options=None, start=0):
+    # Yields (reduced 'T'/'L' records, page count, input offset) for each page aligned chunk of the wiki datastore, in file order.
+    # The input offset is where the next chunk starts: a byte offset of the wiki file, or of the decompressed
+    # data for a .bz2 file without a multistream index. Reading can start again from any of them with start.
+    # wiki_file may be the uncompressed .xml, or the .xml.bz2 dump which is decompressed while it is read.
+    # A pages-articles-multistream.xml.bz2 dump with its index file is decompressed one group of bz2 streams per task.
+    # workers > 1 extracts the chunks in a process pool, see Iter_Task_Results.
+    # A single worker with the 'lines' engine streams the lines of the file into Reduce_Lines instead, the way the
+    # original parser read it, in STREAM_BLOCK_SIZE chunks: no copy of a chunk_size range, and the records of a few pages
+    # at a time are written out instead of those of a whole range.
+    # options are passed on to Reduce_Block (engine, sha1, case), apart from namespaces, see _Run_Task.
+    options = options or {}
+    file_stream = None
+    stream_lines = workers <= 1 and 'lines' == options.get('engine', 'lines')
+    if wiki_file.endswith('.bz2'):
+        if wiki_index_file is None:
+            wiki_index_file = Find_Wiki_Index_File(wiki_file)
+        if wiki_index_file is not None:
+            print("\tMultistream Index: {}\n".format(wiki_index_file))
+            tasks = [(Reduce_Bz2_Streams, (wiki_file, range_start, range_end), options, range_end) for range_start, range_end in Find_Stream_Ranges(wiki_file, wiki_index_file, chunk_size // 4, start)]
+        elif stream_lines:
+            file_stream = bz2.open(wiki_file, 'rt', encoding='utf-8', newline='')
+            file_stream.seek(start)
+            tasks = Iter_Line_Tasks(file_stream, STREAM_BLOCK_SIZE, options, start)
+        else:
+            file_stream = bz2.open(wiki_file, 'rb')
+            file_stream.seek(start)
+            tasks = Iter_Block_Tasks(file_stream, chunk_size, options, start)
+    elif stream_lines:
+        file_stream = open(wiki_file, 'r', encoding='utf-8', newline='')
+        file_stream.seek(start)
+        tasks = Iter_Line_Tasks(file_stream, STREAM_BLOCK_SIZE, options, start)
+    else:
+        tasks = [(Reduce_Range, (wiki_file, range_start, range_end), options, range_end) for range_start, range_end in Find_Page_Ranges(wiki_file, chunk_size, start)]
+    results = Iter_Task_Results(tasks, workers)
+    try:
+        for result in results:
+            yield result
+    finally:
+        results.close()
+        if file_stream is not None:
+            file_stream.close()
+
+def Wiki_Input_Size(wiki_file, wiki_index_file=None):
+    # The size of the wiki file in the input offsets of Iter_Reduced_Chunks, None for a .bz2 file without an index.
+    if wiki_file.endswith('.bz2') and (wiki_index_file or Find_Wiki_Index_File(wiki_file)) is None:
+        return None
+    return os.path.getsize(wiki_file)
+
+def Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file, print_batch=177000, workers=1, chunk_size=64 * 1024 * 1024, wiki_index_file=None, resume=False, checkpoint_interval=60.0, engine='lines', canonical=False, namespaces=None):
+    # Chunks are written back in order, so the wiki_reduced_file is identical to the single process output.
+    # engine='mmap' extracts with the byte level Scan_Block engine, which gives the same output.
+    # canonical=True extracts canonical titles (see Canonical_Title) and then resolves redirects, see WIKI_LINK_REDIRECTS.
+    # namespaces (WIKI_LINK_NAMESPACES.NAMESPACES) only keeps the pages and links of its included namespaces.
+    # Every checkpoint_interval seconds the position after the last written chunk is saved, see WIKI_LINK_CHECKPOINT.
+    # resume=True truncates the wiki_reduced_file to the last checkpoint and carries on from there.
     print("Extracting Page Titles and Links from Wiki Datastore...\n")
-    page_number = 1
+    if not WIKI_LINK_CHECKPOINT.Checkpointable(wiki_reduced_file):
+        if resume:
+            print("\tA compressed {} can't be resumed, starting from the beginning.\n".format(wiki_reduced_file))
+        resume = False
+        checkpoint_interval = float('inf')
+    options = {'engine': engine, 'namespaces': namespaces}
+    if canonical:
+        options['case'] = WIKI_LINK_NAMESPACES.Read_Title_Case(wiki_file)
+        print("\tCanonical titles, case: {}\n".format(options['case']))
+    page_number = 0
+    link_number = 0
+    batch_page = 0
+    input_offset = 0
     start_time = time.time()
-    batch_time = start_time
-    with open(wiki_file, 'r') as file_stream:
-        with open(wiki_reduced_file, 'w') as save_stream: # Save Page Titles and Links to wiki_reduced_file
-            for line in file_stream:
-                if '<page>' in line:
-                    if page_number % print_batch == 0:
-                        print("Page: {}\tTime: {}\tPages per Second: {}".format(page_number, ("%.2f" % (time.time() - start_time)), "%.0f" % (print_batch / (time.time() - batch_time))))
-                        batch_time = time.time()
-                elif '</page>' in line:
-                    page_number += 1
-                elif '<title>' in line:
-                    t = line.split('<title>')[1].split('</title>')[0].replace('\"','\\"').replace('&quot;','\\"').replace('&amp;','&').replace('&nbsp;','_').replace(' ', '_').replace('\t', '')
-                    if ';' not in t and '{' not in t and '}' not in t and '`' not in t and '\\' not in t:
-                        save_stream.write('T\t' + t + '\n')
-                elif '[[' in line:
-                    link_list = line.split('[[')[1:]
-                    for link in link_list:
-                        l = link.split(']]')[0].split('|')[0].replace('\"','\\"').replace('&quot;','\\"').replace('&amp;','&').replace('&nbsp;','_').replace(' ', '_').replace('\t', '')
-                        if ';' not in l and '{' not in l and '}' not in l and '`' not in l and '\\' not in l:
-                            save_stream.write( 'L\t' + l + '\n')
+    checkpoint_time = start_time
+    checkpoint = WIKI_LINK_CHECKPOINT.Load_Checkpoint(wiki_reduced_file, 'reduce', wiki_file) if resume else None
+    if checkpoint is not None:
+        input_offset = checkpoint['input_offset']
+        page_number = batch_page = checkpoint['page_number']
+        link_number = checkpoint.get('link_number', 0) # Not in the checkpoints of older versions.
+        print("\tResuming at Page: {}\tInput Offset: {}\n".format(page_number, input_offset))
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('reduce', Wiki_Input_Size(wiki_file, wiki_index_file), input_offset)
+    with WIKI_LINK_CHECKPOINT.Open_Output(wiki_reduced_file, checkpoint) as save_stream: # Save Page Titles and Links to wiki_reduced_file
+        for output, page_count, input_offset in Iter_Reduced_Chunks(wiki_file, workers, chunk_size, wiki_index_file, options=options, start=input_offset):
+            save_stream.write(output.encode('utf-8'))
+            page_number += page_count
+            link_number += output.count('\nL\t') + output.startswith('L\t')
+            metrics.Update(pages=page_number, links=link_number, bytes_read=input_offset, bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+            if page_number // print_batch > batch_page // print_batch:
+                metrics.Print()
+                batch_page = page_number
+            if time.time() - checkpoint_time >= checkpoint_interval:
+                WIKI_LINK_CHECKPOINT.Save_Checkpoint(wiki_reduced_file, save_stream, 'reduce', wiki_file, input_offset=input_offset, page_number=page_number, link_number=link_number)
+                checkpoint_time = time.time()
+        metrics.Update(bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+    metrics.Finish(links=link_number)
+    WIKI_LINK_CHECKPOINT.Clear_Checkpoint(wiki_reduced_file)
     print("Extraction Complete!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+    if canonical:
+        WIKI_LINK_REDIRECTS.Resolve_Redirects(wiki_reduced_file, print_batch)
+
+def Iter_Reduced_Records(chunks):
+    # Split reduced chunks back into ('T' or 'L', title) records.
+    for chunk in chunks:
+        for line in chunk[0].split('\n')[:-1]:
+            yield line[0], line[2:]
+
+def Iter_Chunk_Metrics(chunks, metrics):
+    # Passes the chunks of Iter_Reduced_Chunks on, updating the input offset of metrics (WIKI_LINK_METRICS.STAGE_METRICS).
+    for chunk in chunks:
+        metrics.Update(bytes_read=chunk[2])
+        yield chunk
+
+def Iter_Page_Links(records):
+    # Group records into (page title, {dest title: strength}) in page order.
+    # Links found before the first title belong to the page None.
+    current_page = None
+    current_page_dest_strength = {}
+    for kind, title in records:
+        if 'L' == kind:
+            try:
+                current_page_dest_strength[title] += 1
+            except KeyError:
+                current_page_dest_strength[title] = 1
+        elif 'T' == kind:
+            if current_page is not None or current_page_dest_strength:
+                yield current_page, current_page_dest_strength
+            current_page = title
+            current_page_dest_strength = {}
+    if current_page is not None or current_page_dest_strength:
+        yield current_page, current_page_dest_strength
+
+def Save_Fused(wiki_file, master_ids_file, relationships_file, print_batch=177000, workers=1, chunk_size=64 * 1024 * 1024, wiki_index_file=None, engine='lines', namespaces=None):
+    # Single pass alternative to Reduce_Wiki_Datastore, Save_Node_IDs & Save_Relationships, without a wiki_reduced_file.
+    # IDs are assigned on first sight, in the same order as Save_Node_IDs, so both files match the staged output.
+    # namespaces filters the pages and links as in Reduce_Wiki_Datastore.
+    print("Saving Master ID Table & Relationships File from Wiki Datastore...\n")
+    titles = WIKI_LINK_TITLES.TITLE_TABLE()
+
+    start_time = time.time()
+    page_number = 0
+    link_number = 0
 
-def Save_Node_IDs(wiki_reduced_file, master_ids_file, print_batch=400000):
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('fused', Wiki_Input_Size(wiki_file, wiki_index_file))
+    def Written():
+        positions = (WIKI_LINK_METRICS.Stream_Position(ids_stream), WIKI_LINK_METRICS.Stream_Position(save_stream))
+        return None if None in positions else sum(positions)
+
+    records = Iter_Reduced_Records(Iter_Chunk_Metrics(Iter_Reduced_Chunks(wiki_file, workers, chunk_size, wiki_index_file, options={'engine': engine, 'namespaces': namespaces}), metrics))
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'wb') as ids_stream:
+        with WIKI_LINK_STREAMS.Open_File(relationships_file, 'wb') as save_stream:
+            for page, dest_strength in Iter_Page_Links(records):
+                if page is None:
+                    current_page = b""
+                else:
+                    page = page.encode('utf-8')
+                    page_id, new = titles.Add(page)
+                    if new:
+                        ids_stream.write(b"%s\t%d\n" % (page, page_id))
+                    current_page = str(page_id).encode()
+                for dest in dest_strength:
+                    strength = dest_strength[dest]
+                    dest = dest.encode('utf-8')
+                    dest_id, new = titles.Add(dest, strength)
+                    if new:
+                        ids_stream.write(b"%s\t%d\n" % (dest, dest_id))
+                    save_stream.write(b"%s\t%d\t%d\n" % (current_page, dest_id, strength))
+                    link_number += strength
+                page_number += 1
+                if page_number % WIKI_LINK_METRICS.UPDATE_BATCH == 0 or page_number % print_batch == 0:
+                    metrics.Update(pages=page_number, links=link_number, ids=len(titles), bytes_written=Written())
+                    if page_number % print_batch == 0:
+                        metrics.Print()
+            metrics.Update(pages=page_number, links=link_number, ids=len(titles), bytes_written=Written())
+    metrics.Finish()
+
+    titles.Save(WIKI_LINK_TITLES.Title_Table_File(master_ids_file))
+    print("Master IDs & Relationships Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Save_Node_IDs(wiki_reduced_file, master_ids_file, print_batch=400000, memory_budget=None, temp_dir=None):
+    # The title table (with link counts) is saved next to master_ids_file, see WIKI_LINK_TITLES.
+    # With a memory_budget (bytes) the IDs are assigned out of core instead, see WIKI_LINK_EXTSORT.
+    if memory_budget is not None:
+        return WIKI_LINK_EXTSORT.Save_Node_IDs_External(wiki_reduced_file, master_ids_file, memory_budget, temp_dir, print_batch)
     print("Saving Master ID Table...\n")
 
-    master_ids = {}
-    link_counts = {}
+    titles = WIKI_LINK_TITLES.TITLE_TABLE()
 
     start_time = time.time()
-    current_page = ""
 
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('node_ids', WIKI_LINK_STREAMS.Input_Size(wiki_reduced_file))
     print("\tSaving lookup table for Page IDs / Destination IDs...\n")
-    with open(wiki_reduced_file, 'rb') as file_stream:
-        with open(master_ids_file, 'w') as save_stream:
-
-            page_number = 0
-            id_count = 0
+    with WIKI_LINK_STREAMS.Open_File(wiki_reduced_file, 'rb') as file_stream:
+        with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'wb') as save_stream:
 
             for line in file_stream:
                 if b'\n' != line:
                     l = line.split(b'\n')[0].split(b'\t')
-                    try:
-                        break_check = master_ids[l[1]]
-                        link_counts[l[1]] += 1
-                    except:
-                        master_ids[l[1]] = 0
-                        link_counts[l[1]] = 1
-                        save_stream.write(l[1].decode('utf-8') + '\t' + str(id_count) + '\n')
-                        id_count += 1
-                        if id_count % print_batch == 0:
-                            print("\tID # {}\tLast Record: {}".format(id_count, l))
+                    title_id, new = titles.Add(l[1])
+                    if new:
+                        save_stream.write(l[1] + b'\t' + str(title_id).encode() + b'\n')
+                        if (title_id + 1) % WIKI_LINK_METRICS.UPDATE_BATCH == 0 or (title_id + 1) % print_batch == 0:
+                            metrics.Update(ids=title_id + 1, bytes_read=WIKI_LINK_METRICS.Stream_Position(file_stream), bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+                            if (title_id + 1) % print_batch == 0:
+                                metrics.Print()
+            metrics.Update(ids=len(titles), bytes_read=WIKI_LINK_METRICS.Stream_Position(file_stream), bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+    metrics.Finish()
 
+    titles.Save(WIKI_LINK_TITLES.Title_Table_File(master_ids_file))
     print("Table Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
 
-def Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, print_batch=177000):
+def Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, print_batch=177000, memory_budget=None, temp_dir=None, resume=False, checkpoint_interval=60.0):
+    # With a memory_budget (bytes) link endpoints are resolved with sort-merge joins instead, see WIKI_LINK_EXTSORT.
+    # Every checkpoint_interval seconds the position after a page title is saved, see WIKI_LINK_CHECKPOINT.
+    # resume=True truncates the relationships_file to the last checkpoint and carries on from there.
+    if memory_budget is not None:
+        if resume:
+            print("\tResume is not supported with a memory budget, starting from the beginning.\n")
+        return WIKI_LINK_EXTSORT.Save_Relationships_External(wiki_reduced_file, master_ids_file, relationships_file, memory_budget, temp_dir, print_batch)
     print("Saving Relationships File...\n")
-    current_page_dest_id_strength = {}
-    master_ids = {}
-    page_ids = {}
-    dest_ids = {}
+    if not WIKI_LINK_CHECKPOINT.Checkpointable(relationships_file, wiki_reduced_file):
+        if resume:
+            print("\tCompressed files can't be resumed, starting from the beginning.\n")
+        resume = False
+        checkpoint_interval = float('inf')
+    current_page_dest_strength = {}
 
     start_time = time.time()
-    current_page = ""
+    checkpoint_time = start_time
     page_number = 0
     link_number = 0
+    current_page = b""
+    input_offset = 0
+    checkpoint = WIKI_LINK_CHECKPOINT.Load_Checkpoint(relationships_file, 'relationships', wiki_reduced_file) if resume else None
+    if checkpoint is not None:
+        input_offset = checkpoint['input_offset']
+        page_number = checkpoint['page_number']
+        link_number = checkpoint['link_number']
+        current_page = checkpoint['current_page'].encode()
+        print("\tResuming at Page: {}\tInput Offset: {}\n".format(page_number, input_offset))
 
-    print("\tLoading Master IDs File...\n")
-    with open(master_ids_file, 'r') as read_stream:
-        for line in read_stream:
-            l = line.replace('\n', '').split('\t')
-            master_ids[l[0]] = l[1]
+    print("\tLoading Master IDs...\n")
+    titles = WIKI_LINK_TITLES.Load_Master_IDs(master_ids_file)
 
+    def Write_Page(save_stream, current_page, current_page_dest_strength):
+        for dest in current_page_dest_strength:
+            dest_id = titles.Find(dest)
+            if dest_id < 0:
+                panic("Link {} is missing from {}".format(dest, master_ids_file))
+            save_stream.write(b"%s\t%d\t%d\n" % (current_page, dest_id, current_page_dest_strength[dest]))
 
     print("\tSaving Relationships File...\n")
-    with open(wiki_reduced_file, 'r') as read_stream:
-        with open(relationships_file, 'w') as save_stream:
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('relationships', WIKI_LINK_STREAMS.Input_Size(wiki_reduced_file), input_offset)
+    with WIKI_LINK_STREAMS.Open_File(wiki_reduced_file, 'rb') as read_stream:
+        with WIKI_LINK_CHECKPOINT.Open_Output(relationships_file, checkpoint) as save_stream:
             # save_stream.write("source_id\tdest_id\tstrength\n")
-            current_page = ""
-            output = ""
+            if input_offset:
+                read_stream.seek(input_offset)
             for line in read_stream:
-                if '\n' != line:
-                    if 'L' == line[0]:
+                if b'\n' != line:
+                    if b'L' == line[:1]:
                         try:
-                            current_page_dest_id_strength[line[2:-1]] += 1
-                        except:
-                            current_page_dest_id_strength[line[2:-1]] = 1
+                            current_page_dest_strength[line[2:-1]] += 1
+                        except KeyError:
+                            current_page_dest_strength[line[2:-1]] = 1
                         link_number += 1
-                    elif 'T' == line[0]:
-                        for dest in current_page_dest_id_strength:
-                            save_stream.write( current_page + "\t" + master_ids[dest] + "\t" + str(current_page_dest_id_strength[dest]) + "\n" )
-                        current_page_dest_id_strength = {}
-                        current_page = master_ids[line[2:-1]]
+                    elif b'T' == line[:1]:
+                        Write_Page(save_stream, current_page, current_page_dest_strength)
+                        current_page_dest_strength = {}
+                        page_id = titles.Find(line[2:-1])
+                        if page_id < 0:
+                            panic("Page {} is missing from {}".format(line[2:-1], master_ids_file))
+                        current_page = str(page_id).encode()
                         page_number += 1
-
+                        if page_number % WIKI_LINK_METRICS.UPDATE_BATCH == 0 or page_number % print_batch == 0:
+                            metrics.Update(pages=page_number, links=link_number, bytes_read=WIKI_LINK_METRICS.Stream_Position(read_stream), bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+                            if page_number % print_batch == 0:
+                                metrics.Print()
+                        if page_number % 1000 == 0 and time.time() - checkpoint_time >= checkpoint_interval:
+                            WIKI_LINK_CHECKPOINT.Save_Checkpoint(relationships_file, save_stream, 'relationships', wiki_reduced_file, input_offset=read_stream.tell(), page_number=page_number, link_number=link_number, current_page=current_page.decode())
+                            checkpoint_time = time.time()
+            Write_Page(save_stream, current_page, current_page_dest_strength)
+            metrics.Update(pages=page_number, links=link_number, bytes_read=WIKI_LINK_METRICS.Stream_Position(read_stream), bytes_written=WIKI_LINK_METRICS.Stream_Position(save_stream))
+    metrics.Finish()
+    WIKI_LINK_CHECKPOINT.Clear_Checkpoint(relationships_file)
 
     print("Relationships Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
 
-def Count_Node_Strength(master_ids_file, relationships_file):
-    pass
-    # To be filled in at a later date.
+def Count_Node_Strength(master_ids_file, relationships_file, node_strength_file=None, chunk_size=64 * 1024 * 1024):
+    # Saves the in/out degree & strength of every node as extra columns of master_ids, see WIKI_LINK_STRENGTH.
+    # numpy is only needed for this step, so it is imported here.
+    import WIKI_LINK_STRENGTH
+    WIKI_LINK_STRENGTH.Count_Node_Strength(master_ids_file, relationships_file, node_strength_file, chunk_size)
 
 if __name__ == "__main__":
 
-    print_batch = 177000
+    parser = argparse.ArgumentParser(description="Extract wikipedia page titles and links into neo4j tsv files.")
+    parser.add_argument("--wiki-file", default="data/enwiki-20170820-pages-articles.xml")
+    parser.add_argument("--wiki-reduced-file", default="data/wiki_reduced_file.tsv")
+    parser.add_argument("--master-ids-file", default="data/master_ids.tsv")
+    parser.add_argument("--relationships-file", default="data/relationships.tsv")
+    parser.add_argument("--wiki-index-file", default=None, help="Index of a pages-articles-multistream.xml.bz2 wiki file. Found automatically when it sits next to the wiki file.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to extract titles and links.")
+    parser.add_argument("--engine", choices=["lines", "mmap"], default="lines", help="Extraction engine. mmap scans raw bytes, with the same output: about 2.5x faster on full length articles, no faster on very short pages.")
+    parser.add_argument("--memory-budget", type=int, default=None, help="Assign IDs and relationships out of core, holding about this many bytes in memory.")
+    parser.add_argument("--temp-dir", default=None, help="Directory for the sorted runs of --memory-budget. Defaults to the output directory.")
+    parser.add_argument("--csr-prefix", default=None, help="Also save relationships as a binary CSR graph ([prefix].offsets/.dest/.strength).")
+    parser.add_argument("--resume", action="store_true", help="Carry on from the last checkpoint of the wiki reduced file & relationships file.")
+    parser.add_argument("--fused", action="store_true", help="Write master ids & relationships in one pass over the wiki file, without a wiki reduced file.")
+    parser.add_argument("--canonical", action="store_true", help="Canonical titles (first letter case, no #anchors) with redirects resolved to their articles. Not with --fused.")
+    parser.add_argument("--namespaces", default=None, help="Comma separated namespaces (names or keys of the wiki file's <namespaces>, 'article', 'interwiki') to keep. Default: all.")
+    parser.add_argument("--partition", action="store_true", help="Also split the relationships file by (source, dest) namespace.")
+    parser.add_argument("--node-strength", action="store_true", help="Also save the in/out degree & strength of every node next to the master ids file (needs numpy).")
+    parser.add_argument("--metrics-jsonl", default=None, help="Append the progress metrics of every stage to this file as JSON lines.")
+    parser.add_argument("--metrics-prometheus", default=None, help="Keep the latest progress metrics of every stage in this Prometheus textfile (.prom).")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="Seconds between metrics written to --metrics-jsonl & --metrics-prometheus.")
+    parser.add_argument("--profile", action="store_true", help="Also time the read, parse, normalize & write phases of every stage.")
+    args = parser.parse_args()
+
+    WIKI_LINK_METRICS.Configure(args.metrics_jsonl, args.metrics_prometheus, args.profile, args.metrics_interval)
+
+    namespaces = None
+    if args.namespaces or args.partition:
+        namespaces = WIKI_LINK_NAMESPACES.NAMESPACES(WIKI_LINK_NAMESPACES.Read_Namespaces(args.wiki_file), args.namespaces.split(',') if args.namespaces else None)
 
-    wiki_file = "data/enwiki-20170820-pages-articles.xml"
-    wiki_reduced_file = "data/wiki_reduced_file.tsv"
-    master_ids_file = "data/master_ids.tsv"
-    relationships_file = "data/relationships.tsv"
+    if args.fused and args.canonical:
+        panic("Redirects are resolved on the wiki reduced file, --canonical can't be used with --fused.")
+    if args.fused:
+        Save_Fused(args.wiki_file, args.master_ids_file, args.relationships_file, workers=args.workers, wiki_index_file=args.wiki_index_file, engine=args.engine, namespaces=namespaces)
+        if args.partition:
+            WIKI_LINK_NAMESPACES.Partition_Relationships(args.master_ids_file, args.relationships_file, namespaces)
+        if args.node_strength:
+            Count_Node_Strength(args.master_ids_file, args.relationships_file)
+        if args.csr_prefix:
+            WIKI_LINK_GRAPH.Save_CSR_Graph(args.master_ids_file, args.relationships_file, args.csr_prefix)
+        sys.exit()
 
     # 1.
-    Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file)
+    Reduce_Wiki_Datastore(args.wiki_file, args.wiki_reduced_file, workers=args.workers, wiki_index_file=args.wiki_index_file, resume=args.resume, engine=args.engine, canonical=args.canonical, namespaces=namespaces)
 
     # 2.
-    Save_Node_IDs(wiki_reduced_file, master_ids_file)
+    Save_Node_IDs(args.wiki_reduced_file, args.master_ids_file, memory_budget=args.memory_budget, temp_dir=args.temp_dir)
 
     # 3.
-    Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file)
+    Save_Relationships(args.wiki_reduced_file, args.master_ids_file, args.relationships_file, memory_budget=args.memory_budget, temp_dir=args.temp_dir, resume=args.resume)
+
+    # 4.
+    if args.partition:
+        WIKI_LINK_NAMESPACES.Partition_Relationships(args.master_ids_file, args.relationships_file, namespaces)
+
+    # 5.
+    if args.node_strength:
+        Count_Node_Strength(args.master_ids_file, args.relationships_file)
+
+    # 6.
+    if args.csr_prefix:
+        WIKI_LINK_GRAPH.Save_CSR_Graph(args.master_ids_file, args.relationships_file, args.csr_prefix)
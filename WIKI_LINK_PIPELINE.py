@@ -0,0 +1,402 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import argparse
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+
+import WIKI_LINK_GRAPH
+import WIKI_LINK_METRICS
+import WIKI_LINK_NAMESPACES
+import WIKI_LINK_PARSE
+import WIKI_LINK_STREAMS
+
+# Non-interactive pipeline: the stages of main.py's menus as a dependency graph, for unattended runs (cron, batch schedulers).
+#   python WIKI_LINK_PIPELINE.py relationships csr neo4j --workers 8
+# builds the targets and the stages they need, and exits with 1 if a stage failed (a panic fails its stage).
+# Freshness: once a stage is done, the fingerprints (size, mtime) of its input & output files and the parameters that
+# change its output are saved in the manifest file. A stage only runs again when it has no record, an input or output
+# doesn't match its record, its parameters changed, or a stage it needs is run. --force runs stages anyway, --dry-run
+# prints the plan without running it.
+# Overlap: every stage runs in a process of its own, up to jobs at once, as soon as the stages it needs are done. The
+# neo4j node load runs next to Save_Relationships, and the CSR graph & node strength are built during the relationship load.
+# A stage that follows one of its inputs (neo4j_relationships) starts while that file is still being written: the
+# relationship batches go to neo4j as Save_Relationships writes them, see Follow_Lines. Only for a plain (not compressed)
+# file, and not with resume, since the old file is removed before the stage writing it starts.
+# With a Prometheus metrics file, each stage keeps its own [file].[stage].prom, see WIKI_LINK_METRICS.
+
+WAITING, RUNNING, DONE, FAILED = 0, 1, 2, 3
+TARGET_ALIASES = {'neo4j': ['neo4j_nodes', 'neo4j_relationships']}
+POLL_INTERVAL = 0.5
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+class STAGE(object):
+    # run(files, options) writes outputs from inputs (file names). params are the options its outputs depend on.
+    # after are stages that must be done first without an output file in between (the neo4j loads).
+    # follows is the input that may be read while it is written.
+
+    def __init__(self, name, run, inputs, outputs, params=None, after=(), follows=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.after = list(after)
+        self.follows = follows
+
+def Namespaces(files, options):
+    if not options.get('namespaces'):
+        return None
+    return WIKI_LINK_NAMESPACES.NAMESPACES(WIKI_LINK_NAMESPACES.Read_Namespaces(files['wiki_file']), options['namespaces'])
+
+def Run_Reduce(files, options):
+    WIKI_LINK_PARSE.Reduce_Wiki_Datastore(files['wiki_file'], files['wiki_reduced_file'], workers=options['workers'], wiki_index_file=files['wiki_index_file'], resume=options['resume'], engine=options['engine'], canonical=options['canonical'], namespaces=Namespaces(files, options))
+
+def Run_Node_IDs(files, options):
+    WIKI_LINK_PARSE.Save_Node_IDs(files['wiki_reduced_file'], files['master_ids_file'], memory_budget=options['memory_budget'], temp_dir=options['temp_dir'])
+
+def Run_Relationships(files, options):
+    WIKI_LINK_PARSE.Save_Relationships(files['wiki_reduced_file'], files['master_ids_file'], files['relationships_file'], memory_budget=options['memory_budget'], temp_dir=options['temp_dir'], resume=options['resume'])
+
+def Run_Fused(files, options):
+    WIKI_LINK_PARSE.Save_Fused(files['wiki_file'], files['master_ids_file'], files['relationships_file'], workers=options['workers'], wiki_index_file=files['wiki_index_file'], engine=options['engine'], namespaces=Namespaces(files, options))
+
+def Run_Strength(files, options):
+    WIKI_LINK_PARSE.Count_Node_Strength(files['master_ids_file'], files['relationships_file'], files['node_strength_file'])
+
+def Run_CSR(files, options):
+    WIKI_LINK_GRAPH.Save_CSR_Graph(files['master_ids_file'], files['relationships_file'], files['csr_prefix'])
+
+def Run_Analytics(files, options):
+    import WIKI_LINK_ANALYTICS # Needs numpy.
+    WIKI_LINK_ANALYTICS.Save_PageRank(files['csr_prefix'], files['master_ids_file'], files['pagerank_file'], workers=options['workers'])
+    WIKI_LINK_ANALYTICS.Save_Components(files['csr_prefix'], files['master_ids_file'], files['components_file'])
+
+def Neo4j_Connect(options):
+    import WIKI_LINK_NEOCONNECT # Needs the neo4j driver.
+    return WIKI_LINK_NEOCONNECT.NEO4J_CONNECT(options['neo4j_uri'], options['neo4j_user'], options['neo4j_password'])
+
+def Run_Neo4j_Nodes(files, options):
+    neo = Neo4j_Connect(options)
+    neo.Setup_Constraints()
+    neo.Load_Nodes(files['master_ids_file'])
+    neo.Close()
+
+def Run_Neo4j_Relationships(files, options):
+    # options['producer'] is the state of the stage writing the relationships file when it is followed.
+    neo = Neo4j_Connect(options)
+    lines = None
+    if options.get('producer') is not None:
+        print("\tFollowing {} while it is written...\n".format(files['relationships_file']))
+        lines = Follow_Lines(files['relationships_file'], options['producer'])
+    neo.Load_Relationships(files['relationships_file'], lines=lines)
+    neo.Close()
+
+def Stages(files, options):
+    # The stages by name. With options['fused'] the master ids & relationships files come from the fused stage.
+    if options['fused'] and options['canonical']:
+        panic("Redirects are resolved on the wiki reduced file, canonical titles can't be used with fused.")
+    wiki_inputs = [files['wiki_file']] + ([files['wiki_index_file']] if files['wiki_index_file'] else [])
+    namespaces = sorted(options['namespaces']) if options['namespaces'] else None
+    neo4j = {'neo4j_uri': options['neo4j_uri']}
+    csr_files = list(WIKI_LINK_GRAPH.CSR_Files(files['csr_prefix']))
+    stages = [
+        STAGE('strength', Run_Strength, [files['master_ids_file'], files['relationships_file']], [files['node_strength_file']]),
+        STAGE('csr', Run_CSR, [files['master_ids_file'], files['relationships_file']], csr_files),
+        STAGE('analytics', Run_Analytics, csr_files + [files['master_ids_file']], [files['pagerank_file'], files['components_file']]),
+        STAGE('neo4j_nodes', Run_Neo4j_Nodes, [files['master_ids_file']], [], neo4j),
+        STAGE('neo4j_relationships', Run_Neo4j_Relationships, [files['relationships_file']], [], neo4j, after=['neo4j_nodes'], follows=files['relationships_file']),
+    ]
+    if options['fused']:
+        stages.append(STAGE('fused', Run_Fused, wiki_inputs, [files['master_ids_file'], files['relationships_file']], {'namespaces': namespaces}))
+    else:
+        stages.append(STAGE('reduce', Run_Reduce, wiki_inputs, [files['wiki_reduced_file']], {'canonical': options['canonical'], 'namespaces': namespaces}))
+        stages.append(STAGE('node_ids', Run_Node_IDs, [files['wiki_reduced_file']], [files['master_ids_file']]))
+        stages.append(STAGE('relationships', Run_Relationships, [files['wiki_reduced_file'], files['master_ids_file']], [files['relationships_file']]))
+    return dict((stage.name, stage) for stage in stages)
+
+def Fingerprint(file_name):
+    # [size, mtime in ns] of file_name, or None if it doesn't exist.
+    try:
+        file_stat = os.stat(file_name)
+    except OSError:
+        return None
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+
+def Record(stage):
+    return {'inputs': dict((file_name, Fingerprint(file_name)) for file_name in stage.inputs),
+            'outputs': dict((file_name, Fingerprint(file_name)) for file_name in stage.outputs),
+            'params': stage.params}
+
+def Load_Manifest(manifest_file):
+    if not os.path.isfile(manifest_file):
+        return {}
+    with open(manifest_file, 'r') as manifest_stream:
+        return json.load(manifest_stream)
+
+def Save_Manifest(manifest_file, manifest):
+    with open(manifest_file + '.tmp', 'w') as manifest_stream:
+        json.dump(manifest, manifest_stream, indent=1, sort_keys=True)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+def Stale_Reason(stage, record):
+    # Why stage must run again, or None if its record still matches its files & parameters.
+    # Without a record (files built from the menus), outputs that are all newer than the inputs are fresh, as with make.
+    if record is None:
+        for file_name in stage.inputs:
+            if Fingerprint(file_name) is None:
+                return "input missing: {}".format(file_name)
+        outputs = [Fingerprint(file_name) for file_name in stage.outputs]
+        if not outputs or None in outputs:
+            return "never built"
+        if max([0] + [Fingerprint(file_name)[1] for file_name in stage.inputs]) > min(fingerprint[1] for fingerprint in outputs):
+            return "inputs changed"
+        return None
+    if record['params'] != stage.params:
+        return "parameters changed"
+    if sorted(record['inputs']) != sorted(stage.inputs) or sorted(record['outputs']) != sorted(stage.outputs):
+        return "files changed"
+    for file_name in stage.inputs:
+        if record['inputs'].get(file_name) != Fingerprint(file_name):
+            return "input changed: {}".format(file_name)
+    for file_name in stage.outputs:
+        if not os.path.isfile(file_name):
+            return "output missing: {}".format(file_name)
+        if record['outputs'].get(file_name) != Fingerprint(file_name):
+            return "output changed: {}".format(file_name)
+    return None
+
+def Dependencies(stages, name):
+    # The stages that must be done (or, for the followed file, running) before stage name starts.
+    producers = dict((file_name, producer) for producer in stages for file_name in stages[producer].outputs)
+    dependencies = []
+    for dependency in [producers[file_name] for file_name in stages[name].inputs if file_name in producers] + stages[name].after:
+        if dependency not in dependencies:
+            dependencies.append(dependency)
+    return dependencies
+
+def Master_IDs_Sibling(master_ids_file, suffix):
+    # [master_ids][suffix].tsv, the default file names of WIKI_LINK_STRENGTH.Node_Strength_File and
+    # WIKI_LINK_ANALYTICS.Analytics_Files (which need numpy, so aren't imported here).
+    base, extension = WIKI_LINK_STREAMS.Split_Extension(master_ids_file)
+    return base + suffix + extension
+
+def Plan(stages, targets, manifest, force=()):
+    # Returns the stages needed for targets in dependency order, and {stage: reason} of the ones to run.
+    names = []
+    for target in targets:
+        names.extend(TARGET_ALIASES.get(target, [target]))
+    force = [name for target in force for name in TARGET_ALIASES.get(target, [target])]
+    for name in list(names) + list(force):
+        if name not in stages and 'all' != name:
+            panic("Unknown stage {}, the stages are: {}".format(name, ", ".join(sorted(stages))))
+    order = []
+    def Visit(name, path):
+        if name in path:
+            panic("Stage dependency cycle: {}".format(" -> ".join(path + [name])))
+        if name not in order:
+            for dependency in Dependencies(stages, name):
+                Visit(dependency, path + [name])
+            order.append(name)
+    for name in names:
+        Visit(name, [])
+    run = {}
+    for name in order:
+        upstream = [dependency for dependency in Dependencies(stages, name) if dependency in run]
+        if name in force or 'all' in force:
+            run[name] = "forced"
+        elif upstream:
+            run[name] = "needs {}".format(", ".join(upstream))
+        else:
+            reason = Stale_Reason(stages[name], manifest.get(name))
+            if reason is not None:
+                run[name] = reason
+    return order, run
+
+def Follow_Lines(file_name, producer, poll_interval=POLL_INTERVAL):
+    # Yields the lines of file_name while it is being written, until producer (the multiprocessing.Value state of the
+    # stage writing it) is DONE. Only whole lines are yielded.
+    while not os.path.isfile(file_name):
+        if producer.value in (DONE, FAILED):
+            panic("{} was not written.".format(file_name))
+        time.sleep(poll_interval)
+    with open(file_name, 'rb', buffering=0) as read_stream:
+        pending = b''
+        while True:
+            state = producer.value # Before the read, so a DONE state is followed by one last read of the whole file.
+            data = read_stream.read(WIKI_LINK_STREAMS.BUFFER_SIZE)
+            if data:
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line + b'\n'
+            elif DONE == state:
+                break
+            elif FAILED == state:
+                panic("The stage writing {} failed.".format(file_name))
+            else:
+                time.sleep(poll_interval)
+        if pending:
+            yield pending
+
+def Stage_Prometheus_File(prometheus_file, name):
+    base, extension = os.path.splitext(prometheus_file)
+    return "{}.{}{}".format(base, name, extension or '.prom')
+
+def _Run_Stage(stage, files, options, metrics):
+    # The process of a stage. metrics are the WIKI_LINK_METRICS.Configure arguments of the pipeline.
+    jsonl_file, prometheus_file, profile, interval = metrics
+    WIKI_LINK_METRICS.Configure(jsonl_file, prometheus_file and Stage_Prometheus_File(prometheus_file, stage.name), profile, interval)
+    try:
+        stage.run(files, options)
+    except SystemExit: # panic() exits with status 0, which would pass for done.
+        sys.exit(1)
+
+def Can_Follow(stage, options):
+    return stage.follows is not None and not options['resume'] and not WIKI_LINK_STREAMS.Compression(stage.follows)
+
+def Run_Stages(stages, order, run, manifest_file, manifest, files, options, jobs=2):
+    # Runs the stages of run in processes, as soon as they can start. Returns True if they are all done.
+    producers = dict((file_name, producer) for producer in stages for file_name in stages[producer].outputs)
+    states = dict((name, multiprocessing.Value('i', DONE if name not in run else WAITING)) for name in order)
+    followed = dict((producers[stages[name].follows], name) for name in run if Can_Follow(stages[name], options) and producers.get(stages[name].follows) in run)
+    processes = {}
+    start_times = {}
+    durations = {}
+    failed = []
+    start_time = time.time()
+
+    def Ready(name):
+        for dependency in Dependencies(stages, name):
+            if DONE == states[dependency].value:
+                continue
+            if RUNNING == states[dependency].value and followed.get(dependency) == name:
+                continue
+            return False
+        return True
+
+    try:
+        while True:
+            if not failed:
+                for name in order:
+                    if WAITING == states[name].value and len(processes) < jobs and Ready(name):
+                        stage_options = options
+                        if name in followed.values():
+                            producer = [dependency for dependency in followed if followed[dependency] == name][0]
+                            if RUNNING == states[producer].value:
+                                stage_options = dict(options, producer=states[producer])
+                        if name in followed:
+                            # The follower must not read the last run's file before it is truncated.
+                            for file_name in stages[name].outputs:
+                                if file_name == stages[followed[name]].follows and os.path.isfile(file_name):
+                                    os.remove(file_name)
+                        print("\nPipeline: starting {} ({})\n".format(name, run[name]))
+                        manifest.pop(name, None)
+                        Save_Manifest(manifest_file, manifest)
+                        process = multiprocessing.Process(target=_Run_Stage, args=(stages[name], files, stage_options, (WIKI_LINK_METRICS.JSONL_FILE, WIKI_LINK_METRICS.PROMETHEUS_FILE, WIKI_LINK_METRICS.PROFILE, WIKI_LINK_METRICS.INTERVAL)), name=name)
+                        states[name].value = RUNNING
+                        start_times[name] = time.time()
+                        process.start()
+                        processes[name] = process
+            if not processes:
+                break
+            multiprocessing.connection.wait([process.sentinel for process in processes.values()])
+            for name in [name for name in processes if not processes[name].is_alive()]:
+                process = processes.pop(name)
+                process.join()
+                durations[name] = time.time() - start_times[name]
+                if 0 == process.exitcode:
+                    states[name].value = DONE
+                    manifest[name] = Record(stages[name])
+                    Save_Manifest(manifest_file, manifest)
+                    print("\nPipeline: {} done in {}\n".format(name, "%.2f" % durations[name]))
+                else:
+                    states[name].value = FAILED
+                    failed.append(name)
+                    print("\nPipeline: {} FAILED (exit status {}) after {}\n".format(name, process.exitcode, "%.2f" % durations[name]))
+    finally:
+        for process in processes.values():
+            process.terminate()
+    print("Pipeline Complete!\n\tStages: {}\tStage time: {}\tWall time: {}".format(len(durations), "%.2f" % sum(durations.values()), "%.2f" % (time.time() - start_time)))
+    if failed:
+        print("\tFailed: {}\tNot run: {}".format(", ".join(failed), ", ".join(name for name in order if WAITING == states[name].value) or "-"))
+    return not failed
+
+def Run(targets, files, options, manifest_file=None, jobs=2, force=(), dry_run=False):
+    # Builds targets (stage names, or 'neo4j') from files (see Stages) with options. Returns True if every stage is done.
+    # The manifest file defaults to pipeline_manifest.json next to the master ids file.
+    manifest_file = manifest_file or os.path.join(os.path.dirname(os.path.abspath(files['master_ids_file'])), 'pipeline_manifest.json')
+    stages = Stages(files, options)
+    manifest = Load_Manifest(manifest_file)
+    order, run = Plan(stages, targets, manifest, force)
+    print("Pipeline Plan ({}):\n".format(manifest_file))
+    for name in order:
+        print("\t{}\t{}".format(name, "run: " + run[name] if name in run else "fresh"))
+    print("")
+    producers = dict((file_name, producer) for producer in stages for file_name in stages[producer].outputs)
+    missing = [file_name for name in run for file_name in stages[name].inputs if file_name not in producers and not os.path.isfile(file_name)]
+    if missing:
+        print("Missing input files: {}".format(", ".join(sorted(set(missing)))))
+        return False
+    if dry_run:
+        return True
+    for file_name in [manifest_file] + [file_name for name in run for file_name in stages[name].outputs]:
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    for name in order:
+        if name not in run and name not in manifest: # Adopted, see Stale_Reason.
+            manifest[name] = Record(stages[name])
+    Save_Manifest(manifest_file, manifest)
+    if not run:
+        return True
+    return Run_Stages(stages, order, run, manifest_file, manifest, files, options, jobs)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build the wiki link files (and neo4j database) without the menus, rebuilding only stale stages.")
+    parser.add_argument("targets", nargs="*", default=["relationships"], help="Stages to build: reduce, node_ids, relationships, fused, strength, csr, analytics, neo4j_nodes, neo4j_relationships, or neo4j for both loads. Default: relationships.")
+    parser.add_argument("--wiki-file", default="data/enwiki-20170820-pages-articles.xml")
+    parser.add_argument("--wiki-index-file", default=None, help="Index of a pages-articles-multistream.xml.bz2 wiki file.")
+    parser.add_argument("--wiki-reduced-file", default="data/wiki_reduced_file.tsv")
+    parser.add_argument("--master-ids-file", default="data/master_ids.tsv")
+    parser.add_argument("--relationships-file", default="data/relationships.tsv")
+    parser.add_argument("--node-strength-file", default=None, help="Default: [master ids file]_strength.tsv.")
+    parser.add_argument("--csr-prefix", default=None, help="Default: [relationships file without extension].csr.")
+    parser.add_argument("--pagerank-file", default=None, help="Default: [master ids file]_pagerank.tsv.")
+    parser.add_argument("--components-file", default=None, help="Default: [master ids file]_components.tsv.")
+    parser.add_argument("--manifest-file", default=None, help="Fingerprints of the built stages. Default: pipeline_manifest.json next to the master ids file.")
+    parser.add_argument("--jobs", type=int, default=2, help="Stages run at once.")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Run these stages (and the stages after them) even if they are fresh, 'all' for every stage.")
+    parser.add_argument("--dry-run", action="store_true", help="Print which stages would run, and why.")
+    parser.add_argument("--fused", action="store_true", help="Build master ids & relationships in one pass over the wiki file, without a wiki reduced file.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to extract titles and links.")
+    parser.add_argument("--engine", choices=["lines", "mmap"], default="lines")
+    parser.add_argument("--memory-budget", type=int, default=None, help="Assign IDs and relationships out of core, holding about this many bytes in memory.")
+    parser.add_argument("--temp-dir", default=None)
+    parser.add_argument("--canonical", action="store_true", help="Canonical titles with redirects resolved. Not with --fused.")
+    parser.add_argument("--namespaces", default=None, help="Comma separated namespaces to keep. Default: all.")
+    parser.add_argument("--resume", action="store_true", help="Carry on from the checkpoints of the wiki reduced file & relationships file.")
+    parser.add_argument("--neo4j-uri", default="bolt://localhost")
+    parser.add_argument("--neo4j-user", default="neo4j")
+    parser.add_argument("--neo4j-password", default=os.environ.get("NEO4J_PASSWORD", "mysillypassword"), help="Default: $NEO4J_PASSWORD.")
+    parser.add_argument("--metrics-jsonl", default=None, help="Append the progress metrics of every stage to this file as JSON lines.")
+    parser.add_argument("--metrics-prometheus", default=None, help="Prometheus textfile of the progress metrics, one [file].[stage].prom per stage.")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    parser.add_argument("--profile", action="store_true", help="Also time the read, parse, normalize & write phases of every stage.")
+    args = parser.parse_args()
+
+    WIKI_LINK_METRICS.Configure(args.metrics_jsonl, args.metrics_prometheus, args.profile, args.metrics_interval)
+    files = {'wiki_file': args.wiki_file, 'wiki_index_file': args.wiki_index_file, 'wiki_reduced_file': args.wiki_reduced_file,
+             'master_ids_file': args.master_ids_file, 'relationships_file': args.relationships_file, 'node_strength_file': args.node_strength_file or Master_IDs_Sibling(args.master_ids_file, '_strength'),
+             'csr_prefix': args.csr_prefix or WIKI_LINK_STREAMS.Split_Extension(args.relationships_file)[0] + '.csr', 'pagerank_file': args.pagerank_file or Master_IDs_Sibling(args.master_ids_file, '_pagerank'),
+             'components_file': args.components_file or Master_IDs_Sibling(args.master_ids_file, '_components')}
+    options = {'fused': args.fused, 'workers': args.workers, 'engine': args.engine, 'memory_budget': args.memory_budget, 'temp_dir': args.temp_dir,
+               'canonical': args.canonical, 'namespaces': args.namespaces.split(',') if args.namespaces else None, 'resume': args.resume,
+               'neo4j_uri': args.neo4j_uri, 'neo4j_user': args.neo4j_user, 'neo4j_password': args.neo4j_password}
+    sys.exit(0 if Run(args.targets, files, options, args.manifest_file, args.jobs, args.force, args.dry_run) else 1)
@@ -0,0 +1,76 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import os
+import time
+
+import WIKI_LINK_STREAMS
+
+# Redirect resolution for a wiki_reduced_file extracted with canonical titles (see WIKI_LINK_PARSE.Canonical_Title).
+# A redirect page is a 'T' record followed by an 'R' record holding its target. Resolve_Redirects rewrites the
+# wiki_reduced_file so that every link points at the article at the end of its redirect chain, and drops the redirect
+# pages themselves (with their links and 'R' records), before Save_Node_IDs assigns the IDs.
+# A title with a redirect page is a redirect: the target of its first redirect page is used, and all its pages are dropped.
+
+def Load_Redirects(wiki_reduced_file):
+    # Returns {redirect title: target title} of the 'R' records.
+    redirects = {}
+    current_page = None
+    with WIKI_LINK_STREAMS.Open_File(wiki_reduced_file, 'rb') as read_stream:
+        for line in read_stream:
+            if b'T' == line[:1]:
+                current_page = line[2:-1]
+            elif b'R' == line[:1] and current_page is not None:
+                if current_page not in redirects:
+                    redirects[current_page] = line[2:-1]
+    return redirects
+
+def Resolve_Title(redirects, title):
+    # Follow the redirects from title to its article. Every redirect on the way is pointed straight at the article
+    # (path compression), so long chains are only walked once. A redirect loop resolves to the title it closes on.
+    path = []
+    seen = set()
+    while title in redirects and title not in seen:
+        seen.add(title)
+        path.append(title)
+        title = redirects[title]
+    for redirect in path:
+        redirects[redirect] = title
+    return title
+
+def Resolve_Redirects(wiki_reduced_file, print_batch=177000):
+    print("Resolving Redirects...\n")
+    start_time = time.time()
+
+    print("\tLoading redirects...\n")
+    redirects = Load_Redirects(wiki_reduced_file)
+    print("\tRedirects: {}\n".format(len(redirects)))
+
+    print("\tRewriting links...\n")
+    page_number = 0
+    redirect_number = 0
+    link_number = 0
+    in_redirect = False
+    temp_file = wiki_reduced_file + '.tmp'
+    with WIKI_LINK_STREAMS.Open_File(wiki_reduced_file, 'rb') as read_stream:
+        with WIKI_LINK_STREAMS.Open_File(temp_file, 'wb', WIKI_LINK_STREAMS.Compression(wiki_reduced_file) or '') as save_stream:
+            for line in read_stream:
+                if b'T' == line[:1]:
+                    in_redirect = line[2:-1] in redirects
+                    if in_redirect:
+                        redirect_number += 1
+                    else:
+                        save_stream.write(line)
+                    page_number += 1
+                    if page_number % print_batch == 0:
+                        print("\tPage: {}\tRedirect pages: {}\tLinks resolved: {}".format(page_number, redirect_number, link_number))
+                elif in_redirect or b'R' == line[:1]:
+                    continue
+                elif b'L' == line[:1] and line[2:-1] in redirects:
+                    save_stream.write(b'L\t' + Resolve_Title(redirects, line[2:-1]) + b'\n')
+                    link_number += 1
+                else:
+                    save_stream.write(line)
+    os.replace(temp_file, wiki_reduced_file)
+    print("\tPages: {}\tRedirect pages dropped: {}\tLinks resolved: {}\n".format(page_number, redirect_number, link_number))
+    print("Redirects Resolved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
@@ -0,0 +1,207 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import json
+import sys
+import time
+import urllib.parse
+
+import WIKI_LINK_ANALYTICS
+import WIKI_LINK_TITLES
+
+# Local HTTP query service over the pipeline outputs, without neo4j. Everything is served from memory mapped files:
+# the title table of the master ids file (WIKI_LINK_TITLES.Map_Master_IDs) and the CSR graph with its reverse graph
+# (WIKI_LINK_ANALYTICS.GRAPH), so startup doesn't read the tsv files, only the pages that are used are read.
+#   GET /id?title=Anarchism                  {"Anarchism": 12}             null for a title that isn't a node
+#   GET /title?id=12                         {"12": "Anarchism"}           null for an id that isn't a node
+#   GET /outlinks?title=Anarchism&limit=10   {"Anarchism": [[title, id, strength], ...]}   links in file order
+#   GET /inlinks?id=12&offset=1000           {"12": [[title, id, strength], ...]}
+#   GET /path?from=Anarchism&to=Hierarchy    {"path": [titles]}            null if there is no path
+# Repeating a parameter is a batch lookup (/id?title=A&title=B). POST takes the same parameters form encoded in its
+# body (at most MAX_BODY_SIZE bytes, a bigger body is answered 413 and the connection closed), for batches too long
+# for a url. Responses are JSON, HTTP/1.1 connections are kept alive.
+# Links are answered limit (default LINKS_LIMIT, at most MAX_LINKS_LIMIT) at a time from offset, only that slice of the
+# CSR range is read. The titles of the most recently answered nodes are kept in an LRU cache of cache_size titles.
+# Paths are searched in a pool of path_workers threads, so other requests are still answered meanwhile and no more
+# than path_workers searches hold memory at once.
+
+LINKS_LIMIT = 1000
+MAX_LINKS_LIMIT = 100000
+MAX_BODY_SIZE = 16 * 1024 * 1024
+STATUS_TEXT = {200: b'OK', 400: b'Bad Request', 404: b'Not Found', 405: b'Method Not Allowed', 413: b'Payload Too Large', 500: b'Internal Server Error'}
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+class QUERY_SERVICE(object):
+
+    def __init__(self, csr_prefix, master_ids_file, cache_size=65536, path_workers=2):
+        self.titles = WIKI_LINK_TITLES.Map_Master_IDs(master_ids_file)
+        self.graph = WIKI_LINK_ANALYTICS.GRAPH(csr_prefix)
+        if len(self.titles) != self.graph.node_count:
+            panic("{} has {} titles, the CSR graph has {} nodes".format(master_ids_file, len(self.titles), self.graph.node_count))
+        self.graph.titles = self.titles
+        self.routes = {'/id': self.IDs, '/title': self.Titles, '/outlinks': self.Outlinks, '/inlinks': self.Inlinks}
+        self.Title = functools.lru_cache(maxsize=cache_size)(self._Title)
+        self.path_executor = concurrent.futures.ThreadPoolExecutor(max_workers=path_workers)
+
+    def Node_ID(self, title):
+        return self.titles.Find(title.encode('utf-8'))
+
+    def _Title(self, node_id):
+        return self.titles.Title(node_id).decode('utf-8')
+
+    def Parse_ID(self, value):
+        # The node id of an id parameter, or -1 if it isn't a node.
+        try:
+            node_id = int(value)
+        except ValueError:
+            raise ValueError("Not an id: {}".format(value))
+        return node_id if 0 <= node_id < self.graph.node_count else -1
+
+    def Parse_Count(self, params, key, default, most=None):
+        try:
+            count = int(params[key][-1]) if key in params else default
+        except ValueError:
+            raise ValueError("Not a number: {}={}".format(key, params[key][-1]))
+        if count < 0 or (most is not None and count > most):
+            raise ValueError("{} must be from 0 to {}".format(key, most if most is not None else "any"))
+        return count
+
+    def IDs(self, params):
+        result = {}
+        for title in params.get('title', []):
+            node_id = self.Node_ID(title)
+            result[title] = node_id if node_id >= 0 else None
+        return result
+
+    def Titles(self, params):
+        result = {}
+        for value in params.get('id', []):
+            node_id = self.Parse_ID(value)
+            result[value] = self.Title(node_id) if node_id >= 0 else None
+        return result
+
+    def Links(self, reverse, node_id, offset, limit):
+        # The links of node_id from offset, at most limit of them. Only those are read from the CSR graph.
+        dest, strength = self.graph.graphs[reverse].Neighbors(node_id)
+        dest, strength = dest[offset:offset + limit], strength[offset:offset + limit]
+        return [[self.Title(dest_id), dest_id, dest_strength] for dest_id, dest_strength in zip(dest.tolist(), strength.tolist())]
+
+    def Node_Links(self, params, reverse):
+        # {title or id as asked: [[title, id, strength], ...] or None}
+        limit = self.Parse_Count(params, 'limit', LINKS_LIMIT, MAX_LINKS_LIMIT)
+        offset = self.Parse_Count(params, 'offset', 0)
+        result = {}
+        for key in ('title', 'id'):
+            for value in params.get(key, []):
+                node_id = self.Node_ID(value) if 'title' == key else self.Parse_ID(value)
+                result[value] = self.Links(reverse, node_id, offset, limit) if node_id >= 0 else None
+        return result
+
+    def Outlinks(self, params):
+        return self.Node_Links(params, 0)
+
+    def Inlinks(self, params):
+        return self.Node_Links(params, 1)
+
+    def Path(self, params):
+        if 'from' not in params or 'to' not in params:
+            raise ValueError("path needs a from and a to title.")
+        source_id = self.Node_ID(params['from'][-1])
+        dest_id = self.Node_ID(params['to'][-1])
+        if source_id < 0 or dest_id < 0:
+            return {'path': None}
+        path = self.graph.Shortest_Path(source_id, dest_id)
+        return {'path': None if path is None else [self.Title(node_id) for node_id in path]}
+
+    async def Answer(self, method, target, body):
+        # Returns (status, JSON payload).
+        route, _, query = target.partition('?')
+        if method not in ('GET', 'POST'):
+            return 405, {'error': "Only GET & POST are supported."}
+        if route != '/path' and route not in self.routes:
+            return 404, {'error': "Unknown route: {}".format(route), 'routes': sorted(list(self.routes) + ['/path'])}
+        try:
+            params = urllib.parse.parse_qs(query)
+            if 'POST' == method:
+                for key, values in urllib.parse.parse_qs(body.decode('utf-8')).items():
+                    params.setdefault(key, []).extend(values)
+            if '/path' == route:
+                return 200, await asyncio.get_running_loop().run_in_executor(self.path_executor, self.Path, params)
+            return 200, self.routes[route](params)
+        except ValueError as error:
+            return 400, {'error': str(error)}
+
+    async def Handle_Connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                request = lines[0].split(' ')
+                headers = {}
+                for line in lines[1:]:
+                    key, colon, value = line.partition(':')
+                    if colon:
+                        headers[key.strip().lower()] = value.strip()
+                if 3 != len(request) or not headers.get('content-length', '0').isdigit():
+                    status, result, keep_alive = 400, {'error': "Bad request."}, False
+                elif int(headers.get('content-length', '0')) > MAX_BODY_SIZE:
+                    status, result, keep_alive = 413, {'error': "The body is more than {} bytes.".format(MAX_BODY_SIZE)}, False
+                else:
+                    method, target, version = request
+                    body = b''
+                    if int(headers.get('content-length', '0')) > 0:
+                        body = await reader.readexactly(int(headers['content-length']))
+                    keep_alive = 'HTTP/1.1' == version and 'close' != headers.get('connection', '').lower()
+                    try:
+                        status, result = await self.Answer(method, target, body)
+                    except Exception as error:
+                        status, result = 500, {'error': repr(error)}
+                payload = json.dumps(result, ensure_ascii=False).encode('utf-8')
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: %d\r\n%s\r\n" % (status, STATUS_TEXT[status], len(payload), b'' if keep_alive else b'Connection: close\r\n'))
+                writer.write(payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def Run(self, host, port):
+        server = await asyncio.start_server(self.Handle_Connection, host, port)
+        print("Query Service listening on http://{}:{}/ (Ctrl-C to stop)".format(host, port))
+        async with server:
+            await server.serve_forever()
+
+def Serve(csr_prefix, master_ids_file, host="127.0.0.1", port=8474, cache_size=65536, path_workers=2):
+    print("Starting Query Service...\n")
+    start_time = time.time()
+    service = QUERY_SERVICE(csr_prefix, master_ids_file, cache_size, path_workers)
+    print("\tNodes: {}\tLinks: {}\tStartup: {}\n".format(service.graph.node_count, service.graph.link_count, "%.2f" % (time.time() - start_time)))
+    try:
+        asyncio.run(service.Run(host, port))
+    except KeyboardInterrupt:
+        print("\nQuery Service stopped.")
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="HTTP title, link & path lookups on the master ids & CSR graph files.")
+    parser.add_argument("--csr-prefix", default="data/relationships.csr")
+    parser.add_argument("--master-ids-file", default="data/master_ids.tsv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8474)
+    parser.add_argument("--cache-size", type=int, default=65536, help="Titles kept in the LRU cache.")
+    parser.add_argument("--path-workers", type=int, default=2, help="Path searches run at once, more wait their turn.")
+    args = parser.parse_args()
+
+    Serve(args.csr_prefix, args.master_ids_file, args.host, args.port, args.cache_size, args.path_workers)
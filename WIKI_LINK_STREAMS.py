@@ -0,0 +1,90 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import bz2
+import gzip
+import io
+import os
+import sys
+
+import WIKI_LINK_METRICS
+
+# Buffered, optionally compressed streams for the pipeline's tsv files (wiki reduced file, master ids, relationships).
+# The compression is chosen by the file extension:
+#   .gz    gzip
+#   .zst   zstandard, needs python 3.14's compression.zstd or the zstandard package (pip install zstandard)
+#   .bz2   bz2
+# anything else is a plain file. Every stream goes through a BUFFER_SIZE buffer, so the many small line writes of the
+# stages become a few large writes (and compress calls) and the line reads a few large reads.
+# A compressed output can't be truncated back to a checkpoint, so compressed outputs are never resumed (see
+# WIKI_LINK_CHECKPOINT), and a compressed master ids file can't be used by neo4j-admin import unless it is .gz.
+# When profiling (WIKI_LINK_METRICS.Configure), the time spent reading & writing each file is counted in the 'read' &
+# 'write' phases.
+
+BUFFER_SIZE = 8 * 1024 * 1024
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3, 'bz2': 9}
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Compression(file_name):
+    # 'gzip', 'zstd', 'bz2', or None for a plain file.
+    return COMPRESSIONS.get(os.path.splitext(file_name)[1].lower())
+
+def Split_Extension(file_name):
+    # Like os.path.splitext, but a compression extension stays with the file type: ('data/relationships', '.tsv.gz').
+    base, extension = os.path.splitext(file_name)
+    if extension.lower() in COMPRESSIONS:
+        base, file_type = os.path.splitext(base)
+        extension = file_type + extension
+    return base, extension
+
+def Input_Size(file_name):
+    # The size of a plain file, or None for a compressed file, whose offsets are in the decompressed data.
+    return None if Compression(file_name) else os.path.getsize(file_name)
+
+def Open_Zstd(file_name, mode, level):
+    try:
+        from compression import zstd
+        return zstd.open(file_name, mode, level=None if 'r' == mode[0] else level)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        panic("{} is zstandard compressed, which needs the zstandard package: pip install zstandard".format(file_name))
+    if 'r' == mode[0]:
+        return zstandard.ZstdDecompressor().stream_reader(open(file_name, 'rb'), read_across_frames=True, closefd=True)
+    return zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(open(file_name, mode), write_return_read=True, closefd=True)
+
+def Open_File(file_name, mode='rb', compression=None, level=None, buffer_size=BUFFER_SIZE):
+    # mode is 'rb', 'wb' or 'ab', or 'r', 'w' or 'a' for a utf-8 text stream. compression is 'gzip', 'zstd', 'bz2', or
+    # '' for a plain file, by default it is chosen by the extension of file_name. level is the compression level.
+    binary_mode = mode.replace('t', '').replace('b', '') + 'b'
+    if compression is None:
+        compression = Compression(file_name)
+    if not compression:
+        if not WIKI_LINK_METRICS.PROFILE:
+            stream = open(file_name, binary_mode, buffering=buffer_size)
+        else:
+            raw = WIKI_LINK_METRICS.TIMED_RAW(open(file_name, binary_mode, buffering=0), 'read' if 'rb' == binary_mode else 'write')
+            stream = io.BufferedReader(raw, buffer_size) if 'rb' == binary_mode else io.BufferedWriter(raw, buffer_size)
+    else:
+        if compression not in DEFAULT_LEVELS:
+            panic("Unknown compression {} for {}".format(compression, file_name))
+        if level is None:
+            level = DEFAULT_LEVELS[compression]
+        if 'gzip' == compression:
+            raw = gzip.open(file_name, binary_mode, compresslevel=level)
+        elif 'bz2' == compression:
+            raw = bz2.open(file_name, binary_mode, compresslevel=level)
+        else:
+            raw = Open_Zstd(file_name, binary_mode, level)
+        if WIKI_LINK_METRICS.PROFILE:
+            raw = WIKI_LINK_METRICS.TIMED_RAW(raw, 'read' if 'rb' == binary_mode else 'write')
+        stream = io.BufferedReader(raw, buffer_size) if 'rb' == binary_mode else io.BufferedWriter(raw, buffer_size)
+    if 'b' not in mode:
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return stream
@@ -0,0 +1,116 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import io
+import re
+import sys
+import time
+
+import numpy
+
+import WIKI_LINK_STREAMS
+
+# Node degree & strength, aggregated over relationships.tsv with numpy.
+# relationships.tsv is read in blocks of about chunk_size bytes, each parsed into an (n, 3) int64 array and reduced
+# with bincount, so memory is about 4 int64s per node plus a few times chunk_size, however many links there are.
+#   [master_ids]_strength.tsv   title  id  in_degree  out_degree  in_strength  out_strength
+# in/out_degree count the links (relationships.tsv lines) into/out of a node, in/out_strength sum their strengths.
+# A page has a dest once, so these are its distinct links, unless its title has more than one page in the wiki file.
+
+NO_SOURCE_LINES = re.compile(rb'^\t[^\n]*\n', re.MULTILINE)
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Node_Strength_File(master_ids_file):
+    base, extension = WIKI_LINK_STREAMS.Split_Extension(master_ids_file)
+    return base + '_strength' + extension
+
+def Count_Lines(file_name):
+    count = 0
+    with WIKI_LINK_STREAMS.Open_File(file_name, 'rb') as read_stream:
+        while True:
+            data = read_stream.read(16 * 1024 * 1024)
+            if not data:
+                break
+            count += data.count(b'\n')
+    return count
+
+def Parse_Links(block):
+    # (n, 3) int64 array of the 'source\tdest\tstrength\n' lines of block.
+    if b'\t' == block[:1] or b'\n\t' in block: # Links found before the first page have no source.
+        block = NO_SOURCE_LINES.sub(b'', block)
+    if not block.strip():
+        return numpy.zeros((0, 3), dtype=numpy.int64)
+    try:
+        links = numpy.loadtxt(io.BytesIO(block), dtype=numpy.int64, delimiter='\t', comments=None, ndmin=2)
+    except ValueError as error:
+        panic("A relationships line isn't 3 integers ({}), near: {}".format(error, block[:200]))
+    if 3 != links.shape[1]:
+        panic("A relationships line doesn't have 3 columns, near: {}".format(block[:200]))
+    return links
+
+def Iter_Link_Arrays(relationships_file, chunk_size):
+    # Yields the links of each block of about chunk_size bytes of relationships_file, see Parse_Links.
+    pending = b''
+    with WIKI_LINK_STREAMS.Open_File(relationships_file, 'rb') as read_stream:
+        while True:
+            data = read_stream.read(chunk_size)
+            if not data:
+                break
+            pending += data
+            cut = pending.rfind(b'\n') + 1
+            if cut > 0:
+                yield Parse_Links(pending[:cut])
+                pending = pending[cut:]
+    if pending:
+        yield Parse_Links(pending + b'\n')
+
+def Add_Counts(totals, ids, weights=None):
+    # totals[i] += the number (or weights) of i in ids. Only the range of ids in this block is counted, which is narrow
+    # for sources since relationships.tsv is grouped by page.
+    if 0 == len(ids):
+        return
+    low = int(ids.min())
+    counts = numpy.bincount(ids - low, weights=weights)
+    totals[low:low + len(counts)] += counts.astype(numpy.int64)
+
+def Count_Node_Strength(master_ids_file, relationships_file, node_strength_file=None, chunk_size=64 * 1024 * 1024, print_batch=100000000):
+    print("Counting Node Strength...\n")
+    start_time = time.time()
+    node_strength_file = node_strength_file or Node_Strength_File(master_ids_file)
+    node_count = Count_Lines(master_ids_file)
+    in_degree = numpy.zeros(node_count, dtype=numpy.int64)
+    out_degree = numpy.zeros(node_count, dtype=numpy.int64)
+    in_strength = numpy.zeros(node_count, dtype=numpy.int64)
+    out_strength = numpy.zeros(node_count, dtype=numpy.int64)
+
+    print("\tAggregating links of {} nodes...\n".format(node_count))
+    link_number = 0
+    for links in Iter_Link_Arrays(relationships_file, chunk_size):
+        source = links[:, 0]
+        dest = links[:, 1]
+        strength = links[:, 2]
+        if len(links) and max(source.max(), dest.max()) >= node_count:
+            panic("{} has a link to an id that isn't in {}".format(relationships_file, master_ids_file))
+        Add_Counts(in_degree, dest)
+        Add_Counts(out_degree, source)
+        # Strengths are summed in float64 by bincount, exact up to 2**53.
+        Add_Counts(in_strength, dest, strength)
+        Add_Counts(out_strength, source, strength)
+        if (link_number + len(links)) // print_batch > link_number // print_batch:
+            print("\tLink # {}\tTime: {}".format(link_number + len(links), "%.2f" % (time.time() - start_time)))
+        link_number += len(links)
+
+    print("\tSaving {}...\n".format(node_strength_file))
+    columns = numpy.stack((in_degree, out_degree, in_strength, out_strength), axis=1)
+    rows = []
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'rb') as read_stream:
+        with WIKI_LINK_STREAMS.Open_File(node_strength_file, 'wb') as save_stream:
+            for node_id, line in enumerate(read_stream):
+                if node_id % 1000000 == 0: # Rows are turned into python ints a million at a time.
+                    rows = columns[node_id:node_id + 1000000].tolist()
+                save_stream.write(line.split(b'\n')[0] + b"\t%d\t%d\t%d\t%d\n" % tuple(rows[node_id % 1000000]))
+    print("\tLinks: {}\n".format(link_number))
+    print("Node Strength Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
@@ -0,0 +1,256 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import argparse
+import array
+import bz2
+import mmap
+import os
+import re
+import sys
+import time
+
+import WIKI_LINK_NAMESPACES
+import WIKI_LINK_PARSE
+import WIKI_LINK_REDIRECTS
+import WIKI_LINK_STREAMS
+import WIKI_LINK_TITLES
+
+# Master ids & relationships for the k-hop link neighborhood of a few seed pages, for fast development runs.
+# Nodes are the titles within hops links of a seed, and relationships are all the links between them (so the pages of
+# the last hop are read too, for the links back into the neighborhood). IDs are numbered in the order the titles are
+# reached, seeds first. The output files have the same format as Save_Node_IDs & Save_Relationships.
+# Only the pages that are needed are read, found with a page index saved in index_dir (the directory of the output
+# files by default, the wiki file's directory may be read only):
+#   [index_dir]/[wiki file name].pages[.canonical].titles   TITLE_TABLE of the reduced page titles, a title's id is its page number.
+#   [index_dir]/[wiki file name].pages[.canonical].ranges   int64 (start, end) byte range of each page.
+# For a multistream .xml.bz2 the index is made from the multistream index, and a range is the bz2 stream that holds
+# the page. A .bz2 dump without its multistream index can't be read at random, decompress it first.
+# The index is made once (one pass over the wiki file), and again whenever the wiki file is newer.
+# With canonical=True redirect pages are followed to their articles within the same hop, and the links are resolved
+# as WIKI_LINK_REDIRECTS.Resolve_Redirects does: the links of a page to redirects of the same article are one
+# relationship, and a redirect loop is kept as the title it closes on.
+
+TITLE_PATTERN = re.compile(rb'<title>(.*?)</title>')
+
+def panic(data):
+    print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
+    sys.exit()
+
+def Page_Index_Files(wiki_file, index_dir, case=None):
+    prefix = os.path.join(index_dir, os.path.basename(wiki_file)) + '.pages' + ('.canonical' if case is not None else '')
+    return prefix + '.titles', prefix + '.ranges'
+
+def Reduced_Title(xml_title, case=None):
+    # The title of a <title> element as it is in the reduced records, or None if it is filtered out.
+    output = WIKI_LINK_PARSE.Reduce_Lines(['<title>' + xml_title + '</title>\n'], case=case)[0]
+    if not output:
+        return None
+    return output[2:-1]
+
+def Xml_Escape(title):
+    return title.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
+
+def Iter_Page_Ranges(wiki_file, wiki_index_file):
+    # Yields (xml title, start, end) of each page.
+    if wiki_index_file is not None:
+        entries = []
+        offsets = set()
+        open_index = bz2.open if wiki_index_file.endswith('.bz2') else open
+        with open_index(wiki_index_file, 'rb') as index_stream:
+            for line in index_stream:
+                offset, page_id, title = line.split(b'\n')[0].split(b':', 2)
+                entries.append((int(offset), title))
+                offsets.add(int(offset))
+        stream_ends = {}
+        offsets = sorted(offsets) + [os.path.getsize(wiki_file)]
+        for i in range(len(offsets) - 1):
+            stream_ends[offsets[i]] = offsets[i + 1]
+        for offset, title in entries:
+            yield Xml_Escape(title.decode('utf-8')), offset, stream_ends[offset]
+        return
+    with open(wiki_file, 'rb') as file_stream:
+        if 0 == os.fstat(file_stream.fileno()).st_size:
+            return
+        with mmap.mmap(file_stream.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+            pending = None
+            for match in TITLE_PATTERN.finditer(file_map):
+                page = file_map.rfind(b'<page>', 0, match.start())
+                start = file_map.rfind(b'\n', 0, page) + 1
+                if pending is not None:
+                    yield pending[0], pending[1], start
+                pending = (match.group(1).decode('utf-8'), start)
+            if pending is not None:
+                yield pending[0], pending[1], len(file_map)
+
+def Save_Page_Index(wiki_file, index_dir, wiki_index_file=None, case=None, print_batch=1000000):
+    print("Saving Page Index...\n")
+    start_time = time.time()
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    titles_file, ranges_file = Page_Index_Files(wiki_file, index_dir, case)
+    titles = WIKI_LINK_TITLES.TITLE_TABLE()
+    ranges = array.array('q')
+    for xml_title, start, end in Iter_Page_Ranges(wiki_file, wiki_index_file):
+        title = Reduced_Title(xml_title, case)
+        if title is None:
+            continue
+        page_id, new = titles.Add(title.encode('utf-8'))
+        if new: # A title is a page only the first time it is seen.
+            ranges.append(start)
+            ranges.append(end)
+            if len(titles) % print_batch == 0:
+                print("\tPage # {}\tLast Page: {}".format(len(titles), title))
+    titles.Save(titles_file)
+    with open(ranges_file, 'wb') as save_stream:
+        ranges.tofile(save_stream)
+    print("\tPages: {}\n".format(len(titles)))
+    print("Page Index Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Load_Page_Index(wiki_file, index_dir, wiki_index_file=None, case=None):
+    # Returns (TITLE_TABLE of page titles, ranges), saving the index first if it is missing or older than the wiki file.
+    titles_file, ranges_file = Page_Index_Files(wiki_file, index_dir, case)
+    if not all(os.path.isfile(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(wiki_file) for index_file in (titles_file, ranges_file)):
+        Save_Page_Index(wiki_file, index_dir, wiki_index_file, case)
+    titles = WIKI_LINK_TITLES.TITLE_TABLE.Load(titles_file)
+    ranges = array.array('q')
+    with open(ranges_file, 'rb') as read_stream:
+        ranges.fromfile(read_stream, 2 * len(titles))
+    return titles, ranges
+
+def Read_Pages(wiki_file, wiki_index_file, page_index, wanted, options, workers=1):
+    # Returns {title: ({dest title: strength}, redirect target or None)} of the wanted titles that are pages.
+    titles, ranges = page_index
+    wanted_ranges = set()
+    for title in wanted:
+        page_id = titles.Find(title.encode('utf-8'))
+        if page_id >= 0:
+            wanted_ranges.add((ranges[2 * page_id], ranges[2 * page_id + 1]))
+    function = WIKI_LINK_PARSE.Reduce_Range if wiki_index_file is None else WIKI_LINK_PARSE.Reduce_Bz2_Streams
+    tasks = [(function, (wiki_file, start, end), options, end) for start, end in sorted(wanted_ranges)]
+    pages = {}
+    for output, page_count, end in WIKI_LINK_PARSE.Iter_Task_Results(tasks, workers):
+        page = None
+        for kind, title in WIKI_LINK_PARSE.Iter_Reduced_Records([(output,)]):
+            if 'T' == kind:
+                page = title if title in wanted and title not in pages else None
+                if page is not None:
+                    pages[page] = ({}, None)
+            elif page is None:
+                continue
+            elif 'L' == kind:
+                dest_strength = pages[page][0]
+                dest_strength[title] = dest_strength.get(title, 0) + 1
+            elif 'R' == kind:
+                pages[page] = (pages[page][0], title)
+    return pages
+
+def Save_Subgraph(wiki_file, seeds, hops, master_ids_file, relationships_file, wiki_index_file=None, workers=1, engine='lines', canonical=False, namespaces=None, index_dir=None):
+    # seeds are page titles as they are written in the wiki ('Political philosophy').
+    # index_dir is where the page index is kept, the directory of master_ids_file by default.
+    print("Saving {} Hop Subgraph of {} Seeds...\n".format(hops, len(seeds)))
+    start_time = time.time()
+    if wiki_file.endswith('.bz2'):
+        if wiki_index_file is None:
+            wiki_index_file = WIKI_LINK_PARSE.Find_Wiki_Index_File(wiki_file)
+        if wiki_index_file is None:
+            panic("A subgraph needs the uncompressed wiki file, or a multistream .xml.bz2 with its index file.")
+    else:
+        wiki_index_file = None
+    options = {'engine': engine, 'namespaces': namespaces}
+    case = None
+    if canonical:
+        case = options['case'] = WIKI_LINK_NAMESPACES.Read_Title_Case(wiki_file)
+    if index_dir is None:
+        index_dir = os.path.dirname(os.path.abspath(master_ids_file))
+    page_index = Load_Page_Index(wiki_file, index_dir, wiki_index_file, case)
+
+    node_ids = {} # title -> id, in the order titles are reached.
+    page_links = [] # (title, {dest title: strength}) of every page read.
+    redirects = {}
+    frontier = []
+    for seed in seeds:
+        title = Reduced_Title(Xml_Escape(seed), case)
+        if title is None or (namespaces is not None and not namespaces.Included(title)):
+            print("\tSkipping seed: {}".format(seed))
+        elif title not in node_ids:
+            node_ids[title] = len(node_ids)
+            frontier.append(title)
+
+    for hop in range(hops + 1):
+        print("\tHop: {}\tPages to read: {}\tNodes: {}".format(hop, len(frontier), len(node_ids)))
+        next_frontier = []
+        while frontier:
+            pages = Read_Pages(wiki_file, wiki_index_file, page_index, set(frontier), options, workers)
+            targets = []
+            for title in frontier:
+                if title not in pages:
+                    continue
+                dest_strength, target = pages.pop(title)
+                if target is not None and target != title:
+                    # A redirect is replaced by its article, which is read in the same hop.
+                    redirects[title] = target
+                    if target not in node_ids:
+                        node_ids[target] = len(node_ids)
+                        targets.append(target)
+                    continue
+                page_links.append((title, dest_strength))
+                if hop < hops:
+                    for dest in dest_strength:
+                        dest = WIKI_LINK_REDIRECTS.Resolve_Title(redirects, dest)
+                        if dest not in node_ids:
+                            node_ids[dest] = len(node_ids)
+                            next_frontier.append(dest)
+            frontier = targets
+        frontier = next_frontier
+
+    print("\n\tSaving Master IDs & Relationships...\n")
+    titles = WIKI_LINK_TITLES.TITLE_TABLE()
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'wb') as save_stream:
+        for title in node_ids:
+            if title in redirects and WIKI_LINK_REDIRECTS.Resolve_Title(redirects, title) != title:
+                continue
+            title = title.encode('utf-8')
+            title_id = titles.Add(title)[0]
+            save_stream.write(b"%s\t%d\n" % (title, title_id))
+    titles.Save(WIKI_LINK_TITLES.Title_Table_File(master_ids_file))
+    link_number = 0
+    with WIKI_LINK_STREAMS.Open_File(relationships_file, 'wb') as save_stream:
+        for title, dest_strength in page_links:
+            source_id = titles.Find(title.encode('utf-8'))
+            id_strength = {}
+            for dest in dest_strength:
+                dest_id = titles.Find(WIKI_LINK_REDIRECTS.Resolve_Title(redirects, dest).encode('utf-8'))
+                if dest_id >= 0:
+                    id_strength[dest_id] = id_strength.get(dest_id, 0) + dest_strength[dest]
+            for dest_id in id_strength:
+                save_stream.write(b"%d\t%d\t%d\n" % (source_id, dest_id, id_strength[dest_id]))
+                link_number += 1
+    print("\tNodes: {}\tRelationships: {}\n".format(len(titles), link_number))
+    print("Subgraph Saved!\nDuration: {}".format( "%.2f" % (time.time() - start_time)))
+
+def Read_Seeds(seeds_file):
+    # One title per line, blank lines are skipped.
+    with open(seeds_file, 'r', encoding='utf-8') as read_stream:
+        return [line.strip() for line in read_stream if line.strip()]
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Save master ids & relationships for the k-hop link neighborhood of seed pages.")
+    parser.add_argument("wiki_file")
+    parser.add_argument("seeds_file", help="Seed page titles, one per line.")
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument("--master-ids-file", default="data/master_ids.tsv")
+    parser.add_argument("--relationships-file", default="data/relationships.tsv")
+    parser.add_argument("--wiki-index-file", default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--engine", choices=["lines", "mmap"], default="lines")
+    parser.add_argument("--canonical", action="store_true")
+    parser.add_argument("--namespaces", default=None)
+    parser.add_argument("--index-dir", default=None, help="Where the page index is kept, the directory of the master ids file by default.")
+    args = parser.parse_args()
+
+    namespaces = None
+    if args.namespaces:
+        namespaces = WIKI_LINK_NAMESPACES.NAMESPACES(WIKI_LINK_NAMESPACES.Read_Namespaces(args.wiki_file), args.namespaces.split(','))
+    Save_Subgraph(args.wiki_file, Read_Seeds(args.seeds_file), args.hops, args.master_ids_file, args.relationships_file, args.wiki_index_file, args.workers, args.engine, args.canonical, namespaces, args.index_dir)
@@ -0,0 +1,160 @@
+# Written by: Daniel Bowder
+# Github: https://github.com/DotBowder
+
+import array
+import mmap
+import os
+import zlib
+
+import WIKI_LINK_STREAMS
+
+# Compact interned title table, used in place of python dicts of title -> id.
+# Titles are stored back to back as utf-8 in one arena, title i is arena[offsets[i]:offsets[i+1]].
+# slots is an open addressing (linear probing) hash table of int32 title ids, -1 marks an empty slot.
+# The crc32 of each title is kept in hashes so the table can grow without re-hashing the arena,
+# and the table can be saved to disk and loaded back without rebuilding anything, or memory mapped as it is (Map).
+
+TITLE_TABLE_MAGIC = b'WLTITLE1'
+
+def Title_Table_File(master_ids_file):
+    # The saved title table that goes along with a master_ids_file.
+    return master_ids_file + '.titles'
+
+def Load_Master_IDs(master_ids_file):
+    # Load the title table saved next to master_ids_file, or rebuild it from the tsv if it is missing or older.
+    table_file = Title_Table_File(master_ids_file)
+    if os.path.isfile(table_file) and os.path.getmtime(table_file) >= os.path.getmtime(master_ids_file):
+        return TITLE_TABLE.Load(table_file)
+    table = TITLE_TABLE()
+    with WIKI_LINK_STREAMS.Open_File(master_ids_file, 'rb') as read_stream:
+        for line in read_stream:
+            l = line.split(b'\n')[0].split(b'\t')
+            title_id, new = table.Add(l[0])
+            if not new or title_id != int(l[1]):
+                raise ValueError("master ids file is not numbered in order: {}".format(line))
+    return table
+
+def Map_Master_IDs(master_ids_file):
+    # The memory mapped title table of master_ids_file, saved first if it is missing or older.
+    table_file = Title_Table_File(master_ids_file)
+    if not os.path.isfile(table_file) or os.path.getmtime(table_file) < os.path.getmtime(master_ids_file):
+        Load_Master_IDs(master_ids_file).Save(table_file)
+    return TITLE_TABLE.Map(table_file)
+
+class TITLE_TABLE(object):
+
+    def __init__(self, capacity=1 << 16):
+        self.arena = bytearray()
+        self.offsets = array.array('q', [0])
+        self.hashes = array.array('I')
+        self.counts = array.array('q')
+        self.slots = array.array('i', [-1]) * capacity
+        self.mask = capacity - 1
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def Title(self, title_id):
+        return bytes(self.arena[self.offsets[title_id]:self.offsets[title_id + 1]])
+
+    def Find(self, title):
+        # Returns the id of the utf-8 title, or -1 if it is not in the table.
+        slots = self.slots
+        offsets = self.offsets
+        mask = self.mask
+        slot = zlib.crc32(title) & mask
+        while True:
+            title_id = slots[slot]
+            if title_id < 0 or self.arena[offsets[title_id]:offsets[title_id + 1]] == title:
+                return title_id
+            slot = (slot + 1) & mask
+
+    def Add(self, title, count=1):
+        # Returns (id, True) for a new utf-8 title, or (id, False) if it was already in the table.
+        # Every call adds count occurrences of the title.
+        slots = self.slots
+        offsets = self.offsets
+        mask = self.mask
+        title_hash = zlib.crc32(title)
+        slot = title_hash & mask
+        while True:
+            title_id = slots[slot]
+            if title_id < 0:
+                break
+            if self.arena[offsets[title_id]:offsets[title_id + 1]] == title:
+                self.counts[title_id] += count
+                return title_id, False
+            slot = (slot + 1) & mask
+        title_id = len(self.hashes)
+        slots[slot] = title_id
+        self.arena += title
+        offsets.append(len(self.arena))
+        self.hashes.append(title_hash)
+        self.counts.append(count)
+        if title_id * 3 >= len(slots) * 2:
+            self._Grow()
+        return title_id, True
+
+    def _Grow(self):
+        capacity = len(self.slots) * 2
+        mask = capacity - 1
+        slots = array.array('i', [-1]) * capacity
+        for title_id, title_hash in enumerate(self.hashes):
+            slot = title_hash & mask
+            while slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            slots[slot] = title_id
+        self.slots = slots
+        self.mask = mask
+
+    def Save(self, table_file):
+        header = array.array('q', [len(self.hashes), len(self.arena), len(self.slots)])
+        with open(table_file, 'wb') as save_stream:
+            save_stream.write(TITLE_TABLE_MAGIC)
+            header.tofile(save_stream)
+            save_stream.write(self.arena)
+            for values in (self.offsets, self.hashes, self.counts, self.slots):
+                values.tofile(save_stream)
+
+    @classmethod
+    def Load(cls, table_file):
+        table = cls(capacity=1)
+        with open(table_file, 'rb') as read_stream:
+            if read_stream.read(len(TITLE_TABLE_MAGIC)) != TITLE_TABLE_MAGIC:
+                raise ValueError("Not a title table file: {}".format(table_file))
+            header = array.array('q')
+            header.fromfile(read_stream, 3)
+            title_count, arena_size, capacity = header
+            table.arena = bytearray(read_stream.read(arena_size))
+            table.offsets = array.array('q')
+            table.offsets.fromfile(read_stream, title_count + 1)
+            table.hashes = array.array('I')
+            table.hashes.fromfile(read_stream, title_count)
+            table.counts = array.array('q')
+            table.counts.fromfile(read_stream, title_count)
+            table.slots = array.array('i')
+            table.slots.fromfile(read_stream, capacity)
+        table.mask = capacity - 1
+        return table
+
+    @classmethod
+    def Map(cls, table_file):
+        # Like Load, but the arrays are read only views of the memory mapped file: it opens at once whatever its size,
+        # and only the pages that are used are read. A mapped table can't Add.
+        table = cls(capacity=1)
+        with open(table_file, 'rb') as read_stream:
+            table_map = mmap.mmap(read_stream.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(table_map)
+        if view[:len(TITLE_TABLE_MAGIC)] != TITLE_TABLE_MAGIC:
+            raise ValueError("Not a title table file: {}".format(table_file))
+        position = len(TITLE_TABLE_MAGIC) + 24
+        title_count, arena_size, capacity = view[len(TITLE_TABLE_MAGIC):position].cast('q')
+        table.arena = view[position:position + arena_size]
+        position += arena_size
+        for name, code, count in (('offsets', 'q', title_count + 1), ('hashes', 'I', title_count), ('counts', 'q', title_count), ('slots', 'i', capacity)):
+            size = count * array.array(code).itemsize
+            setattr(table, name, view[position:position + size].cast(code))
+            position += size
+        table.mask = capacity - 1
+        table.map = table_map
+        return table
@@ -3,14 +3,37 @@
 
 import WIKI_LINK_PARSE
 import WIKI_LINK_NEOCONNECT
+import WIKI_LINK_GRAPH
+import WIKI_LINK_NAMESPACES
+import WIKI_LINK_SUBGRAPH
+import WIKI_LINK_BULKIMPORT
+import WIKI_LINK_METRICS
+import WIKI_LINK_PIPELINE
+import argparse
 import os, sys
 
 current_directory = os.getcwd() + "/"
 wiki_file = "localdisk/enwiki-20170820-pages-articles.xml"
+wiki_index_file = None
 wiki_reduced_file = "localdisk/wiki_reduced_file.tsv"
 
 master_ids_file = "localdisk/master_ids.tsv"
+node_strength_file = "localdisk/master_ids_strength.tsv"
+pagerank_file = "localdisk/master_ids_pagerank.tsv"
+components_file = "localdisk/master_ids_components.tsv"
 relationships_file = "localdisk/relationships.tsv"
+csr_prefix = "localdisk/relationships.csr"
+bulk_import_dir = "localdisk/bulk_import"
+
+workers = 1
+memory_budget = None
+resume = False
+engine = "lines"
+canonical = False
+namespaces = None
+seeds_file = None
+hops = 2
+port = 8474
 
 def panic(data):
     print("\nPANIC: The program has Quit.\nInfo: {}".format(data))
@@ -233,7 +256,7 @@ def Check_Files():
         print('\tWiki file....\t\texists!\t\t{}'.format(wiki_file))
     else:
         print('\tWiki file does not exist!')
-        print("\tWARNING\tMissing File:\t" + current_directory + wiki_file + "\n\t\tWikipedia Data Dump Torrents\n\t\thttps://meta.wikimedia.org/wiki/Data_dump_torrents\n\t\tenwiki-[date]-pages-articles.xml.bz2")
+        print("\tWARNING\tMissing File:\t" + current_directory + wiki_file + "\n\t\tWikipedia Data Dump Torrents\n\t\thttps://meta.wikimedia.org/wiki/Data_dump_torrents\n\t\tenwiki-[date]-pages-articles.xml.bz2 (or enwiki-[date]-pages-articles-multistream.xml.bz2 with its index)")
     if os.path.isfile(wiki_reduced_file):
         print('\tWiki Reduced file....\texists!\t\t{}'.format(wiki_reduced_file))
     else:
@@ -242,7 +265,7 @@ def Check_Files():
             print("")
             user_input = input('Would you like to generate a wiki reduced file by extracting titles and links from the wiki data file?\nEnter (y/n): ')
             if "y" == user_input:
-                WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file)
+                WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file, workers=workers, wiki_index_file=wiki_index_file, resume=resume, engine=engine, canonical=canonical, namespaces=namespaces)
                 print("Created Master IDs file!")
             elif "n" == user_input:
                 pass
@@ -260,7 +283,7 @@ def Check_Files():
             print("")
             user_input = input('Would you like to generate a master ids file by extracting titles and links from the reduced wiki data file?\nEnter (y/n): ')
             if "y" == user_input:
-                WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file)
+                WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file, memory_budget=memory_budget)
                 print("Created Master IDs file!")
             elif "n" == user_input:
                 pass
@@ -280,7 +303,7 @@ def Check_Files():
             print("")
             user_input = input('Would you like to generate a Relationships file by extracting titles and links from the reduced wiki data file?\nEnter (y/n): ')
             if "y" == user_input:
-                WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file)
+                WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, memory_budget=memory_budget, resume=resume)
                 print("Created Relationships file!")
             elif "n" == user_input:
                 pass
@@ -297,41 +320,77 @@ def Overwrite_Files():
     print("1. Wiki Reduced File     (must re-generate master_ids & relationships if this file is changed)")
     print("2. Master IDs File       (must re-generate relationships if this file is changed)")
     print("3. Relationships File    (this is the file file to be generated before neo4j import)")
+    print("4. Master IDs & Relationships Files in one pass over the wiki file (no wiki reduced file)")
+    print("5. CSR Graph Files       (binary copy of the relationships file, memory-mappable)")
+    print("6. Namespace Partitions  (relationships file split by source & destination namespace)")
+    print("7. Seeded Subgraph       (master ids & relationships of the --hops neighborhood of the --seeds-file pages only)")
+    print("8. Node Strength File    (master ids with in/out degree & strength columns, needs numpy)")
+    print("9. Analytics Files       (master ids with PageRank, and weak & strong component columns, needs numpy & the CSR graph)")
     print("n. -- Go Back!")
     print("h. -- Help")
-    user_input = input("Please Enerter (1/2/3/h): ")
+    user_input = input("Please Enerter (1/2/3/4/5/6/7/8/9/h): ")
     print("")
     if 'h' == user_input:
         Print_Help()
     elif 'n' == user_input:
         pass
+    elif '9' == user_input:
+        import WIKI_LINK_ANALYTICS # Needs numpy.
+        WIKI_LINK_ANALYTICS.Save_PageRank(csr_prefix, master_ids_file, pagerank_file, workers=workers)
+        WIKI_LINK_ANALYTICS.Save_Components(csr_prefix, master_ids_file, components_file)
+    elif '8' == user_input:
+        WIKI_LINK_PARSE.Count_Node_Strength(master_ids_file, relationships_file, node_strength_file)
+    elif '7' == user_input and seeds_file is None:
+        print("Start with --seeds-file (one page title per line) to save a seeded subgraph.")
+    elif '7' == user_input:
+        WIKI_LINK_SUBGRAPH.Save_Subgraph(wiki_file, WIKI_LINK_SUBGRAPH.Read_Seeds(seeds_file), hops, master_ids_file, relationships_file, wiki_index_file, workers, engine, canonical, namespaces)
+    elif '6' == user_input:
+        WIKI_LINK_NAMESPACES.Partition_Relationships(master_ids_file, relationships_file, namespaces or WIKI_LINK_NAMESPACES.NAMESPACES(WIKI_LINK_NAMESPACES.Read_Namespaces(wiki_file)))
+    elif '5' == user_input:
+        WIKI_LINK_GRAPH.Save_CSR_Graph(master_ids_file, relationships_file, csr_prefix)
+    elif '4' == user_input and canonical:
+        print("Redirects are resolved on the wiki reduced file, use options 1 - 3 for canonical titles.")
+    elif '4' == user_input:
+        WIKI_LINK_PARSE.Save_Fused(wiki_file, master_ids_file, relationships_file, workers=workers, wiki_index_file=wiki_index_file, engine=engine, namespaces=namespaces)
     elif '3' == user_input:
-        WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file)
+        WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, memory_budget=memory_budget, resume=resume)
     elif '2' == user_input:
-        WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file)
+        WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file, memory_budget=memory_budget)
     elif '1' == user_input:
-        WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file)
+        WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file, workers=workers, wiki_index_file=wiki_index_file, resume=resume, engine=engine, canonical=canonical, namespaces=namespaces)
 
 
 def Transmit_Data(hostname="bolt://localhost", username="neo4j", password="mysillypassword"): # Don't use a password like that....
-    neo = WIKI_LINK_NEOCONNECT.NEO4J_CONNECT(hostname, username, password)
-    neo.Setup_Constraints()
-
     print("What data would you like to submit?")
     print("1. Nodes")
     print("2. Relationships")
+    print("3. Write neo4j-admin bulk import files (offline import into a fresh database)")
+    print("4. Write neo4j-admin bulk import files, and run neo4j-admin import (neo4j must be stopped)")
+    print("5. Constraints only (after a neo4j-admin import)")
     print("h. -- Help")
-    user_input = input("Please Enerter (1/2/h): ")
+    user_input = input("Please Enerter (1/2/3/4/5/h): ")
     print("")
     if 'h' == user_input:
         Print_Help()
-    elif '2' == user_input:
-        print("Code not yet implimented. See Changelog.")
-        # neo.Create_Relationships()
-    elif '1' == user_input:
-        print("Code not yet implimented. See Changelog.")
-        # neo.Create_Nodes()
-    neo.Close()
+    elif '3' == user_input or '4' == user_input:
+        # Nodes get their degree & strength properties when the node strength file has been saved.
+        strength_file = node_strength_file if os.path.isfile(node_strength_file) else None
+        WIKI_LINK_BULKIMPORT.Export_Bulk_Import(master_ids_file, relationships_file, bulk_import_dir, node_strength_file=strength_file)
+        if '4' == user_input:
+            WIKI_LINK_BULKIMPORT.Run_Bulk_Import(master_ids_file, bulk_import_dir, node_strength_file=strength_file)
+            print("Start neo4j, then create the constraints (5. Constraints only) or run:\n\t{};".format(";\n\t".join(WIKI_LINK_NEOCONNECT.CONSTRAINT_QUERIES)))
+        else:
+            print("Import with:\n\t{}".format(" ".join(WIKI_LINK_BULKIMPORT.Bulk_Import_Command(master_ids_file, bulk_import_dir, node_strength_file=strength_file))))
+    elif '5' == user_input or '2' == user_input or '1' == user_input:
+        neo = WIKI_LINK_NEOCONNECT.NEO4J_CONNECT(hostname, username, password)
+        neo.Setup_Constraints()
+        if '5' == user_input:
+            print("Constraints Created!")
+        elif '1' == user_input:
+            neo.Load_Nodes(master_ids_file)
+        else:
+            neo.Load_Relationships(relationships_file)
+        neo.Close()
 
 
 def Root_Menu():
@@ -340,11 +399,19 @@ def Root_Menu():
     print("1. Check that my neo4j tsv files have been generated.")
     print("2. Overwrite an existing tsv file with a new replacement.")
     print("3. Send tsv file data to neo4j server.")
+    print("4. Degrees of separation between two titles (shortest path of links, needs numpy & the CSR graph).")
+    print("5. Start the HTTP query service (title/id lookups, links & paths, needs numpy & the CSR graph).")
     print("h. -- Help")
-    user_input = input("Please Enerter (1/2/3/h): ")
+    user_input = input("Please Enerter (1/2/3/4/5/h): ")
     print("")
     if 'h' == user_input:
         Print_Help()
+    elif '5' == user_input:
+        import WIKI_LINK_SERVICE # Needs numpy.
+        WIKI_LINK_SERVICE.Serve(csr_prefix, master_ids_file, port=port)
+    elif '4' == user_input:
+        import WIKI_LINK_ANALYTICS # Needs numpy.
+        WIKI_LINK_ANALYTICS.Print_Shortest_Path(csr_prefix, master_ids_file, input("From title: "), input("To title: "))
     elif '3' == user_input:
         Transmit_Data(hostname="bolt://localhost", username="neo4j", password="mysillypassword")
     elif '2' == user_input:
@@ -353,6 +420,60 @@ def Root_Menu():
         Check_Files()
 
 
+parser = argparse.ArgumentParser(description="Wiki Link neo4j data import tool.")
+parser.add_argument("--wiki-file", default=wiki_file, help="The pages-articles .xml wiki file, or the .xml.bz2 file as downloaded.")
+parser.add_argument("--wiki-index-file", default=None, help="Index of a pages-articles-multistream.xml.bz2 wiki file. Found automatically when it sits next to the wiki file.")
+parser.add_argument("--workers", type=int, default=1, help="Number of processes used to extract titles and links from the wiki file.")
+parser.add_argument("--memory-budget", type=int, default=None, help="Build the master ids & relationships files out of core, holding about this many bytes in memory.")
+parser.add_argument("--engine", choices=["lines", "mmap"], default="lines", help="Extraction engine. mmap scans raw bytes, with the same output: about 2.5x faster on full length articles, no faster on very short pages.")
+parser.add_argument("--canonical", action="store_true", help="Extract canonical titles (first letter case, no #anchors) and resolve redirects to their articles.")
+parser.add_argument("--namespaces", default=None, help="Comma separated namespaces (names or keys of the wiki file's <namespaces>, 'article', 'interwiki') to extract. Default: all.")
+parser.add_argument("--seeds-file", default=None, help="Seed page titles (one per line) for a seeded subgraph, instead of the full dump.")
+parser.add_argument("--hops", type=int, default=2, help="Link hops around the seeds of --seeds-file.")
+parser.add_argument("--compress", choices=["gz", "zst", "bz2"], default=None, help="Write (and read) the wiki reduced, master ids & relationships files compressed, see WIKI_LINK_STREAMS.")
+parser.add_argument("--port", type=int, default=8474, help="Port of the HTTP query service.")
+parser.add_argument("--serve", action="store_true", help="Start the HTTP query service on the master ids & CSR graph files, without the menus.")
+parser.add_argument("--resume", action="store_true", help="Carry on from the last checkpoint when (re)generating the wiki reduced file or relationships file.")
+parser.add_argument("--run", nargs="+", default=None, metavar="STAGE", help="Build these stages (reduce, node_ids, relationships, fused, strength, csr, analytics, neo4j) without the menus, only rerunning stale ones, see WIKI_LINK_PIPELINE.")
+parser.add_argument("--jobs", type=int, default=2, help="Stages run at once with --run.")
+parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Stages to rerun with --run even if they are fresh, 'all' for every stage.")
+parser.add_argument("--dry-run", action="store_true", help="Print the stages --run would run, and why.")
+parser.add_argument("--fused", action="store_true", help="With --run, build master ids & relationships in one pass over the wiki file.")
+parser.add_argument("--metrics-jsonl", default=None, help="Append the progress metrics of every stage (and neo4j load) to this file as JSON lines.")
+parser.add_argument("--metrics-prometheus", default=None, help="Keep the latest progress metrics of every stage in this Prometheus textfile (.prom).")
+parser.add_argument("--metrics-interval", type=float, default=10.0, help="Seconds between metrics written to --metrics-jsonl & --metrics-prometheus.")
+parser.add_argument("--profile", action="store_true", help="Also time the read, parse, normalize & write phases of every stage.")
+args = parser.parse_args()
+WIKI_LINK_METRICS.Configure(args.metrics_jsonl, args.metrics_prometheus, args.profile, args.metrics_interval)
+wiki_file = args.wiki_file
+wiki_index_file = args.wiki_index_file
+workers = args.workers
+memory_budget = args.memory_budget
+resume = args.resume
+engine = args.engine
+canonical = args.canonical
+seeds_file = args.seeds_file
+hops = args.hops
+port = args.port
+if args.compress:
+    wiki_reduced_file, master_ids_file, relationships_file, node_strength_file, pagerank_file, components_file = [file_name + '.' + args.compress for file_name in (wiki_reduced_file, master_ids_file, relationships_file, node_strength_file, pagerank_file, components_file)]
+if args.namespaces:
+    namespaces = WIKI_LINK_NAMESPACES.NAMESPACES(WIKI_LINK_NAMESPACES.Read_Namespaces(wiki_file), args.namespaces.split(','))
+
+if args.run:
+    pipeline_files = {'wiki_file': wiki_file, 'wiki_index_file': wiki_index_file, 'wiki_reduced_file': wiki_reduced_file, 'master_ids_file': master_ids_file,
+                      'relationships_file': relationships_file, 'node_strength_file': node_strength_file, 'csr_prefix': csr_prefix,
+                      'pagerank_file': pagerank_file, 'components_file': components_file}
+    pipeline_options = {'fused': args.fused, 'workers': workers, 'engine': engine, 'memory_budget': memory_budget, 'temp_dir': None, 'canonical': canonical,
+                        'namespaces': args.namespaces.split(',') if args.namespaces else None, 'resume': resume,
+                        'neo4j_uri': "bolt://localhost", 'neo4j_user': "neo4j", 'neo4j_password': os.environ.get("NEO4J_PASSWORD", "mysillypassword")}
+    sys.exit(0 if WIKI_LINK_PIPELINE.Run(args.run, pipeline_files, pipeline_options, jobs=args.jobs, force=args.force, dry_run=args.dry_run) else 1)
+
+if args.serve:
+    import WIKI_LINK_SERVICE # Needs numpy.
+    WIKI_LINK_SERVICE.Serve(csr_prefix, master_ids_file, port=port)
+    sys.exit()
+
 Print_Program_Info()
 Print_Licence()
 while True:
@@ -0,0 +1,26 @@
+# WIKI_LINK_BENCHMARK.Run_Stage: a stage runs in its own spawned process and its result comes back through a queue,
+# even when the result (the tail of a failed stage's output) is bigger than the pipe buffer.
+
+import pytest
+
+import WIKI_LINK_BENCHMARK
+
+def Quiet_Stage(value):
+    print("Stage output {}".format(value))
+
+def Failing_Stage(size):
+    for number in range(40):
+        print("x" * size)
+    WIKI_LINK_BENCHMARK.panic("stage failed")
+
+def test_run_stage():
+    result = WIKI_LINK_BENCHMARK.Run_Stage(Quiet_Stage, (1,), {})
+    assert result['seconds'] >= 0
+    assert result['peak_rss_mb'] > 0
+
+def test_run_stage_large_result(capsys):
+    with pytest.raises(SystemExit):
+        WIKI_LINK_BENCHMARK.Run_Stage(Failing_Stage, (64 * 1024,), {}, timeout=5.0)
+    output = capsys.readouterr().out
+    assert "Stage Failing_Stage failed:" in output
+    assert "stage failed" in output
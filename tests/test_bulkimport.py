@@ -0,0 +1,38 @@
+# WIKI_LINK_BULKIMPORT: the neo4j-admin import files and command. The files are read back the way neo4j-admin import
+# reads them (tab delimited, with the command's quote character), so titles holding '"' must come back as they are.
+# Repeated sources, back to back or not, keep the strength of the first run of each link.
+
+import csv
+import os
+
+import WIKI_LINK_BULKIMPORT
+
+MASTER_IDS = ['Paris\t0', 'Say_"Hello"\t1', '"Quoted"\t2', 'Tab"\t3', 'Rome\t4']
+RELATIONSHIPS = ['\t4\t1', '0\t1\t2', '0\t2\t1', '1\t0\t1', '1\t3\t1', '1\t0\t5', '1\t4\t1', '2\t0\t1', '0\t2\t7', '0\t4\t1', '3\t3\t1']
+
+def Write_Lines(file_name, lines):
+    with open(file_name, 'w') as save_stream:
+        save_stream.write(''.join(line + '\n' for line in lines))
+
+def Read_Import_File(command, file_name):
+    # The fields as neo4j-admin import reads them.
+    quote = [argument for argument in command if argument.startswith('--quote=')][0].split('=', 1)[1]
+    with open(file_name, newline='') as read_stream:
+        return list(csv.reader(read_stream, delimiter='\t', quotechar=quote))
+
+def test_bulk_import(tmp_path):
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    Write_Lines(master_ids_file, MASTER_IDS)
+    Write_Lines(relationships_file, RELATIONSHIPS)
+    export_dir = str(tmp_path / 'bulk_import')
+    WIKI_LINK_BULKIMPORT.Export_Bulk_Import(master_ids_file, relationships_file, export_dir)
+    command = WIKI_LINK_BULKIMPORT.Bulk_Import_Command(master_ids_file, export_dir)
+    nodes_header_file, relationships_header_file, export_relationships_file = WIKI_LINK_BULKIMPORT.Bulk_Import_Files(export_dir)
+    assert '--nodes:Article={},{}'.format(os.path.abspath(nodes_header_file), os.path.abspath(master_ids_file)) in command
+    assert Read_Import_File(command, nodes_header_file) == [['name', 'id:ID(Article)']]
+    assert Read_Import_File(command, master_ids_file) == [line.split('\t') for line in MASTER_IDS]
+    assert Read_Import_File(command, relationships_header_file) == [[':START_ID(Article)', ':END_ID(Article)', 'strength:int']]
+    # 1 has two runs back to back, 0 has two runs apart. 1 -> 0 & 0 -> 2 keep their first strength.
+    assert Read_Import_File(command, export_relationships_file) == [line.split('\t') for line in
+        ['0\t1\t2', '0\t2\t1', '1\t0\t1', '1\t3\t1', '1\t4\t1', '2\t0\t1', '0\t4\t1', '3\t3\t1']]
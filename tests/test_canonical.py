@@ -0,0 +1,96 @@
+# Canonical titles (WIKI_LINK_PARSE.Canonical_Title) and redirect resolution (WIKI_LINK_REDIRECTS) against a small
+# hand written dump. tests/golden/canonical.xml has a redirect chain (Big Apple -> New york -> New York City), a redirect
+# loop (Loop a <-> Loop b), a redirect to an #anchor, a case-sensitive namespace, namespace aliases, interwiki links
+# and &amp; escaped titles. canonical_reduced.tsv, canonical_master_ids.tsv & canonical_relationships.tsv were checked
+# by hand. Both engines, with one and more workers, must give the same bytes.
+
+import os
+
+import pytest
+
+import WIKI_LINK_NAMESPACES
+import WIKI_LINK_PARSE
+import WIKI_LINK_REDIRECTS
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+CHUNK_SIZE = 1024 # A few pages per chunk, so redirect chains span chunks.
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+@pytest.fixture(scope='module')
+def case():
+    return WIKI_LINK_NAMESPACES.Read_Title_Case(os.path.join(GOLDEN_DIR, 'canonical.xml'))
+
+def test_read_title_case(case):
+    assert case.case == 'first-letter'
+    assert case.prefixes['gadget'] == ('Gadget', 'case-sensitive')
+    assert case.prefixes['image'] == case.prefixes['file'] == ('File', 'first-letter')
+    assert case.prefixes['wp'] == case.prefixes['project'] == ('Wikipedia', 'first-letter')
+    assert 'image_talk' not in case.prefixes # No File talk namespace in this wiki.
+
+@pytest.mark.parametrize('title, canonical', [
+    ('paris', 'Paris'),
+    ('Paris#History', 'Paris'),
+    ('_Political__philosophy_', 'Political_philosophy'),
+    ('#History', ''),
+    ('élan', 'Élan'),
+    ('ßtraße', 'ßtraße'), # No single letter upper case.
+    ('category:capital_cities', 'Category:Capital_cities'),
+    (':Category:_cities', 'Category:Cities'),
+    ('CATEGORY_:cities', 'Category:Cities'),
+    ('image:tower.jpg', 'File:Tower.jpg'),
+    ('WP:NPOV', 'Wikipedia:NPOV'),
+    ('gadget:lower_case', 'Gadget:lower_case'), # Case-sensitive namespace.
+    ('fr:paris', 'fr:paris'),
+    (':fr:paris', ':fr:paris'),
+    ('wikt:word#Noun', 'wikt:word'),
+    ('re:zero', 'Re:zero'), # Not a namespace.
+    ('at&t', 'At&t'),
+])
+def test_canonical_title(case, title, canonical):
+    assert WIKI_LINK_PARSE.Canonical_Title(title, case) == canonical
+
+def test_case_sensitive_wiki():
+    case = WIKI_LINK_NAMESPACES.TITLE_CASE('case-sensitive', {'category': ('Category', 'first-letter')})
+    assert WIKI_LINK_PARSE.Canonical_Title('paris#History', case) == 'paris'
+    assert WIKI_LINK_PARSE.Canonical_Title('category:cities', case) == 'Category:Cities'
+
+def test_resolve_title():
+    redirects = {b'A': b'B', b'B': b'C', b'C': b'D', b'X': b'Y', b'Y': b'X'}
+    assert WIKI_LINK_REDIRECTS.Resolve_Title(redirects, b'A') == b'D'
+    assert redirects[b'A'] == redirects[b'B'] == redirects[b'C'] == b'D' # Path compression.
+    assert WIKI_LINK_REDIRECTS.Resolve_Title(redirects, b'D') == b'D'
+    assert WIKI_LINK_REDIRECTS.Resolve_Title(redirects, b'X') == b'X' # A loop resolves to the title it closes on.
+    assert WIKI_LINK_REDIRECTS.Resolve_Title(redirects, b'Y') == b'X'
+
+def test_resolve_redirects(tmp_path):
+    wiki_reduced_file = str(tmp_path / 'wiki_reduced.tsv')
+    with open(wiki_reduced_file, 'wb') as save_stream:
+        save_stream.write(b''.join(line + b'\n' for line in [
+            b'L\tA',
+            b'T\tA', b'L\tIgnored', b'R\tB',
+            b'T\tPage', b'L\tA', b'L\tC', b'L\tLoop',
+            b'T\tB', b'R\tC',
+            b'T\tA', b'R\tPage', # Only the first redirect page of a title is followed.
+            b'T\tLoop', b'R\tLoop',
+        ]))
+    WIKI_LINK_REDIRECTS.Resolve_Redirects(wiki_reduced_file)
+    with open(wiki_reduced_file, 'rb') as read_stream:
+        assert read_stream.read().splitlines() == [b'L\tC', b'T\tPage', b'L\tC', b'L\tC', b'L\tLoop']
+    assert not os.path.exists(wiki_reduced_file + '.tmp')
+
+@pytest.mark.parametrize('engine', ['lines', 'mmap'])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_canonical_outputs(tmp_path, monkeypatch, engine, workers):
+    monkeypatch.setattr(WIKI_LINK_PARSE, 'STREAM_BLOCK_SIZE', CHUNK_SIZE)
+    wiki_reduced_file = str(tmp_path / 'wiki_reduced.tsv')
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    WIKI_LINK_PARSE.Reduce_Wiki_Datastore(os.path.join(GOLDEN_DIR, 'canonical.xml'), wiki_reduced_file, workers=workers, chunk_size=CHUNK_SIZE, engine=engine, canonical=True)
+    WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file)
+    WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file)
+    for name, output_file in [('canonical_reduced.tsv', wiki_reduced_file), ('canonical_master_ids.tsv', master_ids_file), ('canonical_relationships.tsv', relationships_file)]:
+        with open(output_file, 'rb') as read_stream:
+            assert read_stream.read() == Golden(name), name
@@ -0,0 +1,81 @@
+# Resuming WIKI_LINK_PARSE stages from their WIKI_LINK_CHECKPOINT. A crash is simulated by a Save_Checkpoint that
+# raises CRASH in place of a later checkpoint, so the output holds what was written after the last checkpoint, which the
+# resumed run must drop. The resumed output must be the same as a run without a crash.
+
+import os
+
+import pytest
+
+import WIKI_LINK_BENCHMARK
+import WIKI_LINK_CHECKPOINT
+import WIKI_LINK_PARSE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+CHUNK_SIZE = 8 * 1024
+
+class CRASH(Exception):
+    pass
+
+def Read_File(file_name):
+    with open(file_name, 'rb') as read_stream:
+        return read_stream.read()
+
+@pytest.fixture
+def crash_after(monkeypatch):
+    # crash_after(count) makes the checkpoint after count checkpoints raise CRASH, once.
+    # Returns the list of the states saved in the checkpoints.
+    def Crash_After(count):
+        save_checkpoint = WIKI_LINK_CHECKPOINT.Save_Checkpoint
+        saved = []
+        def Save_Checkpoint(output_file, save_stream, stage, input_file, **state):
+            if len(saved) == count:
+                saved.append(None)
+                raise CRASH()
+            save_checkpoint(output_file, save_stream, stage, input_file, **state)
+            saved.append(state)
+        monkeypatch.setattr(WIKI_LINK_CHECKPOINT, 'Save_Checkpoint', Save_Checkpoint)
+        return saved
+    return Crash_After
+
+@pytest.mark.parametrize('engine, workers, resume_workers', [
+    ('lines', 1, 1),
+    ('lines', 1, 3),
+    ('lines', 3, 1),
+    ('mmap', 3, 3),
+    ('mmap', 1, 1),
+])
+def test_resume_reduce(tmp_path, monkeypatch, crash_after, engine, workers, resume_workers):
+    monkeypatch.setattr(WIKI_LINK_PARSE, 'STREAM_BLOCK_SIZE', CHUNK_SIZE)
+    wiki_file = os.path.join(GOLDEN_DIR, 'wiki.xml')
+    wiki_reduced_file = str(tmp_path / 'wiki_reduced.tsv')
+    saved = crash_after(3)
+    with pytest.raises(CRASH):
+        WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file, workers=workers, chunk_size=CHUNK_SIZE, checkpoint_interval=0, engine=engine)
+    checkpoint = WIKI_LINK_CHECKPOINT.Load_Checkpoint(wiki_reduced_file, 'reduce', wiki_file)
+    assert checkpoint['page_number'] == saved[2]['page_number']
+    assert os.path.getsize(wiki_reduced_file) > checkpoint['output_offset']
+    WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file, workers=resume_workers, chunk_size=CHUNK_SIZE, resume=True, engine=engine)
+    assert Read_File(wiki_reduced_file) == Read_File(os.path.join(GOLDEN_DIR, 'wiki_reduced.tsv'))
+    assert not os.path.isfile(WIKI_LINK_CHECKPOINT.Checkpoint_File(wiki_reduced_file))
+
+def test_resume_relationships(tmp_path, crash_after):
+    # A checkpoint is saved every 1000 pages at the most, more than the golden dump has.
+    wiki_file = str(tmp_path / 'wiki.xml')
+    wiki_reduced_file = str(tmp_path / 'wiki_reduced.tsv')
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    WIKI_LINK_BENCHMARK.Generate_Wiki_File(wiki_file, pages=3500, links_per_page=3, seed=5)
+    WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_file, wiki_reduced_file)
+    WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file)
+    WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file)
+    relationships = Read_File(relationships_file)
+    os.remove(relationships_file)
+    saved = crash_after(2)
+    with pytest.raises(CRASH):
+        WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, checkpoint_interval=0)
+    checkpoint = WIKI_LINK_CHECKPOINT.Load_Checkpoint(relationships_file, 'relationships', wiki_reduced_file)
+    assert checkpoint['page_number'] == saved[1]['page_number'] == 2000
+    assert os.path.getsize(relationships_file) > checkpoint['output_offset']
+    WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, resume=True)
+    assert Read_File(relationships_file) == relationships
+    assert not os.path.isfile(WIKI_LINK_CHECKPOINT.Checkpoint_File(relationships_file))
@@ -0,0 +1,89 @@
+# WIKI_LINK_DELTA: a baseline run, then an update from a dump with an unchanged, a changed, a removed and a new page.
+# The IDs of the baseline are kept, and the difference files hold exactly the links that were added, removed or changed.
+# The memory budget is small enough for every sort to spill, and the files may be compressed.
+
+import gzip
+import os
+
+import pytest
+
+import WIKI_LINK_DELTA
+
+BASELINE_PAGES = [
+    ('Paris', 'sha1paris', ['London', 'France', 'France']),
+    ('London', 'sha1london', ['Paris']),
+    ('Berlin', 'sha1berlin', ['Paris', 'Germany']),
+    ('Rome', 'sha1rome', ['Italy']),
+]
+UPDATE_PAGES = [
+    ('Paris', 'sha1paris', ['London', 'France', 'France']), # Unchanged.
+    ('London', 'sha1london2', ['Paris', 'Thames', 'Paris']), # Changed: a new link and a new strength.
+    ('Rome', 'sha1rome', ['Italy']), # Unchanged, Berlin is removed.
+    ('Madrid', 'sha1madrid', ['Spain', 'Paris']), # New.
+    ('London', 'sha1london3', ['Nowhere']), # A title that is already a page is ignored.
+]
+
+def Write_Wiki(wiki_file, pages):
+    with open(wiki_file, 'w', encoding='utf-8') as save_stream:
+        save_stream.write('<mediawiki>\n  <siteinfo>\n    <case>first-letter</case>\n  </siteinfo>\n')
+        for title, sha1, links in pages:
+            save_stream.write('  <page>\n    <title>{}</title>\n    <revision>\n'.format(title))
+            save_stream.write('      <text xml:space="preserve">{}</text>\n'.format(' and '.join('[[{}]]'.format(link) for link in links)))
+            save_stream.write('      <sha1>{}</sha1>\n    </revision>\n  </page>\n'.format(sha1))
+        save_stream.write('</mediawiki>\n')
+
+def Read_Lines(file_name):
+    open_file = gzip.open if file_name.endswith('.gz') else open
+    with open_file(file_name, 'rt', encoding='utf-8') as read_stream:
+        return [line.split('\n')[0].split('\t') for line in read_stream]
+
+def Links(pages):
+    # {(source, dest): strength} of the first page of each title.
+    links = {}
+    seen = set()
+    for title, sha1, dests in pages:
+        if title not in seen:
+            seen.add(title)
+            for dest in dests:
+                links[(title, dest)] = links.get((title, dest), 0) + 1
+    return links
+
+def Delta_Links(file_name, names):
+    return [(names[int(source)], names[int(dest)], int(strength)) for source, dest, strength in Read_Lines(file_name)]
+
+def Run(tmp_path, name, pages, extension, previous=None):
+    wiki_file = str(tmp_path / (name + '.xml'))
+    Write_Wiki(wiki_file, pages)
+    output_dir = tmp_path / name
+    output_dir.mkdir()
+    files = [str(output_dir / (file_name + extension)) for file_name in ('master_ids.tsv', 'relationships.tsv', 'page_sha1.tsv')]
+    WIKI_LINK_DELTA.Delta_Update(wiki_file, *(files + (previous or [None, None, None])), memory_budget=64, temp_dir=str(tmp_path / 'temp'))
+    assert os.listdir(str(tmp_path / 'temp')) == []
+    return files
+
+@pytest.mark.parametrize('extension', ['', '.gz'])
+def test_delta_update(tmp_path, extension):
+    baseline = Run(tmp_path, 'baseline', BASELINE_PAGES, extension)
+    master_ids_file, relationships_file, page_sha1_file = baseline
+    baseline_ids = Read_Lines(master_ids_file)
+    assert [int(title_id) for title, title_id in baseline_ids] == list(range(len(baseline_ids)))
+    assert Read_Lines(WIKI_LINK_DELTA.Delta_Files(master_ids_file)[0]) == baseline_ids
+    names = [title for title, title_id in baseline_ids]
+    assert dict(((source, dest), strength) for source, dest, strength in Delta_Links(relationships_file, names)) == Links(BASELINE_PAGES)
+    added_file, removed_file, changed_file = WIKI_LINK_DELTA.Delta_Files(relationships_file)
+    assert sorted(Delta_Links(added_file, names)) == sorted((source, dest, strength) for (source, dest), strength in Links(BASELINE_PAGES).items())
+    assert Read_Lines(removed_file) == Read_Lines(changed_file) == []
+    assert Read_Lines(page_sha1_file) == [[title, sha1] for title, sha1, links in BASELINE_PAGES]
+
+    master_ids_file, relationships_file, page_sha1_file = Run(tmp_path, 'update', UPDATE_PAGES, extension, baseline)
+    update_ids = Read_Lines(master_ids_file)
+    assert update_ids[:len(baseline_ids)] == baseline_ids
+    assert [title for title, title_id in update_ids[len(baseline_ids):]] == ['Thames', 'Madrid', 'Spain']
+    assert Read_Lines(WIKI_LINK_DELTA.Delta_Files(master_ids_file)[0]) == update_ids[len(baseline_ids):]
+    names = [title for title, title_id in update_ids]
+    assert dict(((source, dest), strength) for source, dest, strength in Delta_Links(relationships_file, names)) == Links(UPDATE_PAGES)
+    added_file, removed_file, changed_file = WIKI_LINK_DELTA.Delta_Files(relationships_file)
+    assert Delta_Links(added_file, names) == [('London', 'Thames', 1), ('Madrid', 'Paris', 1), ('Madrid', 'Spain', 1)]
+    assert Delta_Links(removed_file, names) == [('Berlin', 'Paris', 1), ('Berlin', 'Germany', 1)]
+    assert Delta_Links(changed_file, names) == [('London', 'Paris', 2)]
+    assert Read_Lines(page_sha1_file) == [[title, sha1] for title, sha1, links in UPDATE_PAGES[:-1]]
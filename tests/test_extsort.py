@@ -0,0 +1,54 @@
+# WIKI_LINK_EXTSORT: runs spilled to disk and merged back (in more than one pass with a small MERGE_FAN_IN), the
+# sort-merge join of titles with the master ids, and the external Save_Node_IDs & Save_Relationships, whose outputs
+# must be the golden ones whatever the memory budget.
+
+import os
+import random
+
+import pytest
+
+import WIKI_LINK_EXTSORT
+import WIKI_LINK_PARSE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+@pytest.mark.parametrize('memory_budget', [1, 2000, 1024 * 1024])
+def test_sorter(tmp_path, monkeypatch, memory_budget):
+    monkeypatch.setattr(WIKI_LINK_EXTSORT, 'MERGE_FAN_IN', 3)
+    rnd = random.Random(memory_budget)
+    lines = [('Article_{}\t{}\n'.format(rnd.randrange(500), number)).encode('utf-8') for number in range(2000)]
+    sorter = WIKI_LINK_EXTSORT.EXTERNAL_SORTER(str(tmp_path), memory_budget, 'test')
+    for line in lines:
+        sorter.Add(line)
+    if memory_budget < 1024 * 1024:
+        assert len(sorter.runs) > WIKI_LINK_EXTSORT.MERGE_FAN_IN
+    else:
+        assert not sorter.runs
+    assert list(sorter.Sorted()) == sorted(lines)
+    assert os.listdir(str(tmp_path)) == []
+
+def test_join_ids():
+    master_ids = sorted(Golden('master_ids.tsv').splitlines(True))
+    title_ids = dict(line[:-1].split(b'\t') for line in master_ids)
+    links = sorted(line[2:-1] + b'\t' + str(number).encode() + b'\n' for number, line in enumerate(Golden('wiki_reduced.tsv').splitlines(True)) if line.startswith(b'L\t'))
+    joined = list(WIKI_LINK_EXTSORT.Join_IDs(iter(links), iter(master_ids)))
+    assert joined == [(title_ids[line.split(b'\t')[0]], line.split(b'\t')[1]) for line in links]
+    with pytest.raises(SystemExit):
+        list(WIKI_LINK_EXTSORT.Join_IDs(iter([b'Article_missing\t0\n']), iter(master_ids)))
+
+@pytest.mark.parametrize('memory_budget', [256, 4096, 1024 * 1024])
+def test_external_stages(tmp_path, memory_budget):
+    temp_dir = str(tmp_path / 'temp')
+    wiki_reduced_file = os.path.join(GOLDEN_DIR, 'wiki_reduced.tsv')
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file, memory_budget=memory_budget, temp_dir=temp_dir)
+    WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file, memory_budget=memory_budget, temp_dir=temp_dir)
+    for name, output_file in [('master_ids.tsv', master_ids_file), ('relationships.tsv', relationships_file)]:
+        with open(output_file, 'rb') as read_stream:
+            assert read_stream.read() == Golden(name), name
+    assert os.listdir(temp_dir) == []
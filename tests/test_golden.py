@@ -0,0 +1,66 @@
+# The extraction stages against a small golden dump. tests/golden/wiki.xml was made by
+# WIKI_LINK_BENCHMARK.Generate_Wiki_File(pages=200, links_per_page=6, oddities=0.3, redirects=0.05, seed=11), and
+# wiki_reduced.tsv, master_ids.tsv & relationships.tsv were saved from it by the original single process parser
+# (relationships.tsv with the links of the last page added, which the original parser never wrote).
+# Both engines, with one and more workers, over the plain, .bz2 and multistream .bz2 dump must give the same bytes.
+
+import bz2
+import os
+import re
+
+import pytest
+
+import WIKI_LINK_PARSE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+CHUNK_SIZE = 8 * 1024 # Many chunks (and bz2 stream groups, and line blocks of a single worker) for the 100KB dump.
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+def Write_Multistream(data, wiki_file, index_file, pages_per_stream=20):
+    # A pages-articles-multistream.xml.bz2 dump: the header, groups of pages and the footer in their own bz2 streams,
+    # with the offset:page_id:title index of every page.
+    head_end = data.index(b'  <page>')
+    foot_start = data.rindex(b'</mediawiki>')
+    pages = re.findall(rb'  <page>.*?</page>\n', data[head_end:foot_start], re.S)
+    index = []
+    with open(wiki_file, 'wb') as save_stream:
+        save_stream.write(bz2.compress(data[:head_end]))
+        for first in range(0, len(pages), pages_per_stream):
+            offset = save_stream.tell()
+            for page_id in range(first, min(first + pages_per_stream, len(pages))):
+                title = re.search(rb'<title>(.*?)</title>', pages[page_id]).group(1)
+                index.append(b'%d:%d:%s\n' % (offset, page_id, title))
+            save_stream.write(bz2.compress(b''.join(pages[first:first + pages_per_stream])))
+        save_stream.write(bz2.compress(data[foot_start:]))
+    with open(index_file, 'wb') as save_stream:
+        save_stream.write(bz2.compress(b''.join(index)))
+
+@pytest.fixture(scope='module')
+def wiki_files(tmp_path_factory):
+    # {input kind: wiki file}
+    work_dir = tmp_path_factory.mktemp('golden')
+    data = Golden('wiki.xml')
+    bz2_file = str(work_dir / 'wiki.xml.bz2')
+    with open(bz2_file, 'wb') as save_stream:
+        save_stream.write(bz2.compress(data))
+    multistream_file = str(work_dir / 'wiki-multistream.xml.bz2')
+    Write_Multistream(data, multistream_file, str(work_dir / 'wiki-multistream-index.txt.bz2'))
+    return {'plain': os.path.join(GOLDEN_DIR, 'wiki.xml'), 'bz2': bz2_file, 'multistream': multistream_file}
+
+@pytest.mark.parametrize('engine', ['lines', 'mmap'])
+@pytest.mark.parametrize('workers', [1, 3])
+@pytest.mark.parametrize('kind', ['plain', 'bz2', 'multistream'])
+def test_golden_outputs(wiki_files, tmp_path, monkeypatch, engine, workers, kind):
+    monkeypatch.setattr(WIKI_LINK_PARSE, 'STREAM_BLOCK_SIZE', CHUNK_SIZE)
+    wiki_reduced_file = str(tmp_path / 'wiki_reduced.tsv')
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    WIKI_LINK_PARSE.Reduce_Wiki_Datastore(wiki_files[kind], wiki_reduced_file, workers=workers, chunk_size=CHUNK_SIZE, engine=engine)
+    WIKI_LINK_PARSE.Save_Node_IDs(wiki_reduced_file, master_ids_file)
+    WIKI_LINK_PARSE.Save_Relationships(wiki_reduced_file, master_ids_file, relationships_file)
+    for name, output_file in [('wiki_reduced.tsv', wiki_reduced_file), ('master_ids.tsv', master_ids_file), ('relationships.tsv', relationships_file)]:
+        with open(output_file, 'rb') as read_stream:
+            assert read_stream.read() == Golden(name), name
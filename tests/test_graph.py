@@ -0,0 +1,50 @@
+# WIKI_LINK_GRAPH: the CSR graph saved from the golden master_ids.tsv & relationships.tsv, read back through CSR_GRAPH.
+# Every node must have the links of relationships.tsv, in the same order, and links without a source are left out.
+
+import os
+
+import WIKI_LINK_GRAPH
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+def Check_Graph(csr_prefix, node_count, relationships):
+    links = [[] for node_id in range(node_count)]
+    for line in relationships.splitlines():
+        source, dest, strength = line.split(b'\t')
+        if source:
+            links[int(source)].append((int(dest), int(strength)))
+    graph = WIKI_LINK_GRAPH.CSR_GRAPH(csr_prefix)
+    try:
+        assert graph.node_count == node_count
+        assert graph.link_count == sum(len(node_links) for node_links in links)
+        for node_id in range(node_count):
+            dests, strengths = [values.tolist() for values in graph.Neighbors(node_id)] # No views left open for Close.
+            assert graph.Out_Degree(node_id) == len(links[node_id])
+            assert list(zip(dests, strengths)) == links[node_id]
+    finally:
+        graph.Close()
+
+def test_csr_round_trip(tmp_path):
+    csr_prefix = str(tmp_path / 'graph')
+    WIKI_LINK_GRAPH.Save_CSR_Graph(os.path.join(GOLDEN_DIR, 'master_ids.tsv'), os.path.join(GOLDEN_DIR, 'relationships.tsv'), csr_prefix)
+    Check_Graph(csr_prefix, Golden('master_ids.tsv').count(b'\n'), Golden('relationships.tsv'))
+
+def test_csr_sourceless_links(tmp_path):
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    relationships = b'\t3\t1\n\t0\t2\n' + Golden('relationships.tsv')
+    with open(relationships_file, 'wb') as save_stream:
+        save_stream.write(relationships)
+    csr_prefix = str(tmp_path / 'graph')
+    WIKI_LINK_GRAPH.Save_CSR_Graph(os.path.join(GOLDEN_DIR, 'master_ids.tsv'), relationships_file, csr_prefix)
+    Check_Graph(csr_prefix, Golden('master_ids.tsv').count(b'\n'), relationships)
+
+def test_csr_no_links(tmp_path):
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    open(relationships_file, 'wb').close()
+    csr_prefix = str(tmp_path / 'graph')
+    WIKI_LINK_GRAPH.Save_CSR_Graph(os.path.join(GOLDEN_DIR, 'master_ids.tsv'), relationships_file, csr_prefix)
+    Check_Graph(csr_prefix, Golden('master_ids.tsv').count(b'\n'), b'')
@@ -0,0 +1,113 @@
+# WIKI_LINK_METRICS: the samples of a STAGE_METRICS, the JSON lines & Prometheus files they are emitted to, and the
+# phases of stages that run inside each other or while threads add phases.
+
+import json
+import threading
+
+import pytest
+
+import WIKI_LINK_METRICS
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    # Every test starts from the module's defaults, and doesn't leave its configuration behind.
+    for name, value in [('JSONL_FILE', None), ('PROMETHEUS_FILE', None), ('INTERVAL', 10.0), ('PROFILE', False), ('PHASES', {}), ('LATEST', {})]:
+        monkeypatch.setattr(WIKI_LINK_METRICS, name, value)
+
+def test_sample():
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('reduce', total_bytes=1000, start_bytes=100)
+    metrics.start_time -= 10.0
+    metrics.Update(pages=50, links=200, bytes_read=600, bytes_written=None)
+    sample = metrics.Sample()
+    assert (sample['stage'], sample['pages'], sample['links'], sample['bytes_read'], sample['bytes_written'], sample['done']) == ('reduce', 50, 200, 600, 0, 0)
+    assert sample['rss_bytes'] > 0
+    assert sample['pages_per_second'] == pytest.approx(5.0, rel=0.01)
+    assert sample['bytes_per_second'] == pytest.approx(50.0, rel=0.01) # The 100 bytes it resumed from aren't counted.
+    assert sample['progress_ratio'] == 0.6
+    assert sample['eta_seconds'] == pytest.approx(8.0, rel=0.01)
+    assert 'phases' not in sample
+    sample = metrics.Sample(done=True)
+    assert (sample['done'], sample['eta_seconds']) == (1, 0.0)
+
+def test_sample_unknown_size():
+    sample = WIKI_LINK_METRICS.STAGE_METRICS('reduce').Sample()
+    assert sample['progress_ratio'] is None
+    assert sample['eta_seconds'] is None
+
+def test_emit(tmp_path):
+    jsonl_file = str(tmp_path / 'metrics.jsonl')
+    prometheus_file = str(tmp_path / 'metrics.prom')
+    WIKI_LINK_METRICS.Configure(jsonl_file, prometheus_file, profile=True, interval=0.0)
+    reduce_metrics = WIKI_LINK_METRICS.STAGE_METRICS('reduce', total_bytes=1000)
+    WIKI_LINK_METRICS.Add_Phase('parse', 1.5)
+    reduce_metrics.Update(pages=10, bytes_read=500) # An interval of 0 emits every update.
+    node_metrics = WIKI_LINK_METRICS.STAGE_METRICS('node_ids')
+    node_metrics.Finish(ids=7)
+    with open(jsonl_file) as read_stream:
+        samples = [json.loads(line) for line in read_stream]
+    assert [(sample['stage'], sample['done']) for sample in samples] == [('reduce', 0), ('node_ids', 1)]
+    assert (samples[0]['pages'], samples[0]['progress_ratio'], samples[0]['phases']) == (10, 0.5, {'parse': 1.5})
+    assert samples[1]['ids'] == 7
+    with open(prometheus_file) as read_stream:
+        lines = read_stream.read().splitlines()
+    assert '# TYPE wiki_links_pages gauge' in lines
+    assert 'wiki_links_pages{stage="reduce"} 10.0' in lines
+    assert 'wiki_links_ids{stage="node_ids"} 7.0' in lines
+    assert 'wiki_links_done{stage="node_ids"} 1.0' in lines
+    assert 'wiki_links_progress_ratio{stage="reduce"} 0.5' in lines
+    assert not any(line.startswith('wiki_links_progress_ratio{stage="node_ids"}') for line in lines) # Unknown size.
+    assert 'wiki_links_phase_seconds{stage="reduce",phase="parse"} 1.5' in lines
+    assert not (tmp_path / 'metrics.prom.tmp').exists()
+
+def test_write_prometheus(tmp_path):
+    prometheus_file = str(tmp_path / 'metrics.prom')
+    WIKI_LINK_METRICS.LATEST['b'] = {'pages': 2, 'rows': None}
+    WIKI_LINK_METRICS.LATEST['a'] = {'pages': 1, 'rows': 3}
+    WIKI_LINK_METRICS.Write_Prometheus(prometheus_file)
+    with open(prometheus_file) as read_stream:
+        lines = read_stream.read().splitlines()
+    assert lines[:5] == [
+        '# HELP wiki_links_pages Pages done by the stage.',
+        '# TYPE wiki_links_pages gauge',
+        'wiki_links_pages{stage="a"} 1.0',
+        'wiki_links_pages{stage="b"} 2.0',
+        '# HELP wiki_links_links Links done by the stage.',
+    ]
+    assert [line for line in lines if line.startswith('wiki_links_rows{')] == ['wiki_links_rows{stage="a"} 3.0']
+    assert not any('phase_seconds' in line for line in lines)
+
+def test_nested_stage_phases():
+    WIKI_LINK_METRICS.Configure(profile=True)
+    outer = WIKI_LINK_METRICS.STAGE_METRICS('relationships')
+    WIKI_LINK_METRICS.Add_Phase('read', 1.0)
+    inner = WIKI_LINK_METRICS.STAGE_METRICS('sort')
+    WIKI_LINK_METRICS.Add_Phase('read', 2.0)
+    WIKI_LINK_METRICS.Add_Phase('write', 0.5)
+    assert inner.Finish()['phases'] == {'read': 2.0, 'write': 0.5}
+    WIKI_LINK_METRICS.Add_Phase('read', 4.0)
+    assert outer.Finish()['phases'] == {'read': 7.0, 'write': 0.5}
+
+def test_thread_phases():
+    # Phases added by threads while a stage runs are counted once each, and a stage started by a thread resets nothing.
+    WIKI_LINK_METRICS.Configure(profile=True)
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('neo4j')
+    def Add_Phases():
+        WIKI_LINK_METRICS.STAGE_METRICS('batch')
+        for number in range(10000):
+            WIKI_LINK_METRICS.Add_Phase('write', 1.0)
+    threads = [threading.Thread(target=Add_Phases) for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.Sample()['phases'] == {'write': 40000.0}
+
+def test_task_profile():
+    WIKI_LINK_METRICS.Configure(profile=True)
+    metrics = WIKI_LINK_METRICS.STAGE_METRICS('reduce')
+    with WIKI_LINK_METRICS.TASK_PROFILE(True) as task_profile:
+        WIKI_LINK_METRICS.Add_Phase('parse', 2.0)
+    assert task_profile.phases == {'parse': 2.0}
+    assert metrics.Sample()['phases'] == {}
+    WIKI_LINK_METRICS.Merge_Phases(task_profile.phases)
+    assert metrics.Sample()['phases'] == {'parse': 2.0}
@@ -0,0 +1,94 @@
+# WIKI_LINK_NAMESPACES: the namespace of titles (siteinfo names, MediaWiki's aliases, interwiki prefixes), the
+# filtering of reduced records, and the relationships split by the namespaces of their source & dest.
+
+import os
+
+import pytest
+
+import WIKI_LINK_NAMESPACES
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+# The <namespaces> of an english Wikipedia dump, as Read_Namespaces returns them.
+ENWIKI_NAMESPACES = {0: 'article', 1: 'talk', 2: 'user', 3: 'user_talk', 4: 'wikipedia', 5: 'wikipedia_talk', 6: 'file', 7: 'file_talk', 10: 'template', 14: 'category'}
+
+def test_read_namespaces():
+    assert WIKI_LINK_NAMESPACES.Read_Namespaces(os.path.join(GOLDEN_DIR, 'wiki.xml')) == {-2: 'media', -1: 'special', 0: 'article', 1: 'talk', 6: 'file', 10: 'template', 12: 'help', 14: 'category'}
+
+@pytest.mark.parametrize('title, namespace', [
+    ('Paris', 'article'),
+    ('Category:Cities', 'category'),
+    ('category:Cities', 'category'),
+    (':Category:Cities', 'category'),
+    ('Template_talk:Infobox', 'article'), # Not a namespace of this wiki.
+    ('File:Paris.jpg', 'file'),
+    ('Image:Paris.jpg', 'file'),
+    ('IMAGE:Paris.jpg', 'file'),
+    ('Image_talk:Paris.jpg', 'file_talk'),
+    ('Wikipedia:Neutral_point_of_view', 'wikipedia'),
+    ('Project:Neutral_point_of_view', 'wikipedia'),
+    ('WP:NPOV', 'wikipedia'),
+    ('WT:NPOV', 'wikipedia_talk'),
+    ('Project_talk:About', 'wikipedia_talk'),
+    ('fr:Paris', 'interwiki'),
+    ('zh-yue:Paris', 'interwiki'),
+    ('wikt:word', 'interwiki'),
+    ('Re:Zero', 'article'),
+    ('AC/DC:_Live', 'article'),
+])
+def test_namespace(title, namespace):
+    assert WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES).Namespace(title) == namespace
+
+def test_include():
+    namespaces = WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES, ['article', ' 14', 'Image', 'WP'])
+    assert namespaces.include == {'article', 'category', 'file', 'wikipedia'}
+    assert namespaces.Included('Image:Paris.jpg')
+    assert not namespaces.Included('Talk:Paris')
+    with pytest.raises(SystemExit):
+        WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES, ['portal'])
+
+def test_filter_reduced():
+    output = ''.join(line + '\n' for line in [
+        'L\tBefore_the_first_page',
+        'T\tParis', 'L\tFrance', 'L\tImage:Paris.jpg', 'L\tCategory:Cities', 'L\tfr:Paris', 'S\t0123abc',
+        'T\tImage:Paris.jpg', 'L\tParis',
+        'T\tWP:NPOV', 'L\tParis',
+        'T\tRe:Zero', 'L\tFile:Re.png', 'R\tRe:Zero_(novel)',
+    ])
+    namespaces = WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES, ['article'])
+    assert WIKI_LINK_NAMESPACES.Filter_Reduced(output, namespaces) == ''.join(line + '\n' for line in [
+        'L\tBefore_the_first_page',
+        'T\tParis', 'L\tFrance', 'S\t0123abc',
+        'T\tRe:Zero', 'R\tRe:Zero_(novel)',
+    ])
+    assert WIKI_LINK_NAMESPACES.Filter_Reduced(output, WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES, ['talk'])) == ''
+    assert WIKI_LINK_NAMESPACES.Filter_Reduced(output, WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES, None)) == output
+
+def Write_Lines(file_name, lines):
+    with open(file_name, 'wb') as save_stream:
+        save_stream.write(b''.join(line + b'\n' for line in lines))
+
+def Read_Lines(file_name):
+    with open(file_name, 'rb') as read_stream:
+        return read_stream.read().splitlines()
+
+@pytest.mark.parametrize('include', [None, ['article', 'file']])
+def test_partition_relationships(tmp_path, include):
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    relationships_file = str(tmp_path / 'rel.tsv')
+    Write_Lines(master_ids_file, [b'Paris\t0', b'Image:Paris.jpg\t1', b'Category:Cities\t2', b'fr:Paris\t3', b'WP:NPOV\t4', b'Re:Zero\t5'])
+    Write_Lines(relationships_file, [b'\t0\t1', b'0\t1\t1', b'0\t2\t1', b'0\t3\t2', b'0\t5\t1', b'1\t0\t1', b'4\t0\t1', b'5\t1\t3'])
+    namespaces = WIKI_LINK_NAMESPACES.NAMESPACES(ENWIKI_NAMESPACES, include)
+    partition_files = WIKI_LINK_NAMESPACES.Partition_Relationships(master_ids_file, relationships_file, namespaces)
+    partitions = {
+        'article_article': [b'0\t5\t1'],
+        'article_file': [b'0\t1\t1', b'5\t1\t3'],
+        'article_category': [b'0\t2\t1'],
+        'article_interwiki': [b'0\t3\t2'],
+        'file_article': [b'1\t0\t1'],
+        'wikipedia_article': [b'4\t0\t1'],
+    }
+    if include is not None:
+        partitions = dict((pair, partitions[pair]) for pair in partitions if set(pair.split('_')) <= set(include))
+    assert partition_files == sorted(str(tmp_path / 'rel_{}.tsv'.format(pair)) for pair in partitions)
+    for pair in partitions:
+        assert Read_Lines(str(tmp_path / 'rel_{}.tsv'.format(pair))) == partitions[pair]
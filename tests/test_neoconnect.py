@@ -0,0 +1,107 @@
+# WIKI_LINK_NEOCONNECT's concurrent relationship loading, against a FAKE_DRIVER that keeps the LINKSTO links of the
+# batches it is sent (MERGE, and the first strength of a repeated source) and checks the batches in flight at once:
+# two of them must never hold the same source, and a batch with a repeated source must run alone.
+
+import random
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('neo4j')
+
+import WIKI_LINK_NEOCONNECT
+
+class FAKE_DRIVER(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.links = {} # (source, dest): strength
+        self.running = [] # The sources of each batch in flight.
+        self.overlaps = []
+        self.batches = []
+
+    def session(self):
+        return FAKE_SESSION(self)
+
+class FAKE_SESSION(object):
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def begin_transaction(self):
+        return self
+
+    def run(self, query, rows):
+        driver = self.driver
+        sources = set(row[0] for row in rows)
+        repeated = any(row[3] for row in rows)
+        with driver.lock:
+            for running_sources, running_repeated in driver.running:
+                if repeated or running_repeated or running_sources & sources:
+                    driver.overlaps.append((sorted(running_sources), sorted(sources)))
+            entry = (sources, repeated)
+            driver.running.append(entry)
+            driver.batches.append(rows)
+        time.sleep(0.001)
+        with driver.lock:
+            for source, dest, strength, row_repeated in rows:
+                if not row_repeated or (source, dest) not in driver.links:
+                    driver.links[(source, dest)] = strength
+            driver.running.remove(entry)
+
+def Connect():
+    neo = WIKI_LINK_NEOCONNECT.NEO4J_CONNECT.__new__(WIKI_LINK_NEOCONNECT.NEO4J_CONNECT)
+    neo.driver = FAKE_DRIVER()
+    return neo
+
+def Runs(seed):
+    # [(source, {dest: strength})] runs of relationships.tsv, with repeated sources, some of them back to back.
+    rnd = random.Random(seed)
+    runs = []
+    for source in range(200):
+        runs.append((source, dict((rnd.randrange(200), rnd.randrange(1, 5)) for link in range(rnd.randrange(1, 8)))))
+        if rnd.random() < 0.1:
+            runs.append((rnd.randrange(source + 1), dict((rnd.randrange(200), rnd.randrange(5, 9)) for link in range(rnd.randrange(1, 8)))))
+    return runs
+
+def test_batch_rows_by_source():
+    runs = Runs(1)
+    rows = WIKI_LINK_NEOCONNECT.Mark_Repeated_Sources([[source, dest, strength] for source, dests in runs for dest, strength in dests.items()])
+    batch_sources = []
+    for batch in WIKI_LINK_NEOCONNECT.Batch_Rows_By_Source(rows, 4, 3):
+        assert batch == sorted(batch, key=lambda row: row[0])
+        batch_sources.extend(set(row[0] for row in batch))
+    # Only a source with more than one run can be in more than one batch.
+    repeated_sources = set(source for source in batch_sources if batch_sources.count(source) > 1)
+    assert repeated_sources
+    assert all([run_source for run_source, dests in runs].count(source) > 1 for source in repeated_sources)
+
+def test_mark_repeated_sources():
+    rows = [[1, 2, 1], [1, 3, 1], [2, 1, 1], [1, 3, 2], [1, 4, 2], [3, 1, 1], [3, 2, 1], [3, 1, 3], [3, 4, 3]]
+    assert [row[3] for row in WIKI_LINK_NEOCONNECT.Mark_Repeated_Sources(rows)] == [False, False, False, True, True, False, False, True, False]
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_load_relationships(tmp_path, seed):
+    runs = Runs(seed)
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    with open(relationships_file, 'w') as save_stream:
+        save_stream.write('\t7\t1\n') # Links before the first page have no source.
+        for source, dests in runs:
+            for dest, strength in dests.items():
+                save_stream.write('{}\t{}\t{}\n'.format(source, dest, strength))
+    links = {}
+    for source, dests in runs:
+        for dest, strength in dests.items():
+            links.setdefault((source, dest), strength)
+    neo = Connect()
+    neo.Load_Relationships(relationships_file, batch_size=4, sessions=4, window_batches=3)
+    assert neo.driver.overlaps == []
+    assert neo.driver.links == links
+    assert sum(len(batch) for batch in neo.driver.batches) == sum(len(dests) for source, dests in runs)
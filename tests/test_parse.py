@@ -0,0 +1,66 @@
+# The page aligned chunks of WIKI_LINK_PARSE.Iter_Reduced_Chunks, against the golden dump: the byte ranges of
+# Find_Page_Ranges (a process pool, or the 'mmap' engine) and the line blocks of Read_Page_Lines (a single 'lines' worker).
+# Reducing the chunks one by one and joining the records must give the golden wiki_reduced.tsv.
+
+import os
+
+import pytest
+
+import WIKI_LINK_PARSE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+WIKI_FILE = os.path.join(GOLDEN_DIR, 'wiki.xml')
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+def Starts_Page(data, offset):
+    return data[offset:data.index(b'\n', offset)].strip() == b'<page>'
+
+@pytest.mark.parametrize('engine', ['lines', 'mmap'])
+@pytest.mark.parametrize('chunk_size', [1, 1000, 8 * 1024, 1024 * 1024])
+def test_page_ranges(engine, chunk_size):
+    data = Golden('wiki.xml')
+    ranges = WIKI_LINK_PARSE.Find_Page_Ranges(WIKI_FILE, chunk_size)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(data)
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert Starts_Page(data, next_start)
+    if 1 == chunk_size:
+        assert len(ranges) == data.count(b'<page>') + 1 # The <siteinfo> and then every page on its own.
+    results = [WIKI_LINK_PARSE.Reduce_Range(WIKI_FILE, start, end, engine=engine) for start, end in ranges]
+    assert ''.join(output for output, page_count in results).encode('utf-8') == Golden('wiki_reduced.tsv')
+    assert sum(page_count for output, page_count in results) == data.count(b'</page>')
+
+def test_page_ranges_start():
+    data = Golden('wiki.xml')
+    start = WIKI_LINK_PARSE.Find_Page_Ranges(WIKI_FILE, 50 * 1024)[1][0]
+    ranges = WIKI_LINK_PARSE.Find_Page_Ranges(WIKI_FILE, 8 * 1024, start)
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == len(data)
+    output = WIKI_LINK_PARSE.Reduce_Range(WIKI_FILE, 0, start)[0] + ''.join(WIKI_LINK_PARSE.Reduce_Range(WIKI_FILE, range_start, range_end)[0] for range_start, range_end in ranges)
+    assert output.encode('utf-8') == Golden('wiki_reduced.tsv')
+
+@pytest.mark.parametrize('line_end', [b'\n', b'\r\n', b'\r'])
+@pytest.mark.parametrize('block_size', [1, 1000, 1024 * 1024])
+def test_page_lines(tmp_path, line_end, block_size):
+    # The sizes of the blocks are their sizes in the file, so the offsets after each block are page boundaries to resume from.
+    data = Golden('wiki.xml').replace(b'\n', line_end)
+    wiki_file = str(tmp_path / 'wiki.xml')
+    with open(wiki_file, 'wb') as save_stream:
+        save_stream.write(data)
+    output = []
+    position = 0
+    with open(wiki_file, 'r', encoding='utf-8', newline='') as read_stream:
+        for lines, size in WIKI_LINK_PARSE.Read_Page_Lines(read_stream, block_size):
+            assert all(line.endswith('\n') and '\r' not in line for line in lines)
+            if position:
+                assert data[position:position + size].lstrip().startswith(b'<page>')
+            output.append(WIKI_LINK_PARSE.Reduce_Lines(lines)[0])
+            position += size
+    assert position == len(data)
+    if 1 == block_size:
+        assert len(output) == data.count(b'<page>') + 1
+    assert ''.join(output).encode('utf-8') == Golden('wiki_reduced.tsv')
@@ -0,0 +1,124 @@
+# WIKI_LINK_PIPELINE: which stages are stale (Stale_Reason) with and without a manifest record, the plan of the stages
+# to run, and full runs over the golden dump: a second run skips every stage, and a newer wiki file runs them again.
+
+import os
+import shutil
+
+import pytest
+
+import WIKI_LINK_PIPELINE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+def Write(file_name, data, mtime=None):
+    with open(file_name, 'w') as save_stream:
+        save_stream.write(data)
+    if mtime is not None:
+        os.utime(file_name, (mtime, mtime))
+
+@pytest.fixture
+def stage(tmp_path):
+    input_file = str(tmp_path / 'input.tsv')
+    output_file = str(tmp_path / 'output.tsv')
+    Write(input_file, 'input', 1000000)
+    return WIKI_LINK_PIPELINE.STAGE('stage', None, [input_file], [output_file], {'canonical': False})
+
+def test_stale_without_record(stage):
+    input_file, output_file = stage.inputs[0], stage.outputs[0]
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, None) == "never built"
+    Write(output_file, 'output', 2000000)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, None) is None
+    Write(output_file, 'output', 500000)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, None) == "inputs changed"
+    os.remove(input_file)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, None) == "input missing: {}".format(input_file)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(WIKI_LINK_PIPELINE.STAGE('neo4j_nodes', None, [output_file], []), None) == "never built"
+
+def test_stale_with_record(stage):
+    input_file, output_file = stage.inputs[0], stage.outputs[0]
+    Write(output_file, 'output', 2000000)
+    record = WIKI_LINK_PIPELINE.Record(stage)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, record) is None
+    Write(output_file, 'output', 500000) # Older than the input, but as it was recorded.
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, WIKI_LINK_PIPELINE.Record(stage)) is None
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, dict(record, params={'canonical': True})) == "parameters changed"
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, dict(record, inputs={})) == "files changed"
+    record = WIKI_LINK_PIPELINE.Record(stage)
+    Write(input_file, 'input', 1000001)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, record) == "input changed: {}".format(input_file)
+    record = WIKI_LINK_PIPELINE.Record(stage)
+    Write(output_file, 'output!', 500000)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, record) == "output changed: {}".format(output_file)
+    os.remove(output_file)
+    assert WIKI_LINK_PIPELINE.Stale_Reason(stage, record) == "output missing: {}".format(output_file)
+
+def Chain_Stages():
+    stages = [
+        WIKI_LINK_PIPELINE.STAGE('reduce', None, ['wiki.xml'], ['reduced.tsv']),
+        WIKI_LINK_PIPELINE.STAGE('node_ids', None, ['reduced.tsv'], ['ids.tsv']),
+        WIKI_LINK_PIPELINE.STAGE('relationships', None, ['reduced.tsv', 'ids.tsv'], ['rel.tsv']),
+        WIKI_LINK_PIPELINE.STAGE('neo4j_nodes', None, ['ids.tsv'], []),
+        WIKI_LINK_PIPELINE.STAGE('neo4j_relationships', None, ['rel.tsv'], [], after=['neo4j_nodes']),
+    ]
+    return dict((stage.name, stage) for stage in stages)
+
+def test_plan(monkeypatch):
+    stages = Chain_Stages()
+    monkeypatch.setattr(WIKI_LINK_PIPELINE, 'Stale_Reason', lambda stage, record: None if record else "never built")
+    fresh = dict((name, True) for name in stages)
+    assert WIKI_LINK_PIPELINE.Plan(stages, ['relationships'], fresh) == (['reduce', 'node_ids', 'relationships'], {})
+    order, run = WIKI_LINK_PIPELINE.Plan(stages, ['neo4j'], dict(fresh, node_ids=None))
+    assert order == ['reduce', 'node_ids', 'neo4j_nodes', 'relationships', 'neo4j_relationships']
+    assert run == {'node_ids': "never built", 'neo4j_nodes': "needs node_ids", 'relationships': "needs node_ids", 'neo4j_relationships': "needs relationships, neo4j_nodes"}
+    assert WIKI_LINK_PIPELINE.Plan(stages, ['node_ids'], fresh, force=['reduce'])[1] == {'reduce': "forced", 'node_ids': "needs reduce"}
+    assert WIKI_LINK_PIPELINE.Plan(stages, ['node_ids'], fresh, force=['all'])[1] == {'reduce': "forced", 'node_ids': "forced"}
+    with pytest.raises(SystemExit):
+        WIKI_LINK_PIPELINE.Plan(stages, ['nowhere'], fresh)
+
+def Pipeline_Files(work_dir):
+    files = dict((key, str(work_dir / name)) for key, name in [('wiki_file', 'wiki.xml'), ('wiki_reduced_file', 'wiki_reduced.tsv'), ('master_ids_file', 'master_ids.tsv'),
+        ('relationships_file', 'relationships.tsv'), ('node_strength_file', 'master_ids_strength.tsv'), ('csr_prefix', 'relationships.csr'),
+        ('pagerank_file', 'master_ids_pagerank.tsv'), ('components_file', 'master_ids_components.tsv')])
+    files['wiki_index_file'] = None
+    return files
+
+PIPELINE_OPTIONS = {'fused': False, 'workers': 1, 'engine': 'lines', 'memory_budget': None, 'temp_dir': None, 'canonical': False, 'namespaces': None, 'resume': False,
+                    'neo4j_uri': 'bolt://localhost', 'neo4j_user': 'neo4j', 'neo4j_password': ''}
+
+def Mtimes(files):
+    return dict((key, os.stat(files[key]).st_mtime_ns) for key in ('wiki_reduced_file', 'master_ids_file', 'relationships_file'))
+
+def test_run(tmp_path, capsys):
+    files = Pipeline_Files(tmp_path)
+    shutil.copy(os.path.join(GOLDEN_DIR, 'wiki.xml'), files['wiki_file'])
+    assert WIKI_LINK_PIPELINE.Run(['relationships'], files, PIPELINE_OPTIONS)
+    for name, key in [('wiki_reduced.tsv', 'wiki_reduced_file'), ('master_ids.tsv', 'master_ids_file'), ('relationships.tsv', 'relationships_file')]:
+        with open(os.path.join(GOLDEN_DIR, name), 'rb') as golden_stream, open(files[key], 'rb') as read_stream:
+            assert read_stream.read() == golden_stream.read(), name
+    manifest = WIKI_LINK_PIPELINE.Load_Manifest(str(tmp_path / 'pipeline_manifest.json'))
+    assert sorted(manifest) == ['node_ids', 'reduce', 'relationships']
+    mtimes = Mtimes(files)
+    capsys.readouterr()
+
+    assert WIKI_LINK_PIPELINE.Run(['relationships'], files, PIPELINE_OPTIONS)
+    assert "\treduce\tfresh\n\tnode_ids\tfresh\n\trelationships\tfresh\n" in capsys.readouterr().out
+    assert Mtimes(files) == mtimes
+
+    assert WIKI_LINK_PIPELINE.Run(['relationships'], files, dict(PIPELINE_OPTIONS, canonical=True), dry_run=True)
+    assert "\treduce\trun: parameters changed\n\tnode_ids\trun: needs reduce\n" in capsys.readouterr().out
+
+    os.utime(files['wiki_file'], ns=(mtimes['wiki_reduced_file'] + 10 ** 9,) * 2)
+    assert WIKI_LINK_PIPELINE.Run(['relationships'], files, PIPELINE_OPTIONS)
+    assert "\treduce\trun: input changed: {}\n".format(files['wiki_file']) in capsys.readouterr().out
+    assert all(mtime > mtimes[key] for key, mtime in Mtimes(files).items())
+
+def test_run_without_manifest(tmp_path, capsys):
+    # Files built from the menus are adopted when they are newer than their inputs.
+    files = Pipeline_Files(tmp_path)
+    shutil.copy(os.path.join(GOLDEN_DIR, 'wiki.xml'), files['wiki_file'])
+    for name, key in [('wiki_reduced.tsv', 'wiki_reduced_file'), ('master_ids.tsv', 'master_ids_file'), ('relationships.tsv', 'relationships_file')]:
+        shutil.copy(os.path.join(GOLDEN_DIR, name), files[key])
+    os.utime(files['wiki_file'], (1000000, 1000000))
+    os.utime(files['master_ids_file'], (500000, 500000))
+    assert WIKI_LINK_PIPELINE.Run(['relationships'], files, PIPELINE_OPTIONS, dry_run=True)
+    assert "\treduce\tfresh\n\tnode_ids\trun: inputs changed\n\trelationships\trun: needs node_ids\n" in capsys.readouterr().out
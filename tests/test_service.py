@@ -0,0 +1,103 @@
+# WIKI_LINK_SERVICE: requests & responses over a real connection, against the CSR graph of the golden canonical outputs.
+# Several requests share one kept alive connection, and a body over MAX_BODY_SIZE is answered 413 without being read.
+
+import asyncio
+import json
+import os
+import shutil
+
+import pytest
+
+import WIKI_LINK_GRAPH
+import WIKI_LINK_SERVICE
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('service')
+    master_ids_file = str(work_dir / 'master_ids.tsv')
+    shutil.copy(os.path.join(GOLDEN_DIR, 'canonical_master_ids.tsv'), master_ids_file)
+    csr_prefix = str(work_dir / 'relationships.csr')
+    WIKI_LINK_GRAPH.Save_CSR_Graph(master_ids_file, os.path.join(GOLDEN_DIR, 'canonical_relationships.tsv'), csr_prefix)
+    return WIKI_LINK_SERVICE.QUERY_SERVICE(csr_prefix, master_ids_file)
+
+async def Read_Response(reader):
+    # (status, {header: value}, JSON payload), or None at the end of the connection.
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict((key.lower(), value.strip()) for key, colon, value in (line.partition(':') for line in lines[1:] if line))
+    payload = await reader.readexactly(int(headers['content-length']))
+    return int(lines[0].split(' ')[1]), headers, json.loads(payload.decode('utf-8'))
+
+def Exchange(service, requests):
+    # Sends each raw request on one connection, and returns the responses read until it is closed.
+    async def Run():
+        server = await asyncio.start_server(service.Handle_Connection, '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+            responses = []
+            for request in requests:
+                writer.write(request)
+                await writer.drain()
+                response = await Read_Response(reader)
+                if response is None:
+                    break
+                responses.append(response)
+            writer.close()
+            await writer.wait_closed()
+            await asyncio.sleep(0.01) # The handler sees the end of the connection before the server is closed.
+            return responses
+    return asyncio.run(Run())
+
+def Get(target):
+    return b'GET ' + target.encode('utf-8') + b' HTTP/1.1\r\nHost: localhost\r\n\r\n'
+
+def Post(target, body, headers=b''):
+    return b'POST %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n%s\r\n%s' % (target.encode('utf-8'), len(body), headers, body)
+
+def test_requests(service):
+    responses = Exchange(service, [
+        Get('/id?title=Paris&title=Nowhere'),
+        Get('/title?id=20&id=999'),
+        Get('/outlinks?title=New_York_City'),
+        Get('/inlinks?id=20&limit=1&offset=1'),
+        Post('/id', 'title=AT%26T&title=Élan'.encode('utf-8')),
+        Get('/path?from=AT%26T&to=Rome'),
+        Get('/path?from=Rome&to=Paris'),
+    ])
+    assert [(status, payload) for status, headers, payload in responses] == [
+        (200, {'Paris': 0, 'Nowhere': None}),
+        (200, {'20': 'New_York_City', '999': None}),
+        (200, {'New_York_City': [['New_York_City', 20, 2], ['Paris', 0, 1]]}),
+        (200, {'20': [['New_York_City', 20, 2]]}),
+        (200, {'AT&T': 16, 'Élan': 19}),
+        (200, {'path': ['AT&T', 'Paris', 'Rome']}),
+        (200, {'path': None}),
+    ]
+    assert all('application/json; charset=utf-8' == headers['content-type'] and 'connection' not in headers for status, headers, payload in responses)
+
+def test_errors(service):
+    responses = Exchange(service, [
+        Get('/nowhere'),
+        b'DELETE /id HTTP/1.1\r\n\r\n',
+        Get('/outlinks?id=0&limit=-1'),
+        Get('/path?from=Paris'),
+        b'GET /id HTTP/1.1\r\nConnection: close\r\n\r\n',
+        Get('/id?title=Paris'), # Not answered, the connection is closed.
+    ])
+    assert [status for status, headers, payload in responses] == [404, 405, 400, 400, 200]
+    assert responses[-1][1]['connection'] == 'close'
+
+def test_body_size(service, monkeypatch):
+    monkeypatch.setattr(WIKI_LINK_SERVICE, 'MAX_BODY_SIZE', 64)
+    body = b'title=Paris&title=' + b'x' * 46
+    responses = Exchange(service, [Post('/id', body), Post('/id', body + b'x'), Get('/id?title=Paris')])
+    assert [status for status, headers, payload in responses] == [200, 413]
+    assert responses[1][1]['connection'] == 'close'
+    # The body isn't waited for.
+    responses = Exchange(service, [b'POST /id HTTP/1.1\r\nContent-Length: 1000000000\r\n\r\n'])
+    assert [status for status, headers, payload in responses] == [413]
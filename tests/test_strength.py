@@ -0,0 +1,49 @@
+# WIKI_LINK_STRENGTH: the degree & strength of every node of the golden master_ids.tsv & relationships.tsv, read in
+# blocks small enough for lines to be cut between them, against the counts of the relationships lines.
+# Lines without a source are left out, and a malformed line is a panic.
+
+import os
+
+import numpy
+import pytest
+
+import WIKI_LINK_STRENGTH
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+@pytest.mark.parametrize('chunk_size', [64, 64 * 1024 * 1024])
+def test_count_node_strength(tmp_path, chunk_size):
+    relationships_file = str(tmp_path / 'relationships.tsv')
+    relationships = b'\t3\t1\n' + Golden('relationships.tsv') + b'\t0\t2\n'
+    with open(relationships_file, 'wb') as save_stream:
+        save_stream.write(relationships)
+    master_ids = Golden('master_ids.tsv').splitlines()
+    counts = [[0, 0, 0, 0] for line in master_ids] # in_degree, out_degree, in_strength, out_strength
+    for line in relationships.splitlines():
+        source, dest, strength = line.split(b'\t')
+        if source:
+            counts[int(dest)][0] += 1
+            counts[int(source)][1] += 1
+            counts[int(dest)][2] += int(strength)
+            counts[int(source)][3] += int(strength)
+    node_strength_file = str(tmp_path / 'master_ids_strength.tsv')
+    WIKI_LINK_STRENGTH.Count_Node_Strength(os.path.join(GOLDEN_DIR, 'master_ids.tsv'), relationships_file, node_strength_file, chunk_size=chunk_size)
+    with open(node_strength_file, 'rb') as read_stream:
+        assert read_stream.read().splitlines() == [line + b'\t%d\t%d\t%d\t%d' % tuple(node_counts) for line, node_counts in zip(master_ids, counts)]
+
+def test_node_strength_file():
+    assert WIKI_LINK_STRENGTH.Node_Strength_File('data/master_ids.tsv.gz') == 'data/master_ids_strength.tsv.gz'
+
+def test_parse_links():
+    assert WIKI_LINK_STRENGTH.Parse_Links(b'0\t1\t2\n\t4\t1\n3\t4\t5\n').tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert WIKI_LINK_STRENGTH.Parse_Links(b'\t4\t1\n').shape == (0, 3)
+    assert WIKI_LINK_STRENGTH.Parse_Links(b'').dtype == numpy.int64
+
+@pytest.mark.parametrize('block', [b'0\t1\n2\t3\t4\n', b'0\t1\t2\t3\n', b'0\t1\n', b'0\tParis\t1\n', b'0\t1\t\n'])
+def test_parse_links_malformed(block):
+    with pytest.raises(SystemExit):
+        WIKI_LINK_STRENGTH.Parse_Links(block)
@@ -0,0 +1,99 @@
+# WIKI_LINK_SUBGRAPH: the k-hop subgraph of seed pages of the golden dumps must hold the nodes reached from the seeds
+# in the golden reduced file, and every link between them with its strength. With canonical titles the links are the
+# ones left by Resolve_Redirects. The page index is kept with the output files, never next to the wiki file.
+
+import os
+
+import pytest
+
+import WIKI_LINK_SUBGRAPH
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+def Golden(name):
+    with open(os.path.join(GOLDEN_DIR, name), 'rb') as read_stream:
+        return read_stream.read()
+
+def Reduced_Pages(name):
+    # {title: {dest: strength}} of the first page of each title of a golden reduced file.
+    pages = {}
+    page = None
+    for line in Golden(name).decode('utf-8').splitlines():
+        kind, title = line.split('\t', 1)
+        if 'T' == kind:
+            page = title if title not in pages else None
+            if page is not None:
+                pages[page] = {}
+        elif 'L' == kind and page is not None:
+            pages[page][title] = pages[page].get(title, 0) + 1
+    return pages
+
+def Expected_Subgraph(pages, seeds, hops):
+    # (nodes, {(source, dest): strength})
+    nodes = set(seeds)
+    frontier = list(seeds)
+    for hop in range(hops):
+        next_frontier = []
+        for title in frontier:
+            for dest in pages.get(title, {}):
+                if dest not in nodes:
+                    nodes.add(dest)
+                    next_frontier.append(dest)
+        frontier = next_frontier
+    links = {}
+    for title in nodes:
+        for dest, strength in pages.get(title, {}).items():
+            if dest in nodes:
+                links[(title, dest)] = strength
+    return nodes, links
+
+def Read_Subgraph(master_ids_file, relationships_file):
+    with open(master_ids_file, 'rb') as read_stream:
+        names = [line.decode('utf-8').split('\t')[0] for line in read_stream]
+    links = {}
+    with open(relationships_file, 'rb') as read_stream:
+        for line in read_stream:
+            source, dest, strength = [int(value) for value in line.split(b'\t')]
+            assert (names[source], names[dest]) not in links
+            links[(names[source], names[dest])] = strength
+    return names, links
+
+@pytest.mark.parametrize('wiki_name, reduced_name, canonical, seeds, titles, hops', [
+    ('wiki.xml', 'wiki_reduced.tsv', False, None, None, 2),
+    ('canonical.xml', 'canonical_reduced.tsv', True, ['paris'], ['Paris'], 1),
+    ('canonical.xml', 'canonical_reduced.tsv', True, ['Category:Capital cities', 'Big Apple'], ['Category:Capital_cities', 'New_York_City'], 2),
+])
+@pytest.mark.parametrize('engine', ['lines', 'mmap'])
+def test_save_subgraph(tmp_path, engine, wiki_name, reduced_name, canonical, seeds, titles, hops):
+    pages = Reduced_Pages(reduced_name)
+    if seeds is None:
+        titles = list(pages)[:2]
+        seeds = [title.replace('_', ' ') for title in titles]
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    master_ids_file = str(output_dir / 'master_ids.tsv')
+    relationships_file = str(output_dir / 'relationships.tsv')
+    golden_files = sorted(os.listdir(GOLDEN_DIR))
+    WIKI_LINK_SUBGRAPH.Save_Subgraph(os.path.join(GOLDEN_DIR, wiki_name), seeds, hops, master_ids_file, relationships_file, engine=engine, canonical=canonical)
+    assert sorted(os.listdir(GOLDEN_DIR)) == golden_files
+    index_files = WIKI_LINK_SUBGRAPH.Page_Index_Files(os.path.join(GOLDEN_DIR, wiki_name), str(output_dir), WIKI_LINK_SUBGRAPH.WIKI_LINK_NAMESPACES.Read_Title_Case(os.path.join(GOLDEN_DIR, wiki_name)) if canonical else None)
+    assert all(os.path.isfile(index_file) for index_file in index_files)
+    names, links = Read_Subgraph(master_ids_file, relationships_file)
+    nodes, expected_links = Expected_Subgraph(pages, titles, hops)
+    # Seeds are in order, the article of a redirect seed is numbered when the redirect is read.
+    assert [name for name in names if name in titles] == titles
+    assert names[0] == titles[0]
+    assert sorted(names) == sorted(nodes)
+    assert links == expected_links
+
+def test_index_dir(tmp_path):
+    # The index is made once, and reused from index_dir.
+    index_dir = str(tmp_path / 'index')
+    wiki_file = os.path.join(GOLDEN_DIR, 'wiki.xml')
+    for run in range(2):
+        WIKI_LINK_SUBGRAPH.Save_Subgraph(wiki_file, ['Missing page'], 1, str(tmp_path / 'master_ids.tsv'), str(tmp_path / 'relationships.tsv'), index_dir=index_dir)
+        assert sorted(os.listdir(index_dir)) == ['wiki.xml.pages.ranges', 'wiki.xml.pages.titles']
+        if 0 == run:
+            index_time = os.path.getmtime(os.path.join(index_dir, 'wiki.xml.pages.titles'))
+    assert os.path.getmtime(os.path.join(index_dir, 'wiki.xml.pages.titles')) == index_time
+    assert sorted(os.listdir(str(tmp_path))) == ['index', 'master_ids.tsv', 'master_ids.tsv.titles', 'relationships.tsv']
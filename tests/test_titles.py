@@ -0,0 +1,61 @@
+# WIKI_LINK_TITLES.TITLE_TABLE: ids in order of first Add, the growth of its hash table, and the table saved to disk
+# and loaded back or memory mapped. Load_Master_IDs & Map_Master_IDs against the golden master_ids.tsv.
+
+import os
+import shutil
+
+import pytest
+
+import WIKI_LINK_TITLES
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+def Titles(count):
+    return [('Article_{}'.format(number)).encode('utf-8') for number in range(count)] + ['Été_à_Zürich'.encode('utf-8'), b'']
+
+def Check_Table(table, titles, counts):
+    assert len(table) == len(titles)
+    for title_id, title in enumerate(titles):
+        assert table.Find(title) == title_id
+        assert table.Title(title_id) == title
+        assert table.counts[title_id] == counts[title_id]
+    assert table.Find(b'Article_missing') == -1
+
+def test_add_find():
+    titles = Titles(1000)
+    table = WIKI_LINK_TITLES.TITLE_TABLE(capacity=4)
+    for title_id, title in enumerate(titles):
+        assert table.Add(title) == (title_id, True)
+    for title_id, title in enumerate(titles[::3]):
+        assert table.Add(title, count=2) == (title_id * 3, False)
+    assert len(table.slots) >= len(titles) * 3 // 2 # Grown from 4 slots, and never more than 2/3 full.
+    Check_Table(table, titles, [3 if title_id % 3 == 0 else 1 for title_id in range(len(titles))])
+
+@pytest.mark.parametrize('open_table', ['Load', 'Map'])
+def test_save_load(tmp_path, open_table):
+    titles = Titles(1000)
+    table = WIKI_LINK_TITLES.TITLE_TABLE()
+    for title_id, title in enumerate(titles):
+        table.Add(title, count=title_id + 1)
+    table_file = str(tmp_path / 'titles')
+    table.Save(table_file)
+    Check_Table(getattr(WIKI_LINK_TITLES.TITLE_TABLE, open_table)(table_file), titles, list(range(1, len(titles) + 1)))
+
+def test_not_a_table(tmp_path):
+    table_file = str(tmp_path / 'titles')
+    with open(table_file, 'wb') as save_stream:
+        save_stream.write(b'Article\t0\n' * 10)
+    with pytest.raises(ValueError):
+        WIKI_LINK_TITLES.TITLE_TABLE.Load(table_file)
+    with pytest.raises(ValueError):
+        WIKI_LINK_TITLES.TITLE_TABLE.Map(table_file)
+
+def test_master_ids(tmp_path):
+    master_ids_file = str(tmp_path / 'master_ids.tsv')
+    shutil.copy(os.path.join(GOLDEN_DIR, 'master_ids.tsv'), master_ids_file)
+    with open(master_ids_file, 'rb') as read_stream:
+        titles = [line.split(b'\t')[0] for line in read_stream]
+    Check_Table(WIKI_LINK_TITLES.Load_Master_IDs(master_ids_file), titles, [1] * len(titles))
+    Check_Table(WIKI_LINK_TITLES.Map_Master_IDs(master_ids_file), titles, [1] * len(titles))
+    assert os.path.isfile(WIKI_LINK_TITLES.Title_Table_File(master_ids_file))
+    Check_Table(WIKI_LINK_TITLES.Load_Master_IDs(master_ids_file), titles, [1] * len(titles))